@@ -0,0 +1,157 @@
+"""处理器吞吐基准: fake_tg 代替 Telegram，sim_claude 模拟会话代替终端，
+把合成 Update 喂给 bot.build_application() 构建的 Application。
+
+每个动作连续处理 --n 个 Update (最多 --concurrency 个并发)，报告 updates/s、
+p50/p99 处理延迟，以及每次动作产生的 API 调用数 (含 429 与处理器异常)。
+处理器启动的后台任务 (如 /key 之后的截图) 在每个动作结束后等 --settle 秒一并计入。
+
+用法: python bench_handlers.py [--n 100] [--latency 0.05] [--per-chat 0] [--windows 4]
+                               [--concurrency 1] [--upload-kbps 0] [--only /start,text]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+
+def _setup_env(tmp: str) -> None:
+    """必须在导入 bot 之前调用: 模拟后端、只允许测试用户、所有状态文件写到临时目录。"""
+    from fake_tg import USER_ID
+    os.environ.update(TERM_BACKEND="fake", ALLOWED_USER_IDS=str(USER_ID), READONLY_USER_IDS="",
+                      HOME=tmp, USERPROFILE=tmp, WORK_DIR=tmp)
+    import logging
+    import config
+    import eventlog
+    import utils
+    eventlog.EVENT_LOG_PATH = os.path.join(tmp, "events.jsonl")
+    config.TOOL_PATHS_FILE = os.path.join(tmp, "tool_paths.json")
+    for name in ("LABELS_FILE", "RECENT_DIRS_FILE", "TEMPLATES_FILE", "PANEL_FILE", "ALIASES_FILE", "STATE_FILE"):
+        setattr(utils, name, os.path.join(tmp, os.path.basename(getattr(utils, name))))
+    logging.getLogger("bedcode").setLevel(logging.CRITICAL)  # 处理器异常计入表格的 err 列
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def _actions(hub) -> list[tuple]:
+    """[(名称, 消息文本或 ("cb", 回调数据), 每次发送前执行的准备函数)]。"""
+    from config import state
+
+    idle = hub.sessions[min(hub.sessions)]
+    busy = hub.spawn("/work/busy", project="busy")
+    busy.turns.extend([[("think", 1e9)]] * 2)
+    busy.send_text("长任务")
+
+    def target(h):
+        def prepare():
+            state["target_handle"] = h
+            state["msg_queue"].clear()
+        return prepare
+
+    to_idle, to_busy = target(idle.handle), target(busy.handle)
+    return [
+        ("/start", "/start", to_idle),
+        ("/windows", "/windows", to_idle),
+        ("/screenshot", "/screenshot", to_idle),
+        ("/grab", "/grab", to_idle),
+        ("/key 1", "/key 1", to_idle),
+        ("/delay 15", "/delay 15", to_idle),
+        ("/cost", "/cost", to_idle),
+        ("/history", "/history", to_idle),
+        ("/storage", "/storage", to_idle),
+        ("text", "跑一下测试", to_idle),
+        ("text (排队)", "再加一个用例", to_busy),
+        ("cb qr", ("cb", "qr:1 enter"), to_idle),
+        ("cb queue:view", ("cb", "queue:view"), to_busy),
+        ("cb target", ("cb", f"target:{idle.handle}"), to_idle),
+    ]
+
+
+async def _bench(args) -> None:
+    import sim_claude
+    from config import state
+    from fake_tg import FAKE_TOKEN, FakeBotAPI, text_update, callback_update
+    from monitor import _cancel_monitor
+    from bot import build_application
+
+    hub = sim_claude.SimHub(home=os.environ["HOME"], think_time=0)
+    sim_claude.set_hub(hub)
+    for i in range(args.windows):
+        hub.spawn(f"/work/p{i}", project=f"p{i}")
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.latency / 2, per_chat=args.per_chat,
+                     upload_bps=args.upload_kbps * 1024, seed=1)
+    app = build_application(FAKE_TOKEN, request=api)
+    errors = Counter()
+    current = [""]
+
+    async def count_error(update, context):
+        errors[current[0]] += 1
+    app.add_error_handler(count_error)
+    await app.initialize()
+    state["auto_monitor"] = True
+
+    only = set(args.only.split(",")) if args.only else None
+    print(f"窗口 {args.windows}，每个动作 {args.n} 次，并发 {args.concurrency}，"
+          f"API 延迟 {args.latency * 1000:.0f}ms，限流 {args.per_chat or '无'}/s/chat")
+    print(f"{'action':<16}{'upd/s':>9}{'p50(ms)':>10}{'p99(ms)':>10}{'api/act':>9}{'429':>6}{'err':>6}")
+    totals = Counter()
+    for name, payload, prepare in _actions(hub):
+        if only and name not in only:
+            continue
+        current[0] = name
+        api.reset()
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one():
+            async with sem:
+                prepare()
+                if isinstance(payload, tuple):
+                    update = callback_update(app.bot, payload[1])
+                else:
+                    update = text_update(app.bot, payload)
+                t0 = time.perf_counter()
+                await app.process_update(update)
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.n)))
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(args.settle)
+        _cancel_monitor()
+        calls = [c for c in api.calls if c.method != "getMe"]
+        totals.update(c.method for c in calls)
+        throttled = sum(c.status == 429 for c in calls)
+        print(f"{name:<16}{args.n / elapsed:>9.1f}{_percentile(latencies, 0.5) * 1000:>10.1f}"
+              f"{_percentile(latencies, 0.99) * 1000:>10.1f}{len(calls) / args.n:>9.2f}"
+              f"{throttled:>6}{errors[name]:>6}")
+    print("API 调用合计: " + ", ".join(f"{k}={v}" for k, v in totals.most_common()))
+    await app.shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100, help="每个动作的 Update 数")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--latency", type=float, default=0.0, help="每次 API 调用的模拟延迟 (秒)")
+    ap.add_argument("--per-chat", type=float, default=0, help="每个 chat 每秒允许的发送/编辑数，0 为不限")
+    ap.add_argument("--upload-kbps", type=float, default=0, help="上传带宽 (KB/s)，0 为不计")
+    ap.add_argument("--windows", type=int, default=4, help="模拟的 Claude 窗口数")
+    ap.add_argument("--settle", type=float, default=0.7, help="每个动作后等待后台任务的秒数")
+    ap.add_argument("--only", default="", help="只跑这些动作，逗号分隔")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bedcode-bench-") as tmp:
+        _setup_env(tmp)
+        asyncio.run(_bench(args))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""OCR 基准: 对比整图直接识别与 ocr.py 服务（预处理 + 文本带缓存）的准确率和延迟。
+
+用法:
+  python bench_ocr.py                 # 使用合成的终端截图
+  python bench_ocr.py --dir samples/  # 使用录制的截图: foo.png/foo.jpg + foo.txt(标准答案)
+
+每组样本测三次: 原始整图 image_to_string、服务冷启动、服务在只改动一行后的增量识别。
+准确率为与标准答案的字符级相似度 (difflib ratio)；短行 (`$ ls`、`(y/n)` 这类提示) 在宽屏上
+只占很少像素，另外统计它们被识别出来的比例。需要安装 pytesseract 和 tesseract。
+"""
+import os
+import io
+import sys
+import time
+import random
+import asyncio
+import argparse
+import difflib
+
+from PIL import Image, ImageDraw, ImageFont
+
+import ocr
+
+
+_SHORT_LINES = ["$ ls", "$ cd ..", "(y/n)", "> ok", "$ git status", "[Y/n]"]
+_SHORT_MAX = 12  # 不超过这么多字符的行计为短行
+
+_FONTS = ["consola.ttf", "DejaVuSansMono.ttf", "Menlo.ttc", "LiberationMono-Regular.ttf"]
+
+
+def _font(size: int):
+    for name in _FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _render_terminal(lines: list[str], width: int = 1280, font_size: int = 15) -> bytes:
+    """按 capture_window_screenshot 的输出格式渲染: 深色背景、1280 宽 JPEG q75。"""
+    font = _font(font_size)
+    line_h = int(font_size * 1.45)
+    img = Image.new("RGB", (width, line_h * len(lines) + 20), (12, 12, 12))
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        color = (120, 200, 120) if line.startswith("+") else (204, 204, 204)
+        draw.text((10, 10 + i * line_h), line, font=font, fill=color)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=75)
+    return out.getvalue()
+
+
+def _synthetic(n: int, seed: int = 7) -> list[tuple[str, bytes, list[str]]]:
+    rnd = random.Random(seed)
+    words = ["def", "return", "self.state", "import", "asyncio", "await", "handler", "print(x)", "42", "None"]
+    samples = []
+    for k in range(n):
+        lines = []
+        for i in range(40):
+            r = rnd.random()
+            if r < 0.15:
+                lines.append("")
+            elif r < 0.3:
+                lines.append(rnd.choice(_SHORT_LINES))
+            else:
+                prefix = rnd.choice(["", "  ", "+ ", "> ", "$ "])
+                lines.append(prefix + " ".join(rnd.choice(words) for _ in range(rnd.randint(2, 10))))
+        samples.append((f"synthetic_{k}", _render_terminal(lines), lines))
+    return samples
+
+
+def _recorded(path: str) -> list[tuple[str, bytes, list[str] | None]]:
+    samples = []
+    for name in sorted(os.listdir(path)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in (".png", ".jpg", ".jpeg"):
+            continue
+        with open(os.path.join(path, name), "rb") as f:
+            data = f.read()
+        truth = None
+        txt = os.path.join(path, stem + ".txt")
+        if os.path.exists(txt):
+            with open(txt, "r", encoding="utf-8") as f:
+                truth = f.read().splitlines()
+        samples.append((stem, data, truth))
+    return samples
+
+
+def _accuracy(text: str, truth: list[str] | None) -> float | None:
+    if truth is None:
+        return None
+    a = " ".join(text.split())
+    b = " ".join(" ".join(truth).split())
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _short_recall(text: str, truth: list[str] | None) -> tuple[int, int] | None:
+    """(识别出的短行数, 短行总数)。"""
+    if truth is None:
+        return None
+    short = [line.strip() for line in truth if 0 < len(line.strip()) <= _SHORT_MAX]
+    found = " ".join(text.split())
+    return sum(line in found for line in short), len(short)
+
+
+def _fmt_recall(v: tuple[int, int] | None) -> str:
+    return f"{v[0]}/{v[1]}" if v else "-"
+
+
+def _baseline(data: bytes) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(Image.open(io.BytesIO(data))).strip()
+
+
+def _fmt_acc(v: float | None) -> str:
+    return f"{v * 100:6.1f}%" if v is not None else "     -"
+
+
+async def _run(samples, edit_synthetic: bool) -> None:
+    print(f"{'sample':<16}{'base ms':>9}{'base acc':>10}{'base sh':>9}{'svc ms':>9}{'svc acc':>9}{'svc sh':>8}"
+          f"{'incr ms':>9}{'bands':>8}")
+    totals = [0.0, 0.0, 0.0]
+    for name, data, truth in samples:
+        t0 = time.perf_counter()
+        base = await asyncio.to_thread(_baseline, data)
+        t_base = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        text = await ocr.ocr_image(data)
+        t_svc = time.perf_counter() - t0
+
+        t_incr = None
+        before = ocr.stats()
+        if edit_synthetic and truth:
+            edited = list(truth)
+            edited[-1] = edited[-1] + " done"  # 模拟终端底部新增输出
+            edited_data = _render_terminal(edited)
+            t0 = time.perf_counter()
+            await ocr.ocr_image(edited_data)
+            t_incr = time.perf_counter() - t0
+        after = ocr.stats()
+        bands = after["bands"] - before["bands"]
+        hits = after["band_hits"] - before["band_hits"]
+
+        totals[0] += t_base
+        totals[1] += t_svc
+        totals[2] += t_incr or 0
+        incr = f"{t_incr * 1000:9.0f}" if t_incr is not None else f"{'-':>9}"
+        print(
+            f"{name[:15]:<16}{t_base * 1000:9.0f}{_fmt_acc(_accuracy(base, truth)):>10}"
+            f"{_fmt_recall(_short_recall(base, truth)):>9}"
+            f"{t_svc * 1000:9.0f}{_fmt_acc(_accuracy(text, truth)):>9}{_fmt_recall(_short_recall(text, truth)):>8}"
+            f"{incr}{f'{bands - hits}/{bands}':>8}"
+        )
+    n = max(1, len(samples))
+    print(f"\n平均: 原始 {totals[0] / n * 1000:.0f} ms, 服务冷启动 {totals[1] / n * 1000:.0f} ms, "
+          f"增量 {totals[2] / n * 1000:.0f} ms")
+    print(f"缓存统计: {ocr.stats()}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dir", help="录制截图目录 (png/jpg + 同名 txt 标准答案)")
+    ap.add_argument("--count", type=int, default=5, help="合成样本数量")
+    args = ap.parse_args()
+    if not ocr.available():
+        print("需要 pytesseract: pip install pytesseract，并安装 tesseract 可执行文件")
+        return 1
+    samples = _recorded(args.dir) if args.dir else _synthetic(args.count)
+    if not samples:
+        print("没有样本")
+        return 1
+    try:
+        asyncio.run(_run(samples, edit_synthetic=not args.dir))
+    finally:
+        ocr.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""split_text / render_html_chunks 微基准: 1 MB 与 10 MB 输入。
+
+用法: python bench_render.py [--sizes 1,10] [--repeat 3]
+"""
+import sys
+import time
+import random
+import argparse
+
+from render import split_text, render_html_chunks
+
+
+def _legacy_split_text(text: str, max_len: int = 3500) -> list[str]:
+    """旧实现（每次循环重新切片剩余字符串），用作对照。"""
+    if len(text) <= max_len:
+        return [text]
+    chunks = []
+    while text:
+        if len(text) <= max_len:
+            chunks.append(text)
+            break
+        idx = text.rfind("\n", 0, max_len)
+        if idx == -1:
+            idx = max_len
+        chunks.append(text[:idx])
+        text = text[idx:].lstrip("\n")
+    return chunks
+
+
+def _sample_markdown(size: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    words = ["error", "build", "`path/to/file.py`", "**ok**", "<tag>", "a&b", "测试", "😀", "value=42"]
+    parts = []
+    total = 0
+    while total < size:
+        kind = rnd.random()
+        if kind < 0.15:
+            body = "\n".join(f"    line_{i} = {rnd.randint(0, 999)} < {i}" for i in range(rnd.randint(5, 60)))
+            block = f"```python\n{body}\n```"
+        elif kind < 0.2:
+            block = "| a | b |\n|---|---|\n" + "\n".join(f"| {i} | {i * i} |" for i in range(8))
+        else:
+            block = "\n".join(
+                ("- " if rnd.random() < 0.3 else "") + " ".join(rnd.choice(words) for _ in range(rnd.randint(3, 20)))
+                for _ in range(rnd.randint(1, 8))
+            )
+        parts.append(block)
+        total += len(block) + 1
+    return "\n".join(parts)[:size]
+
+
+def _bench(fn, text: str, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = len(fn(text))
+        best = min(best, time.perf_counter() - t0)
+    return best, n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1,10", help="输入大小 (MB)，逗号分隔")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'case':<28}{'size':>8}{'chunks':>8}{'best(ms)':>12}{'MB/s':>10}")
+    for mb in (float(x) for x in args.sizes.split(",")):
+        text = _sample_markdown(int(mb * 1024 * 1024))
+        for name, fn in (
+            ("legacy split_text", _legacy_split_text),
+            ("split_text", split_text),
+            ("render_html_chunks", render_html_chunks),
+        ):
+            t, n = _bench(fn, text, args.repeat)
+            print(f"{name:<28}{mb:>6.0f}MB{n:>8}{t * 1000:>12.1f}{mb / t:>10.1f}")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""启动耗时基准: 子进程里用 python -X importtime 导入 bot，统计导入耗时并做回归检查。
+
+检查项:
+  - 启动时不得导入重型依赖 (PIL、pytesseract、openai、edge_tts、pywinauto)，它们只在用到时导入
+  - 启动时不得探测外部工具路径 (toolpaths 的 where/候选路径探测要推迟到首次使用)
+  - 可选 --budget: bot 导入总耗时中位数超过预算 (毫秒) 视为失败
+任一检查失败时退出码为 1，可直接放进 CI 或手动回归。
+
+用法: python bench_startup.py [--runs 5] [--top 15] [--budget 400]
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+HEAVY = ("PIL", "pytesseract", "openai", "edge_tts", "pywinauto")
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# 导入 bot 之后打印已导入的重型模块和已探测的工具，importtime 输出走 stderr，互不干扰
+_PROBE = (
+    "import sys, bot, toolpaths; "
+    "print(','.join(sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1:])))); "
+    "print(','.join(sorted(toolpaths._resolved)))"
+)
+
+
+def _run_once(base: str) -> tuple[dict, list[str], list[str]]:
+    """返回 ({模块: (自身微秒, 累计微秒, 深度)}, 已导入的重型模块, 已探测的工具)。"""
+    env = dict(os.environ, TERM_BACKEND="fake", PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE, *HEAVY],
+                          cwd=base, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        sys.exit(f"导入 bot 失败:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            modules[m.group(4)] = (int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2)
+    heavy, probed = (proc.stdout.splitlines() + ["", ""])[:2]
+    return modules, [x for x in heavy.split(",") if x], [x for x in probed.split(",") if x]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="列出累计耗时最多的前 N 个顶层模块")
+    ap.add_argument("--budget", type=float, default=0, help="bot 导入耗时上限 (毫秒)，0 为不检查")
+    args = ap.parse_args()
+    base = os.path.dirname(os.path.abspath(__file__))
+
+    _run_once(base)  # 预热磁盘缓存和 __pycache__
+    runs = [_run_once(base) for _ in range(args.runs)]
+    total = statistics.median(r[0]["bot"][1] for r in runs) / 1000
+    print(f"import bot: 中位数 {total:.1f} ms ({args.runs} 次)")
+
+    print(f"\n{'module':<24}{'cumulative(ms)':>16}{'self(ms)':>10}")
+    top = {}
+    for name, (_, _, depth) in runs[0][0].items():
+        if depth == 1:  # bot 直接或首次间接导入的模块
+            top[name] = (statistics.median(r[0].get(name, (0, 0))[1] for r in runs) / 1000,
+                         statistics.median(r[0].get(name, (0, 0))[0] for r in runs) / 1000)
+    for name, (cum, own) in sorted(top.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"{name:<24}{cum:>16.1f}{own:>10.1f}")
+
+    failed = False
+    heavy = sorted(set().union(*(r[1] for r in runs)))
+    probed = sorted(set().union(*(r[2] for r in runs)))
+    if heavy:
+        failed = True
+        print(f"\n❌ 启动时导入了重型模块: {', '.join(heavy)}")
+    if probed:
+        failed = True
+        print(f"\n❌ 启动时探测了工具路径: {', '.join(probed)}")
+    if args.budget and total > args.budget:
+        failed = True
+        print(f"\n❌ 导入耗时 {total:.1f} ms 超出预算 {args.budget:.0f} ms")
+    if not failed:
+        print("\n✅ 未导入重型模块，未探测工具路径" + (f"，耗时在预算 {args.budget:.0f} ms 内" if args.budget else ""))
+    sys.stdout.flush()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""term_render 基准: 200 列 × 80 行虚拟屏幕渲染帧率。
+
+场景:
+  full       每帧整屏重画 (首帧或行图缓存全部未命中时的代价)
+  one-row    每帧只改一行 (spinner/计时器刷新)
+  scroll     每帧滚动一行并输出新行 (持续输出日志)
+  naive      对照: 每帧 ImageDraw.text 整屏重画
+另外给出 PNG / WebP / JPEG 单帧编码耗时与体积。
+
+用法: python bench_term_render.py [--cols 200] [--rows 80] [--frames 60]
+"""
+import sys
+import time
+import random
+import argparse
+
+from PIL import Image, ImageDraw
+
+from vscreen import Screen
+from term_render import TermRenderer, shared_atlas, DEFAULT_BG, DEFAULT_FG
+
+_WORDS = ["def", "return", "self", "import", "\x1b[32mok\x1b[0m", "\x1b[1;31merror\x1b[0m",
+          "path/to/file.py", "测试", "value=42", "\x1b[7m inverse \x1b[0m", "✻", "│"]
+
+
+def _line(rnd: random.Random, cols: int) -> str:
+    out, n = [], 0
+    while n < cols - 12:
+        w = rnd.choice(_WORDS)
+        out.append(w)
+        n += len(w) + 1
+    return " ".join(out)
+
+
+def _filled_screen(cols: int, rows: int, seed: int = 1) -> tuple[Screen, random.Random]:
+    rnd = random.Random(seed)
+    s = Screen(cols, rows, scrollback=0)
+    s.feed("\r\n".join(_line(rnd, cols) for _ in range(rows)))
+    return s, rnd
+
+
+def _fps(frames: int, fn) -> float:
+    t0 = time.perf_counter()
+    for i in range(frames):
+        fn(i)
+    return frames / (time.perf_counter() - t0)
+
+
+def _naive(screen: Screen) -> Image.Image:
+    """旧做法: 每帧新建画布，逐行 draw.text 整屏重画。"""
+    a = shared_atlas()
+    img = Image.new("RGB", (screen.cols * a.cell_w, screen.rows * a.cell_h), DEFAULT_BG)
+    draw = ImageDraw.Draw(img)
+    for y, line in enumerate(screen.display()):
+        draw.text((0, y * a.cell_h), line, font=a.font, fill=DEFAULT_FG)
+    return img
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cols", type=int, default=200)
+    ap.add_argument("--rows", type=int, default=80)
+    ap.add_argument("--frames", type=int, default=60)
+    args = ap.parse_args()
+    cols, rows, frames = args.cols, args.rows, args.frames
+    shared_atlas()  # 图集初始化不计入
+
+    print(f"屏幕 {cols}x{rows}, 每项 {frames} 帧")
+    print(f"{'case':<12}{'fps':>10}{'ms/frame':>12}{'rows drawn':>12}{'rows cached':>13}")
+
+    def report(name: str, fps: float, r: TermRenderer | None = None) -> None:
+        drawn = r.stats["rows_drawn"] if r else rows * frames
+        cached = r.stats["rows_cached"] if r else 0
+        print(f"{name:<12}{fps:>10.1f}{1000 / fps:>12.2f}{drawn:>12}{cached:>13}")
+
+    # 整屏: 每帧清空行缓存，强制全部重画
+    s, _ = _filled_screen(cols, rows)
+    r = TermRenderer()
+
+    def full(i):
+        r._rows.clear()
+        r.render(s, full=True)
+    report("full", _fps(frames, full), r)
+
+    # 单行变化: 状态行上的计时器
+    s, _ = _filled_screen(cols, rows)
+    r = TermRenderer()
+    r.render(s)
+
+    def one_row(i):
+        s.feed(f"\x1b[{rows};1H\x1b[2K\x1b[33m✻ Thinking… ({i}s · esc to interrupt)\x1b[0m")
+        r.render(s)
+    report("one-row", _fps(frames, one_row), r)
+
+    # 滚动: 每帧底部新增一行，其余行上移 (行图命中缓存)
+    s, rnd = _filled_screen(cols, rows)
+    r = TermRenderer()
+    r.render(s)
+    new_lines = [_line(rnd, cols) for _ in range(frames)]
+
+    def scroll(i):
+        s.feed("\r\n" + new_lines[i])
+        r.render(s)
+    report("scroll", _fps(frames, scroll), r)
+
+    s, _ = _filled_screen(cols, rows)
+    report("naive", _fps(frames, lambda i: _naive(s)))
+
+    print(f"\n{'format':<12}{'ms':>10}{'KB':>10}")
+    s, _ = _filled_screen(cols, rows)
+    r = TermRenderer()
+    r.render(s)
+    for fmt in ("png", "webp", "jpeg"):
+        t0 = time.perf_counter()
+        n = 5
+        for _ in range(n):
+            data = r.snapshot(s, fmt)
+        dt = (time.perf_counter() - t0) / n
+        print(f"{fmt:<12}{dt * 1000:>10.1f}{len(data) / 1024:>10.1f}")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
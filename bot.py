@@ -17,13 +17,19 @@ from config import BOT_TOKEN, ALLOWED_USERS, BOT_COMMANDS, state, logger
 from claude_detect import find_claude_windows
 from utils import _load_labels, _load_templates, _load_panel, _load_aliases, _load_state, _save_state
 from stream_mode import _kill_stream_proc
+from shell import kill_all_runs
+from logtail import stop_all_follows
+from pty_session import close_all as close_pty_sessions
+from storage import gc_loop
+import hook_ipc
+import toolpaths
 from handlers import (
     auth_gate,
     cmd_start, cmd_screenshot, cmd_grab, cmd_key,
     cmd_watch, cmd_stop, cmd_break, cmd_delay, cmd_auto,
-    cmd_windows, cmd_new, cmd_cd, cmd_history, cmd_reload,
+    cmd_windows, cmd_new, cmd_cd, cmd_shell, cmd_jobs, cmd_history, cmd_reload,
     cmd_cost, cmd_export, cmd_undo,
-    cmd_diff, cmd_log, cmd_search, cmd_schedule,
+    cmd_diff, cmd_log, cmd_output, cmd_storage, cmd_timelapse, cmd_search, cmd_schedule,
     cmd_tpl, cmd_proj,
     cmd_panel, cmd_clip, cmd_autoyes,
     cmd_quiet, cmd_alias, cmd_batch, cmd_tts, cmd_ocr,
@@ -52,9 +58,13 @@ async def post_init(application: Application) -> None:
     logger.info("命令菜单已注册")
     # 启动常驻被动监控（等第一条消息获取 chat_id 后自动生效）
     _start_passive_monitor(application)
+    state["storage_gc_task"] = asyncio.create_task(gc_loop())
+    asyncio.create_task(asyncio.to_thread(toolpaths.warm))  # 探测 Git Bash 等可能阻塞，放到线程里
+    from health import start_health_server, start_heartbeat
+    start_heartbeat()  # 供 watchdog.py 检测事件循环卡死
     try:
-        from health import start_health_server
-        await start_health_server()
+        port = await start_health_server()
+        hook_ipc.start(application, port)  # notify_hook.py 优先把事件交给运行中的 bot
     except Exception as e:
         logger.warning(f"Health server skipped: {e}")
 
@@ -62,11 +72,15 @@ async def post_init(application: Application) -> None:
 def _cleanup():
     _save_state()
     _kill_stream_proc()
+    kill_all_runs()
+    stop_all_follows()
+    close_pty_sessions()
+    hook_ipc.stop()
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
         loop = None
-    for key in ("monitor_task", "passive_monitor_task"):
+    for key in ("monitor_task", "passive_monitor_task", "storage_gc_task", "heartbeat_task", "hook_task"):
         task = state.get(key)
         if task and not task.done():
             if loop and loop.is_running():
@@ -76,35 +90,17 @@ def _cleanup():
     logger.info("BedCode 清理完成")
 
 
-def main() -> None:
-    signal.signal(signal.SIGINT, lambda *_: _cleanup())
-    signal.signal(signal.SIGTERM, lambda *_: _cleanup())
-    if not BOT_TOKEN or BOT_TOKEN == "your_bot_token_here":
-        print("错误: 请在 .env 中设置 TELEGRAM_BOT_TOKEN")
-        return
-    if not ALLOWED_USERS:
-        print("错误: 请在 .env 中设置 ALLOWED_USER_IDS")
-        return
-
-    windows = find_claude_windows()
-    if windows:
-        state["target_handle"] = windows[0]["handle"]
-        logger.info(f"锁定窗口: {windows[0]['title']} ({windows[0]['handle']})")
+def build_application(token: str = BOT_TOKEN, request=None, get_updates_request=None) -> Application:
+    """创建 Application 并注册全部处理器。request / get_updates_request 可注入自定义的
+    telegram.request.BaseRequest (如 fake_tg.FakeBotAPI)，用于离线测试和压测。"""
+    builder = Application.builder().token(token).post_init(post_init)
+    if request is None:
+        builder = builder.read_timeout(30).write_timeout(30).connect_timeout(30).pool_timeout(30)
     else:
-        logger.warning("未找到 Claude Code 窗口")
-
-    logger.info(f"BedCode v5 启动 | 用户: {ALLOWED_USERS}")
-
-    app = (
-        Application.builder()
-        .token(BOT_TOKEN)
-        .post_init(post_init)
-        .read_timeout(30)
-        .write_timeout(30)
-        .connect_timeout(30)
-        .pool_timeout(30)
-        .build()
-    )
+        builder = builder.request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    app = builder.build()
     app.add_error_handler(error_handler)
     app.add_handler(TypeHandler(Update, auth_gate), group=-1)
 
@@ -120,6 +116,8 @@ def main() -> None:
     app.add_handler(CommandHandler("windows", cmd_windows))
     app.add_handler(CommandHandler("new", cmd_new))
     app.add_handler(CommandHandler("cd", cmd_cd))
+    app.add_handler(CommandHandler("shell", cmd_shell))
+    app.add_handler(CommandHandler("jobs", cmd_jobs))
     app.add_handler(CommandHandler("history", cmd_history))
     app.add_handler(CommandHandler("cost", cmd_cost))
     app.add_handler(CommandHandler("export", cmd_export))
@@ -127,6 +125,9 @@ def main() -> None:
     app.add_handler(CommandHandler("reload", cmd_reload))
     app.add_handler(CommandHandler("diff", cmd_diff))
     app.add_handler(CommandHandler("log", cmd_log))
+    app.add_handler(CommandHandler("output", cmd_output))
+    app.add_handler(CommandHandler("storage", cmd_storage))
+    app.add_handler(CommandHandler("timelapse", cmd_timelapse))
     app.add_handler(CommandHandler("search", cmd_search))
     app.add_handler(CommandHandler("schedule", cmd_schedule))
     app.add_handler(CommandHandler("proj", cmd_proj))
@@ -146,6 +147,29 @@ def main() -> None:
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
     app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
 
+    return app
+
+
+def main() -> None:
+    signal.signal(signal.SIGINT, lambda *_: _cleanup())
+    signal.signal(signal.SIGTERM, lambda *_: _cleanup())
+    if not BOT_TOKEN or BOT_TOKEN == "your_bot_token_here":
+        print("错误: 请在 .env 中设置 TELEGRAM_BOT_TOKEN")
+        return
+    if not ALLOWED_USERS:
+        print("错误: 请在 .env 中设置 ALLOWED_USER_IDS")
+        return
+
+    windows = find_claude_windows()
+    if windows:
+        state["target_handle"] = windows[0]["handle"]
+        logger.info(f"锁定窗口: {windows[0]['title']} ({windows[0]['handle']})")
+    else:
+        logger.warning("未找到 Claude Code 窗口")
+
+    logger.info(f"BedCode v5 启动 | 用户: {ALLOWED_USERS}")
+
+    app = build_application()
     app.run_polling(
         allowed_updates=Update.ALL_TYPES,
         drop_pending_updates=True,
@@ -5,10 +5,8 @@ import glob
 import logging
 import time
 
-from pywinauto import Desktop
-
 from config import SPINNER_CHARS, state
-from win32_api import get_window_title
+from terminal import backend
 
 logger = logging.getLogger("bedcode")
 
@@ -28,44 +26,20 @@ def detect_claude_state(title: str) -> str:
 
 
 def read_terminal_text(handle: int) -> str:
-    try:
-        from pywinauto import Application as PwaApp
-        app = PwaApp(backend="uia").connect(handle=handle)
-        win = app.window(handle=handle)
-        for child in win.descendants():
-            try:
-                iface = child.iface_text
-                if iface:
-                    text = iface.DocumentRange.GetText(-1)
-                    if isinstance(text, bytes):
-                        text = text.decode('utf-8', errors='replace')
-                    if text and len(text.strip()) > 10:
-                        text = text.encode('utf-8', errors='replace').decode('utf-8')
-                        return text
-            except Exception:
-                pass
-            try:
-                val = child.legacy_properties().get("Value", "")
-                if isinstance(val, bytes):
-                    val = val.decode('utf-8', errors='replace')
-                if val and len(val.strip()) > 10:
-                    val = val.encode('utf-8', errors='replace').decode('utf-8')
-                    return val
-            except Exception:
-                pass
-        return ""
-    except Exception as e:
-        logger.debug(f"UIA 文本读取失败: {e}")
-        return ""
-
-
-def read_last_transcript_response() -> str:
-    claude_dir = os.path.join(os.path.expanduser("~"), ".claude", "projects")
-    all_jsonl = glob.glob(os.path.join(claude_dir, "**", "*.jsonl"), recursive=True)
-    all_jsonl = [f for f in all_jsonl if "subagent" not in f]
-    if not all_jsonl:
-        return ""
-    latest = max(all_jsonl, key=os.path.getmtime)
+    return backend().read_text(handle)
+
+
+def read_last_transcript_response(path: str | None = None) -> str:
+    """最后一条 assistant 回复。path 为 hook 给出的 transcript；不知道时取最近修改的那个。"""
+    if path and os.path.isfile(path):
+        latest = path
+    else:
+        claude_dir = os.path.join(os.path.expanduser("~"), ".claude", "projects")
+        all_jsonl = glob.glob(os.path.join(claude_dir, "**", "*.jsonl"), recursive=True)
+        all_jsonl = [f for f in all_jsonl if "subagent" not in f]
+        if not all_jsonl:
+            return ""
+        latest = max(all_jsonl, key=os.path.getmtime)
     try:
         with open(latest, "r", encoding="utf-8") as f:
             lines = f.readlines()
@@ -151,27 +125,15 @@ def _get_active_projects(max_count: int = 10) -> list[str]:
     return result
 
 
-def find_claude_windows() -> list[dict]:
+def find_claude_windows(max_age: float = 5) -> list[dict]:
     global _windows_cache, _windows_cache_time
-    if time.time() - _windows_cache_time < 5:
+    if time.time() - _windows_cache_time < max_age:
         return _windows_cache
-    desktop = Desktop(backend="uia")
     results = []
-    for w in desktop.windows():
-        try:
-            title = w.window_text()
-            if "claude" in title.lower():
-                st = detect_claude_state(title)
-                label = state["window_labels"].get(w.handle, "")
-                results.append({
-                    "title": title,
-                    "handle": w.handle,
-                    "class": w.class_name(),
-                    "state": st,
-                    "label": label,
-                })
-        except Exception:
-            continue
+    for w in backend().list_sessions():
+        w["state"] = detect_claude_state(w["title"])
+        w["label"] = state["window_labels"].get(w["handle"], "")
+        results.append(w)
     order = {"idle": 0, "thinking": 1, "unknown": 2}
     results.sort(key=lambda x: (order.get(x["state"], 9), -x["handle"]))
     _windows_cache = results
@@ -0,0 +1,77 @@
+"""多窗口截图拼图: 固定画布宽度的网格，每格带编号/标签和状态徽标，一次上传。"""
+import io
+import math
+
+CANVAS_W = 1600
+_HEADER_H = 30
+_ASPECT = 10 / 16  # 格子高宽比，接近常见终端窗口
+_BG = (24, 24, 28)
+_HEADER_BG = (40, 40, 48)
+_BADGE = {
+    "thinking": ((230, 150, 30), "思考中"),
+    "idle": ((60, 180, 90), "空闲"),
+    "unknown": ((120, 120, 120), "未知"),
+}
+_FONTS = ["msyh.ttc", "msyh.ttf", "simhei.ttf", "NotoSansCJK-Regular.ttc", "DejaVuSans.ttf", "arial.ttf"]
+_font_cache = {}
+
+
+def _font(size: int):
+    if size not in _font_cache:
+        from PIL import ImageFont
+        font = None
+        for name in _FONTS:
+            try:
+                font = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        _font_cache[size] = font or ImageFont.load_default()
+    return _font_cache[size]
+
+
+def grid_shape(n: int) -> tuple[int, int, int]:
+    """返回 (列数, 行数, 单格宽度)。画布宽度固定，窗口越多格子越小。"""
+    cols = max(1, math.ceil(math.sqrt(n)))
+    rows = max(1, math.ceil(n / cols))
+    return cols, rows, CANVAS_W // cols
+
+
+def cell_width(n: int) -> int:
+    """截图时的目标宽度，避免截出比格子更大的图再缩小。"""
+    return grid_shape(n)[2]
+
+
+def build_collage(frames: list[tuple[bytes | None, str, str]]) -> bytes:
+    """frames: [(jpeg 字节或 None, 标签, 状态)] → JPEG 拼图。"""
+    from PIL import Image, ImageDraw
+    cols, rows, cell_w = grid_shape(len(frames))
+    img_h = int(cell_w * _ASPECT)
+    cell_h = _HEADER_H + img_h
+    canvas = Image.new("RGB", (cols * cell_w, rows * cell_h), _BG)
+    draw = ImageDraw.Draw(canvas)
+    font = _font(16)
+
+    for i, (data, label, st) in enumerate(frames):
+        x = (i % cols) * cell_w
+        y = (i // cols) * cell_h
+        draw.rectangle((x, y, x + cell_w - 1, y + _HEADER_H - 1), fill=_HEADER_BG)
+        color, st_text = _BADGE.get(st, _BADGE["unknown"])
+        draw.ellipse((x + 8, y + 9, x + 20, y + 21), fill=color)
+        draw.text((x + 28, y + 5), f"#{i+1} {label} [{st_text}]", font=font, fill=(235, 235, 235))
+        if data:
+            try:
+                frame = Image.open(io.BytesIO(data)).convert("RGB")
+                frame.thumbnail((cell_w - 4, img_h - 4))
+                ox = x + (cell_w - frame.width) // 2
+                oy = y + _HEADER_H + (img_h - frame.height) // 2
+                canvas.paste(frame, (ox, oy))
+            except Exception:
+                data = None
+        if not data:
+            draw.text((x + 12, y + _HEADER_H + 12), "截图失败", font=font, fill=(200, 90, 90))
+        draw.rectangle((x, y, x + cell_w - 1, y + cell_h - 1), outline=color)
+
+    out = io.BytesIO()
+    canvas.save(out, format="JPEG", quality=80)
+    return out.getvalue()
@@ -6,10 +6,6 @@ from collections import deque
 from pathlib import Path
 
 from dotenv import load_dotenv
-from telegram import (
-    BotCommand,
-    ReplyKeyboardMarkup, KeyboardButton,
-)
 
 # ── 加载配置 ─────────────────────────────────────────────────────
 load_dotenv()
@@ -31,6 +27,11 @@ for _uid in os.environ.get("ALLOWED_USER_IDS", "").split(","):
             ALLOWED_USERS.add(int(_uid))
         except ValueError:
             print(f"警告: 无效的用户ID '{_uid}'，已跳过")
+# hook 通知在没有活跃会话时发给 .env 中列出的第一个用户，与 notify_hook.py 直接发送时的取法一致
+try:
+    HOOK_CHAT_ID = int(os.environ.get("ALLOWED_USER_IDS", "").split(",")[0].strip())
+except ValueError:
+    HOOK_CHAT_ID = None
 READONLY_USERS = set()
 for _uid in os.environ.get("READONLY_USER_IDS", "").split(","):
     _uid = _uid.strip()
@@ -40,8 +41,38 @@ for _uid in os.environ.get("READONLY_USER_IDS", "").split(","):
         except ValueError:
             print(f"警告: 无效的只读用户ID '{_uid}'，已跳过")
 SHELL_TIMEOUT = int(os.environ.get("SHELL_TIMEOUT", "120"))
+SHELL_IDLE_TIMEOUT = int(os.environ.get("SHELL_IDLE_TIMEOUT", "1800"))
+SHELL_MAX_JOBS = int(os.environ.get("SHELL_MAX_JOBS", "2"))
 WORK_DIR = os.environ.get("WORK_DIR", str(Path.home()))
 SCREENSHOT_DELAY = int(os.environ.get("SCREENSHOT_DELAY", "15"))
+OUTPUT_DOC_THRESHOLD = int(os.environ.get("OUTPUT_DOC_THRESHOLD", "12000"))
+OUTPUT_PLAIN_MAX = int(os.environ.get("OUTPUT_PLAIN_MAX", str(512 * 1024)))
+
+
+def _storage_quota(name: str, mb: int, days: int) -> tuple[int, int]:
+    """(最大字节数, 最长保留秒数)，可用 STORAGE_<目录>_MB / STORAGE_<目录>_DAYS 覆盖。"""
+    key = name.upper()
+    return (
+        int(os.environ.get(f"STORAGE_{key}_MB", str(mb))) * 1024 * 1024,
+        int(os.environ.get(f"STORAGE_{key}_DAYS", str(days))) * 86400,
+    )
+
+
+STORAGE_QUOTAS = {
+    "images": _storage_quota("images", 200, 7),
+    "voices": _storage_quota("voices", 100, 3),
+    "messages": _storage_quota("messages", 50, 14),
+    "shell_logs": _storage_quota("shell_logs", 200, 3),
+}
+STORAGE_GC_INTERVAL = int(os.environ.get("STORAGE_GC_INTERVAL", "600"))
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(min(2, os.cpu_count() or 1))))
+TIMELAPSE_MAX_FRAMES = int(os.environ.get("TIMELAPSE_MAX_FRAMES", "60"))
+TIMELAPSE_FORMAT = os.environ.get("TIMELAPSE_FORMAT", "auto").lower()  # auto / mp4 / gif / webp
+TERM_BACKEND = os.environ.get("TERM_BACKEND", "auto").lower()  # auto / win32 / tmux / pty / fake
+TMUX_SOCKET = os.environ.get("TMUX_SOCKET", "")  # tmux -L 套接字名，空为默认服务器
+PTY_COMMAND = os.environ.get("PTY_COMMAND", "claude")  # tmux / pty 后端 /new 启动的命令
+PTY_SIZE = os.environ.get("PTY_SIZE", "120x40")  # pty 会话的 列x行
+TMUX_CONTROL = os.environ.get("TMUX_CONTROL", "true").lower() in ("true", "1", "yes")  # 用 tmux -C 推送代替轮询
 
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LABELS_FILE = os.path.join(_BASE_DIR, "window_labels.json")
@@ -50,6 +81,9 @@ TEMPLATES_FILE = os.path.join(_BASE_DIR, "templates.json")
 PANEL_FILE = os.path.join(_BASE_DIR, "panel.json")
 ALIASES_FILE = os.path.join(_BASE_DIR, "aliases.json")
 STATE_FILE = os.path.join(_BASE_DIR, "state.json")
+TOOL_PATHS_FILE = os.path.join(_BASE_DIR, "tool_paths.json")  # 见 toolpaths.py
+HEARTBEAT_FILE = os.path.join(_BASE_DIR, "heartbeat.json")  # 见 health.py / watchdog.py
+HOOK_IPC_FILE = os.path.join(_BASE_DIR, "hook_ipc.json")  # 见 hook_ipc.py / notify_hook.py
 
 # ── 日志 ─────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -62,50 +96,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger("bedcode")
 
-# ── 命令菜单定义 ──────────────────────────────────────────────────
+# ── 命令菜单定义 (命令, 说明)，set_my_commands 直接接受元组 ──────────
 BOT_COMMANDS = [
-    BotCommand("start", "显示状态和使用说明"),
-    BotCommand("screenshot", "截取终端画面(不打断)"),
-    BotCommand("ocr", "截图并提取文字"),
-    BotCommand("grab", "抓取终端文本(不打断)"),
-    BotCommand("key", "发送按键 如 1 2 ↑ ↓ tab esc enter"),
-    BotCommand("watch", "手动开启监控循环"),
-    BotCommand("stop", "停止监控循环"),
-    BotCommand("break", "发送 Ctrl+C 中断 Claude"),
-    BotCommand("delay", "设置截图间隔秒数"),
-    BotCommand("auto", "开关自动监控"),
-    BotCommand("windows", "扫描窗口并选择目标"),
-    BotCommand("new", "启动新 Claude Code 实例"),
-    BotCommand("cd", "切换 Shell 工作目录"),
-    BotCommand("history", "查看最近20条消息历史"),
-    BotCommand("cost", "查看本次会话费用"),
-    BotCommand("export", "导出最近对话记录"),
-    BotCommand("undo", "发送 Ctrl+Z 撤销"),
-    BotCommand("reload", "热重载配置"),
-    BotCommand("tpl", "消息模板管理"),
-    BotCommand("diff", "查看 Git 变更"),
-    BotCommand("log", "查看机器人日志"),
-    BotCommand("search", "搜索历史消息"),
-    BotCommand("schedule", "定时发送消息"),
-    BotCommand("panel", "自定义按钮面板"),
-    BotCommand("proj", "快速切换项目"),
-    BotCommand("quiet", "设置免打扰时段"),
-    BotCommand("alias", "命令别名管理"),
-    BotCommand("clip", "剪贴板同步"),
-    BotCommand("autoyes", "自动确认 y/n 提示"),
-    BotCommand("batch", "批量排队消息"),
-    BotCommand("tts", "文字转语音"),
+    ("start", "显示状态和使用说明"),
+    ("screenshot", "截取终端画面(不打断)"),
+    ("ocr", "截图并提取文字"),
+    ("grab", "抓取终端文本(不打断)"),
+    ("key", "发送按键 如 1 2 ↑ ↓ tab esc enter"),
+    ("watch", "手动开启监控循环"),
+    ("stop", "停止监控循环"),
+    ("break", "发送 Ctrl+C 中断 Claude"),
+    ("delay", "设置截图间隔秒数"),
+    ("auto", "开关自动监控"),
+    ("windows", "扫描窗口并选择目标"),
+    ("new", "启动新 Claude Code 实例"),
+    ("cd", "切换 Shell 工作目录"),
+    ("shell", "常驻 Shell 会话 on/off/reset"),
+    ("jobs", "后台任务 列表/tail/kill/get"),
+    ("history", "查看最近20条消息历史"),
+    ("cost", "查看本次会话费用"),
+    ("export", "导出最近对话记录"),
+    ("undo", "发送 Ctrl+Z 撤销"),
+    ("reload", "热重载配置"),
+    ("tpl", "消息模板管理"),
+    ("diff", "查看 Git 变更 (按文件翻页)"),
+    ("log", "查看日志 [行数] [级别] [10m] [正则] | follow"),
+    ("output", "长输出转文件阈值"),
+    ("storage", "查看缓存目录占用 | gc 立即清理"),
+    ("timelapse", "思考过程延时动画 on/off/帧数"),
+    ("search", "搜索历史消息"),
+    ("schedule", "定时发送消息"),
+    ("panel", "自定义按钮面板"),
+    ("proj", "快速切换项目"),
+    ("quiet", "设置免打扰时段"),
+    ("alias", "命令别名管理"),
+    ("clip", "剪贴板同步"),
+    ("autoyes", "自动确认 y/n 提示"),
+    ("batch", "批量排队消息"),
+    ("tts", "文字转语音"),
 ]
 
 # ── 常驻按钮面板 ─────────────────────────────────────────────────
-REPLY_KEYBOARD = ReplyKeyboardMarkup(
-    [
-        [KeyboardButton("📷 截屏"), KeyboardButton("🪟 窗口"), KeyboardButton("🆕 新实例")],
-        [KeyboardButton("👀 监控"), KeyboardButton("⏹ 停止"), KeyboardButton("🔄 状态")],
-    ],
-    resize_keyboard=True,
-    is_persistent=True,
-)
+REPLY_KEYBOARD_ROWS = [
+    ["📷 截屏", "🪟 窗口", "🆕 新实例"],
+    ["👀 监控", "⏹ 停止", "🔄 状态"],
+]
 
 # ── Claude Code spinner 字符集 ────────────────────────────────────
 SPINNER_CHARS = set("⠂⠃⠄⠆⠇⠋⠙⠸⠴⠤⠐⠈⠁⠉⠊⠒⠓⠔⠕⠖⠗⠘⠚⠛⠜⠝⠞⠟⠠⠡⠢⠣⠥⠦⠧⠨⠩⠪⠫⠬⠭⠮⠯⠰⠱⠲⠳⠵⠶⠷⠹⠺⠻⠼⠽⠾⠿")
@@ -138,4 +173,9 @@ state = {
     "aliases": {},
     "auto_pin": True,
     "auto_yes": False,
+    "shell_persistent": False,
+    "output_limits": {},
+    "timelapse": False,
+    "timelapse_frames": 0,  # 0 = 使用 TIMELAPSE_MAX_FRAMES
+    "session_bases": {},  # 仓库根目录 → {"head": Claude 会话开始时的 HEAD, "session": 窗口句柄}
 }
@@ -0,0 +1,237 @@
+"""Git diff 服务: 按 (仓库, HEAD, index mtime) 缓存，按文件分页，大 diff 生成 HTML 附件。
+
+缓存命中前用 git status (不写 index) 和已改动文件的 stat 校验工作区没有变化。
+"""
+import os
+import html
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from config import state
+from utils import _save_state
+from toolpaths import git_async
+
+logger = logging.getLogger("bedcode")
+
+_EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+_CACHE_MAX = 8
+_cache = OrderedDict()  # key → diff dict
+_views = {}  # chat_id → key，用于翻页按钮
+
+
+async def _git(cwd: str, *args: str, timeout: int = 30) -> tuple[int, str]:
+    proc = await asyncio.create_subprocess_exec(
+        await git_async(), "-C", cwd, *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1, ""
+    return proc.returncode, out.decode("utf-8", errors="replace")
+
+
+async def _repo_info(cwd: str) -> tuple[str, str, str] | None:
+    """一次 rev-parse 拿到 (仓库根目录, .git 目录, HEAD)。"""
+    rc, out = await _git(cwd, "rev-parse", "--show-toplevel", "--absolute-git-dir", "HEAD")
+    lines = out.strip().splitlines()
+    if rc != 0 or len(lines) < 3:
+        return None
+    return os.path.normpath(lines[0]), lines[1], lines[2]
+
+
+async def record_session_base(cwd: str, session: int | None = None, force: bool = False) -> None:
+    """记录 Claude 会话开始时的提交，作为之后 /diff 的对比基准。
+
+    session 为 Claude 窗口句柄: 换了会话重新记录；启动时 (force) 还不知道窗口，记为 None，
+    由之后第一次发消息的会话接手。
+    """
+    try:
+        info = await _repo_info(cwd)
+    except Exception:
+        return
+    if not info:
+        return
+    root, _, head = info
+    bases = state.setdefault("session_bases", {})
+    cur = bases.get(root)
+    if not isinstance(cur, dict):  # 旧版本只存了提交
+        cur = None
+    if not force and cur and cur.get("session") in (None, session):
+        if cur.get("session") is None and session is not None:
+            cur["session"] = session
+            _save_state()
+        return
+    bases[root] = {"head": head, "session": session}
+    _save_state()
+    logger.info(f"[diff] 记录会话基准 {root} @ {head[:8]} (会话 {session})")
+
+
+def _session_base(root: str) -> str | None:
+    cur = state.get("session_bases", {}).get(root)
+    return cur.get("head") if isinstance(cur, dict) else cur
+
+
+def _parse_patch(patch: str) -> list[dict]:
+    files = []
+    cur = None
+    for line in patch.split("\n"):
+        if line.startswith("diff --git "):
+            cur = {"path": line.split(" b/", 1)[-1], "adds": 0, "dels": 0, "lines": [line]}
+            files.append(cur)
+            continue
+        if cur is None:
+            continue
+        cur["lines"].append(line)
+        if line.startswith("+++ ") or line.startswith("--- "):
+            if line.startswith("+++ b/"):
+                cur["path"] = line[6:]
+        elif line.startswith("+"):
+            cur["adds"] += 1
+        elif line.startswith("-"):
+            cur["dels"] += 1
+    for f in files:
+        f["patch"] = "\n".join(f.pop("lines")).rstrip("\n")
+    return files
+
+
+def _stat_signature(root: str, files: list[dict]) -> tuple:
+    sig = []
+    for f in files:
+        try:
+            st = os.stat(os.path.join(root, f["path"]))
+            sig.append((f["path"], st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((f["path"], None, None))
+    return tuple(sig)
+
+
+async def _status(root: str) -> str | None:
+    """工作区签名的一半: status 发现新改动的文件，已改动文件被继续编辑则靠 stat (status 输出不变)。
+
+    --no-optional-locks 让 status 不回写 index，否则 index mtime 变化会让缓存键失效。
+    """
+    rc, out = await _git(root, "--no-optional-locks", "status", "--porcelain", "-uno", "-z")
+    return out if rc == 0 else None
+
+
+async def get_diff(cwd: str, base_ref: str | None = None, refresh: bool = False) -> dict | None:
+    """返回 {"key","root","base","head","files","total"}；不是 Git 仓库返回 None。"""
+    info = await _repo_info(cwd)
+    if not info:
+        return None
+    root, git_dir, head = info
+    if base_ref == _EMPTY_TREE:
+        base = base_ref
+    elif base_ref:
+        rc, out = await _git(root, "rev-parse", "--verify", f"{base_ref}^{{commit}}")
+        if rc != 0:
+            return None
+        base = out.strip()
+    else:
+        base = _session_base(root)
+        if not base:
+            rc, out = await _git(root, "rev-parse", "--verify", "HEAD~1")
+            base = out.strip() if rc == 0 else _EMPTY_TREE
+    try:
+        index_mtime = os.stat(os.path.join(git_dir, "index")).st_mtime_ns
+    except OSError:
+        index_mtime = 0
+    key = (root, head, index_mtime, base)
+
+    cached = _cache.get(key)
+    # 编辑工作区文件时 index 不会变，用工作区签名校验
+    status = await _status(root)
+    if cached and not refresh and (status, _stat_signature(root, cached["files"])) == cached["sig"]:
+        _cache.move_to_end(key)
+        return cached
+
+    t0 = time.time()
+    rc, patch = await _git(root, "diff", "--no-color", "--no-ext-diff", base, timeout=60)
+    if rc != 0:
+        return None
+    files = _parse_patch(patch)
+    diff = {
+        "key": key, "root": root, "base": base, "head": head,
+        "files": files, "total": len(patch),
+        "sig": (status, _stat_signature(root, files)),
+    }
+    _cache[key] = diff
+    _cache.move_to_end(key)
+    while len(_cache) > _CACHE_MAX:
+        _cache.popitem(last=False)
+    logger.info(f"[diff] {root} {base[:8]}..工作区 {len(files)} 个文件 {len(patch)} 字 ({time.time() - t0:.2f}s)")
+    return diff
+
+
+def set_view(chat_id: int, diff: dict) -> None:
+    _views[chat_id] = diff["key"]
+
+
+def get_view(chat_id: int) -> dict | None:
+    key = _views.get(chat_id)
+    return _cache.get(key) if key else None
+
+
+def summary_text(diff: dict) -> str:
+    adds = sum(f["adds"] for f in diff["files"])
+    dels = sum(f["dels"] for f in diff["files"])
+    base = diff["base"][:8] if diff["base"] != _EMPTY_TREE else "(空)"
+    lines = [f"{os.path.basename(diff['root'])}: {base} → 工作区 · {len(diff['files'])} 个文件 +{adds} -{dels}"]
+    for i, f in enumerate(diff["files"][:30]):
+        lines.append(f"{i+1}. {f['path']} +{f['adds']} -{f['dels']}")
+    if len(diff["files"]) > 30:
+        lines.append(f"... 还有 {len(diff['files']) - 30} 个文件")
+    return "\n".join(lines)
+
+
+_HTML_CSS = """
+body{font:13px/1.45 Consolas,Menlo,monospace;background:#0d1117;color:#c9d1d9;margin:0}
+h1{font-size:15px;padding:12px 16px;margin:0;background:#161b22;border-bottom:1px solid #30363d}
+.f{margin:16px;border:1px solid #30363d;border-radius:6px;overflow:hidden}
+.f h2{font-size:13px;margin:0;padding:8px 12px;background:#161b22}
+.f h2 .a{color:#3fb950}.f h2 .d{color:#f85149}
+pre{margin:0;padding:8px 0;overflow-x:auto}
+pre span{display:block;padding:0 12px;white-space:pre}
+.add{background:#12261e;color:#aff5b4}.del{background:#2d1214;color:#ffdcd7}
+.hunk{color:#79c0ff;background:#161b2a}.meta{color:#8b949e}
+ul{margin:8px 16px}a{color:#58a6ff}
+"""
+
+
+def _line_class(line: str) -> str:
+    if line.startswith("@@"):
+        return "hunk"
+    if line.startswith(("diff --git", "index ", "+++ ", "--- ", "new file", "deleted file", "similarity", "rename ")):
+        return "meta"
+    if line.startswith("+"):
+        return "add"
+    if line.startswith("-"):
+        return "del"
+    return ""
+
+
+def render_html(diff: dict) -> bytes:
+    """生成带 diff 着色的独立 HTML 文件。"""
+    title = html.escape(f"{os.path.basename(diff['root'])} {diff['base'][:8]} → 工作区")
+    out = [f"<!doctype html><meta charset=utf-8><title>{title}</title><style>{_HTML_CSS}</style><h1>{title}</h1><ul>"]
+    for i, f in enumerate(diff["files"]):
+        out.append(f'<li><a href="#f{i}">{html.escape(f["path"])}</a> +{f["adds"]} -{f["dels"]}</li>')
+    out.append("</ul>")
+    for i, f in enumerate(diff["files"]):
+        out.append(
+            f'<div class=f id=f{i}><h2>{html.escape(f["path"])} '
+            f'<span class=a>+{f["adds"]}</span> <span class=d>-{f["dels"]}</span></h2><pre>'
+        )
+        for line in f["patch"].split("\n"):
+            cls = _line_class(line)
+            attr = f" class={cls}" if cls else ""
+            out.append(f"<span{attr}>{html.escape(line) or ' '}</span>")
+        out.append("</pre></div>")
+    return "".join(out).encode("utf-8")
@@ -0,0 +1,193 @@
+"""结构化事件日志: 紧凑 JSONL 写入 events.jsonl（自动轮转），附带查询 CLI。
+
+每条事件一行 JSON，固定字段:
+  ts 时间戳, ev 事件名, lvl 级别, hwnd 窗口句柄, chat 聊天 ID, dur 耗时(秒), size 负载大小
+其余关键字参数原样写入。高频事件用 sample_event 按比例采样为 debug 级别。
+
+查询:
+  python eventlog.py --ev stream.result --since 2h
+  python eventlog.py --chat 123 --where tool=Bash -n 20
+  python eventlog.py --stats --since 1d
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EVENT_LOG_PATH = os.path.join(_BASE_DIR, "events.jsonl")
+_BACKUPS = 3
+_SAMPLE_RATE = max(1, int(os.environ.get("EVENT_SAMPLE_RATE", "20")))
+
+_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+_sink = None
+_sample_counts = {}
+
+
+def _get_sink() -> logging.Logger:
+    global _sink
+    if _sink is None:
+        sink = logging.getLogger("bedcode.events")
+        sink.propagate = False  # 不进入 bot.log / 控制台
+        sink.setLevel(logging.DEBUG)
+        if not sink.handlers:
+            handler = RotatingFileHandler(
+                EVENT_LOG_PATH, maxBytes=5*1024*1024, backupCount=_BACKUPS, encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            sink.addHandler(handler)
+        _sink = sink
+    return _sink
+
+
+def log_event(event: str, *, hwnd: int = None, chat_id: int = None, duration: float = None,
+              size: int = None, level: str = "info", **fields) -> None:
+    """写入一条结构化事件。值为 None 的字段省略。"""
+    rec = {"ts": round(time.time(), 3), "ev": event, "lvl": level}
+    if hwnd:
+        rec["hwnd"] = hwnd
+    if chat_id is not None:
+        rec["chat"] = chat_id
+    if duration is not None:
+        rec["dur"] = round(duration, 3)
+    if size is not None:
+        rec["size"] = size
+    for k, v in fields.items():
+        if v is not None:
+            rec[k] = v
+    try:
+        _get_sink().log(
+            _LEVELS.get(level, logging.INFO),
+            json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str),
+        )
+    except Exception:
+        pass
+
+
+def sample_event(event: str, **fields) -> None:
+    """高频事件: 每 EVENT_SAMPLE_RATE 次记录一次 debug 事件，附带累计次数 n。"""
+    n = _sample_counts.get(event, 0) + 1
+    _sample_counts[event] = n
+    if n % _SAMPLE_RATE == 1 or _SAMPLE_RATE == 1:
+        log_event(event, level="debug", n=n, **fields)
+
+
+@contextmanager
+def timed(event: str, **fields):
+    """with timed("ocr", hwnd=h): ... —— 结束时记录耗时，异常时附带 error。"""
+    t0 = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        log_event(event, duration=time.perf_counter() - t0, **fields)
+
+
+# ── 查询 ─────────────────────────────────────────────────────────
+def _event_files(path: str = EVENT_LOG_PATH) -> list[str]:
+    """从旧到新排列的轮转文件。"""
+    paths = [f"{path}.{i}" for i in range(_BACKUPS, 0, -1)] + [path]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def _first_ts(path: str) -> float:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.loads(f.readline()).get("ts", 0)
+    except Exception:
+        return 0
+
+
+def _parse_since(s: str) -> float:
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if s[-1:] in units and s[:-1].isdigit():
+        return time.time() - int(s[:-1]) * units[s[-1]]
+    return float(s)
+
+
+def query(ev: str = None, hwnd: int = None, chat: int = None, since: float = None,
+          where: dict = None, min_duration: float = None, level: str = None, path: str = EVENT_LOG_PATH):
+    """按字段流式过滤所有轮转文件，产出匹配的事件 dict。"""
+    files = _event_files(path)
+    if since:
+        # 下一个文件的首条时间早于 since 时，当前文件整体可跳过
+        keep = []
+        for i, p in enumerate(files):
+            nxt = files[i + 1] if i + 1 < len(files) else None
+            if nxt is None or _first_ts(nxt) >= since:
+                keep.append(p)
+        files = keep
+    for p in files:
+        with open(p, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if ev and f'"ev":"{ev.rstrip("*")}' not in line:
+                    continue  # 先做廉价的子串预筛，再解析 JSON
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if ev and not (rec.get("ev") == ev or (ev.endswith("*") and rec.get("ev", "").startswith(ev[:-1]))):
+                    continue
+                if since and rec.get("ts", 0) < since:
+                    continue
+                if hwnd is not None and rec.get("hwnd") != hwnd:
+                    continue
+                if chat is not None and rec.get("chat") != chat:
+                    continue
+                if level and rec.get("lvl") != level:
+                    continue
+                if min_duration is not None and rec.get("dur", 0) < min_duration:
+                    continue
+                if where and any(str(rec.get(k)) != v for k, v in where.items()):
+                    continue
+                yield rec
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="查询 BedCode 结构化事件日志")
+    ap.add_argument("--ev", help="事件名，结尾 * 为前缀匹配，如 stream.*")
+    ap.add_argument("--hwnd", type=int)
+    ap.add_argument("--chat", type=int)
+    ap.add_argument("--since", help="10m / 2h / 1d 或 unix 时间戳")
+    ap.add_argument("--level", help="info / debug / warning / error")
+    ap.add_argument("--min-duration", type=float, help="最小耗时(秒)")
+    ap.add_argument("--where", action="append", default=[], help="key=value，可重复")
+    ap.add_argument("-n", type=int, default=0, help="只输出最后 n 条")
+    ap.add_argument("--stats", action="store_true", help="按事件名汇总次数/耗时/大小")
+    ap.add_argument("--file", default=EVENT_LOG_PATH)
+    args = ap.parse_args(argv)
+
+    where = dict(w.split("=", 1) for w in args.where if "=" in w)
+    it = query(
+        ev=args.ev, hwnd=args.hwnd, chat=args.chat,
+        since=_parse_since(args.since) if args.since else None,
+        where=where, min_duration=args.min_duration, level=args.level, path=args.file,
+    )
+    if args.stats:
+        stats = {}
+        for rec in it:
+            s = stats.setdefault(rec.get("ev", "?"), [0, 0.0, 0])
+            s[0] += 1
+            s[1] += rec.get("dur", 0)
+            s[2] += rec.get("size", 0)
+        print(f"{'event':<28}{'count':>8}{'avg_dur':>10}{'total_size':>12}")
+        for name, (cnt, dur, size) in sorted(stats.items(), key=lambda x: -x[1][0]):
+            print(f"{name:<28}{cnt:>8}{dur / cnt:>10.3f}{size:>12}")
+        return 0
+    if args.n:
+        it = deque(it, maxlen=args.n)
+    for rec in it:
+        sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
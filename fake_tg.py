@@ -0,0 +1,225 @@
+"""本地 Telegram Bot API 替身: 作为 telegram.request.BaseRequest 注入 Bot / Application，不联网。
+
+记录每次调用 (方法、参数、状态码、上传字节数)，可模拟网络延迟、按 chat 限流的 429
+和按带宽计算的上传耗时；上传过的文件按 file_id 保存，get_file 下载时原样返回。
+配合 text_update / callback_update / photo_update 构造 Update，可以把整套处理器
+跑在 Application.process_update 上 (见 bench_handlers.py、sim_claude.py)。
+
+    api = FakeBotAPI(latency=0.05, per_chat=1)
+    app = build_application(FAKE_TOKEN, request=api)
+    await app.initialize()
+    await app.process_update(text_update(app.bot, "/windows"))
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import itertools
+from collections import Counter, namedtuple
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+FAKE_TOKEN = "123456:bedcode-fake-token"
+USER_ID = 42
+CHAT_ID = 42
+
+ApiCall = namedtuple("ApiCall", "t method params status size")
+
+# 受限流影响的方法 (发送/编辑类)；getMe、answerCallbackQuery 等不计
+_LIMITED = ("send", "edit", "copy", "forward", "pin")
+_MEDIA = {
+    "sendPhoto": "photo", "sendDocument": "document", "sendVoice": "voice",
+    "sendAudio": "audio", "sendVideo": "video", "sendAnimation": "animation",
+}
+_update_ids = itertools.count(1)
+_incoming_ids = itertools.count(1)
+
+
+class FakeBotAPI(BaseRequest):
+    """latency/jitter: 每次请求的基础延迟与随机抖动 (秒)；per_chat: 每个 chat 每秒允许的
+    发送/编辑次数 (令牌桶，突发 burst 次)，超出返回 429；fail_rate: 随机 429 概率；
+    upload_bps: 上传带宽 (字节/秒)，0 表示不计上传时间。"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, per_chat: float = 0,
+                 burst: int = 3, fail_rate: float = 0.0, upload_bps: float = 0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_chat = per_chat
+        self.burst = burst
+        self.fail_rate = fail_rate
+        self.upload_bps = upload_bps
+        self.calls = []
+        self.files = {}  # file_id → 内容
+        self._rnd = random.Random(seed)
+        self._buckets = {}  # chat_id → [令牌数, 上次时间]
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    # ── 统计 ──
+    def count(self) -> Counter:
+        return Counter(c.method for c in self.calls)
+
+    def texts(self, method: str | None = None) -> list[str]:
+        return [str(c.params.get("text") or c.params.get("caption") or "")
+                for c in self.calls if method in (None, c.method) and c.status == 200]
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self._buckets.clear()
+
+    # ── 请求处理 ──
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        if "/file/bot" in url:  # 下载文件
+            return 200, self.files.get(url.rsplit("/", 1)[-1], b"")
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        uploads = request_data.multipart_data if request_data and request_data.contains_files else {}
+        size = sum(len(v[1]) if isinstance(v[1], bytes) else 0 for v in uploads.values())
+
+        delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0)
+        if size and self.upload_bps:
+            delay += size / self.upload_bps
+        if delay:
+            await asyncio.sleep(delay)
+
+        retry_after = self._throttle(api_method, params.get("chat_id"))
+        if retry_after:
+            self.calls.append(ApiCall(time.time(), api_method, params, 429, size))
+            return 429, json.dumps({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }).encode()
+        self.calls.append(ApiCall(time.time(), api_method, params, 200, size))
+        result = self._result(api_method, params, uploads)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def _throttle(self, api_method: str, chat_id) -> int:
+        """返回需要等待的秒数，0 表示放行。"""
+        if not api_method.startswith(_LIMITED):
+            return 0
+        if self.fail_rate and self._rnd.random() < self.fail_rate:
+            return 1
+        if not self.per_chat or chat_id is None:
+            return 0
+        now = time.time()
+        bucket = self._buckets.setdefault(chat_id, [float(self.burst), now])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_chat)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return max(1, math.ceil((1 - bucket[0]) / self.per_chat))
+
+    def _file(self, content, fid: str | None = None, **extra) -> dict:
+        if fid is None:
+            fid = f"fake-file-{next(self._file_ids)}"
+            if isinstance(content, bytes):
+                self.files[fid] = content
+        return {"file_id": fid, "file_unique_id": f"u-{fid}", "file_size": len(content or b""), **extra}
+
+    def _message(self, chat_id, text: str | None = None, **extra) -> dict:
+        msg = {
+            "message_id": next(self._message_ids), "date": int(time.time()),
+            "chat": {"id": int(chat_id or CHAT_ID), "type": "private"},
+            "from": _bot_user(),
+        }
+        if text is not None:
+            msg["text"] = text
+        msg.update(extra)
+        return msg
+
+    def _result(self, api_method: str, params: dict, uploads: dict):
+        chat_id = params.get("chat_id")
+        if api_method == "getMe":
+            return _bot_user()
+        if api_method == "getUpdates":
+            return []
+        if api_method == "sendMessage":
+            return self._message(chat_id, params.get("text", ""))
+        if api_method in _MEDIA:
+            kind = _MEDIA[api_method]
+            value = params.get(kind)
+            name, content, fid = "file", None, None
+            if isinstance(value, str) and value.startswith("attach://"):
+                name, content = uploads.get(value[len("attach://"):], ("file", b""))[:2]
+            elif isinstance(value, str) and value in self.files:
+                content, fid = self.files[value], value  # 按 file_id 重发，不产生新文件
+            extra = {"caption": params["caption"]} if params.get("caption") else {}
+            if kind == "photo":
+                extra["photo"] = [self._file(content, fid, width=1280, height=720)]
+            elif kind == "document":
+                extra["document"] = self._file(content, fid, file_name=name or "file")
+            elif kind in ("video", "animation"):
+                extra[kind] = self._file(content, fid, width=1280, height=720, duration=1)
+            else:
+                extra[kind] = self._file(content, fid, duration=1)
+            return self._message(chat_id, **extra)
+        if api_method == "sendMediaGroup":
+            return [self._message(chat_id, photo=[self._file(b"", width=1280, height=720)])
+                    for _ in params.get("media", [])]
+        if api_method.startswith("editMessage"):
+            if "inline_message_id" in params:
+                return True
+            msg = self._message(chat_id, params.get("text"))
+            msg["message_id"] = params.get("message_id", msg["message_id"])
+            return msg
+        if api_method == "getFile":
+            fid = params.get("file_id", "")
+            return {"file_id": fid, "file_unique_id": fid, "file_size": len(self.files.get(fid, b"")),
+                    "file_path": fid}
+        return True
+
+
+def _bot_user() -> dict:
+    return {"id": 1, "is_bot": True, "first_name": "BedCode", "username": "bedcode_fake_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False,
+            "supports_inline_queries": False}
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "user", "language_code": "zh-hans"}
+
+
+def _incoming(user_id: int, chat_id: int, **fields) -> dict:
+    return {
+        "message_id": next(_incoming_ids), "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"}, "from": _user(user_id), **fields,
+    }
+
+
+def text_update(bot, text: str, user_id: int = USER_ID, chat_id: int = CHAT_ID) -> Update:
+    """普通文本消息；以 / 开头时附带 bot_command 实体，CommandHandler 才能匹配。"""
+    fields = {"text": text}
+    if text.startswith("/"):
+        fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": next(_update_ids), "message": _incoming(user_id, chat_id, **fields)}, bot)
+
+
+def callback_update(bot, data: str, user_id: int = USER_ID, chat_id: int = CHAT_ID) -> Update:
+    """点击内联按钮，按钮所在消息视为 bot 之前发出的一条消息。"""
+    message = {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"},
+               "from": _bot_user(), "text": "…"}
+    return Update.de_json({"update_id": next(_update_ids), "callback_query": {
+        "id": str(next(_update_ids)), "from": _user(user_id), "chat_instance": "fake",
+        "data": data, "message": message,
+    }}, bot)
+
+
+def photo_update(bot, file_id: str, caption: str = "", user_id: int = USER_ID, chat_id: int = CHAT_ID) -> Update:
+    photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 720}]
+    fields = {"photo": photo, **({"caption": caption} if caption else {})}
+    return Update.de_json({"update_id": next(_update_ids), "message": _incoming(user_id, chat_id, **fields)}, bot)
@@ -1,5 +1,6 @@
 """Telegram 命令/回调/消息处理。"""
 import os
+import re
 import html
 import time
 import asyncio
@@ -13,6 +14,7 @@ from telegram import (
     InlineKeyboardButton, InlineKeyboardMarkup,
     ReplyKeyboardMarkup, KeyboardButton,
 )
+from telegram.error import BadRequest
 from telegram.ext import (
     ApplicationHandlerStop,
     ContextTypes,
@@ -20,12 +22,11 @@ from telegram.ext import (
 
 import config
 from config import (
-    state, ALLOWED_USERS, READONLY_USERS, SHELL_TIMEOUT, REPLY_KEYBOARD,
+    state, ALLOWED_USERS, READONLY_USERS, REPLY_KEYBOARD_ROWS,
 )
-from win32_api import (
-    capture_window_screenshot, get_window_title,
+from terminal import (
+    backend, capture_window_screenshot, get_window_title,
     send_keys_to_window, send_raw_keys,
-    _send_unicode_char, _send_vk, VK_RETURN,
     copy_image_to_clipboard, paste_image_to_window,
     send_ctrl_c, send_ctrl_z,
     get_clipboard_text, set_clipboard_text,
@@ -35,18 +36,39 @@ from claude_detect import (
     read_terminal_text, _get_active_projects, _get_active_projects_detail,
 )
 from monitor import _update_status, _delete_status, _start_monitor, _cancel_monitor, _queue_lock
-from stream_mode import _stream_send, _kill_stream_proc, GIT_BASH_PATH
+from stream_mode import _stream_send, _kill_stream_proc
+from toolpaths import git_bash_async, clear as clear_tool_paths
+from shell import (
+    run_streaming, cancel_run, reset_session, session_info, change_dir,
+    submit_job, get_job, list_jobs, kill_job, job_tail,
+)
 from utils import (
     send_result, _get_handle, _save_labels, _build_dir_buttons,
-    _save_recent_dir, _needs_file, _save_msg_file, IMG_DIR,
+    _save_recent_dir, _needs_file, _save_msg_file, IMG_DIR, VOICE_DIR,
     _save_templates, _load_panel, _save_panel, _save_aliases,
-    _save_state,
+    _save_state, send_output_file, _fmt_size, _output_limits,
+)
+from render import render_pre_chunks
+from eventlog import log_event
+from ocr import ocr_image
+from media_cache import send_photo_cached, send_voice_cached, stats as media_stats
+from timelapse import frame_budget as timelapse_budget
+from text_delta import full_text as delta_full_text
+from collage import build_collage, cell_width as collage_cell_width
+from storage import run_gc as run_storage_gc, usage as storage_usage, last_gc as storage_last_gc
+from logtail import (
+    LOG_PATH, tail as log_tail, parse_args as parse_log_args,
+    start_follow, stop_follow,
+)
+from diffview import (
+    get_diff, record_session_base, set_view, get_view, summary_text,
+    render_html as diff_render_html,
 )
 
 logger = logging.getLogger("bedcode")
 
-VOICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voices")
-os.makedirs(VOICE_DIR, exist_ok=True)
+
+_CAPTURE_CONCURRENCY = 4
 
 SUPPORTED_DOC_EXTS = {
     ".py", ".js", ".ts", ".json", ".yaml", ".yml", ".toml", ".txt", ".md",
@@ -105,15 +127,11 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def _ocr_extract(img_data: bytes) -> str:
-    """Extract text from screenshot bytes via pytesseract."""
+    """Extract text from screenshot bytes via the OCR service (process pool + cache)."""
     try:
-        import pytesseract
-        from PIL import Image
-        import io
-        img = Image.open(io.BytesIO(img_data))
-        text = await asyncio.to_thread(pytesseract.image_to_string, img)
-        return text.strip()
-    except ImportError:
+        return await ocr_image(img_data)
+    except Exception as e:
+        logger.warning(f"OCR 失败: {e}")
         return ""
 
 
@@ -124,7 +142,7 @@ async def cmd_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
     if img_data:
-        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=img_data)
+        await send_photo_cached(context.bot, update.effective_chat.id, img_data)
         # /screenshot ocr → also extract text
         if context.args and context.args[0].lower() == "ocr":
             text = await _ocr_extract(img_data)
@@ -170,7 +188,7 @@ async def cmd_grab(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("文本抓取为空，发送截图代替")
         img_data = await asyncio.to_thread(capture_window_screenshot, handle)
         if img_data:
-            await context.bot.send_photo(chat_id=update.effective_chat.id, photo=img_data)
+            await send_photo_cached(context.bot, update.effective_chat.id, img_data)
 
 
 async def cmd_delay(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -238,7 +256,7 @@ async def _quick_screenshot(handle: int, chat_id: int, context: ContextTypes.DEF
     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
     if img_data:
         try:
-            await context.bot.send_photo(chat_id=chat_id, photo=img_data)
+            await send_photo_cached(context.bot, chat_id, img_data)
         except Exception:
             pass
 
@@ -345,17 +363,33 @@ async def cmd_windows(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         parse_mode="HTML",
         reply_markup=InlineKeyboardMarkup(buttons),
     )
-    for i, w in enumerate(windows[:3]):
-        img_data = await asyncio.to_thread(capture_window_screenshot, w["handle"])
-        if img_data:
-            label = w.get("label", "") or f"#{i+1}"
-            st_label = {"thinking": "思考中", "idle": "空闲", "unknown": "未知"}.get(w["state"], "?")
-            await update.message.reply_photo(
-                photo=img_data,
-                caption=f"{label} [{st_label}]",
-            )
-    if len(windows) > 3:
-        await update.message.reply_text(f"📸 仅显示前 3 个窗口截图（共 {len(windows)} 个）")
+    frames = await _capture_all(windows)
+    grid = await asyncio.to_thread(build_collage, frames)
+    zoom_buttons = [
+        InlineKeyboardButton(f"🔍 #{i+1}", callback_data=f"zoom:{w['handle']}")
+        for i, w in enumerate(windows)
+    ]
+    await send_photo_cached(
+        context.bot, update.effective_chat.id, grid,
+        caption=f"📸 {len(windows)} 个窗口，点 🔍 查看原图",
+        reply_markup=InlineKeyboardMarkup([zoom_buttons[i:i + 4] for i in range(0, len(zoom_buttons), 4)]),
+    )
+
+
+async def _capture_all(windows: list[dict]) -> list[tuple[bytes | None, str, str]]:
+    """并发截取所有窗口（有上限），按格子大小截图以减少编码开销。"""
+    sem = asyncio.Semaphore(_CAPTURE_CONCURRENCY)
+    max_w = collage_cell_width(len(windows))
+
+    async def _one(w):
+        async with sem:
+            return await asyncio.to_thread(capture_window_screenshot, w["handle"], max_w)
+
+    images = await asyncio.gather(*(_one(w) for w in windows), return_exceptions=True)
+    return [
+        (img if isinstance(img, bytes) else None, w.get("label", "") or "", w["state"])
+        for img, w in zip(images, windows)
+    ]
 
 
 async def cmd_new(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -383,11 +417,41 @@ async def cmd_cd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     target = os.path.abspath(os.path.join(state["cwd"], args))
     if os.path.isdir(target):
         state["cwd"] = target
+        await change_dir(target)
         await update.message.reply_text(f"已切换: <code>{html.escape(target)}</code>", parse_mode="HTML")
     else:
         await update.message.reply_text(f"不存在: <code>{html.escape(target)}</code>", parse_mode="HTML")
 
 
+async def cmd_shell(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = " ".join(context.args).strip().lower() if context.args else ""
+    chat_id = update.effective_chat.id
+    if args in ("on", "off"):
+        if _is_readonly(update):
+            await update.message.reply_text("\ud83d\udd12 只读用户无此权限")
+            return
+        state["shell_persistent"] = args == "on"
+        if args == "off":
+            await reset_session(chat_id)
+        _save_state()
+        await update.message.reply_text(f"常驻 Shell: {'开启' if state['shell_persistent'] else '关闭'}")
+        return
+    if args == "reset":
+        closed = await reset_session(chat_id)
+        await update.message.reply_text("🔄 会话已重置，下条命令将启动新 Shell" if closed else "当前没有常驻会话")
+        return
+    info = session_info(chat_id)
+    mode = "开启" if state.get("shell_persistent") else "关闭"
+    if info:
+        session_text = f"PID {info['pid']} · 空闲 {info['idle']}s\n目录: <code>{html.escape(info['cwd'])}</code>"
+    else:
+        session_text = "未启动"
+    await update.message.reply_text(
+        f"<b>常驻 Shell:</b> {mode}\n<b>会话:</b> {session_text}\n\n/shell on | off | reset",
+        parse_mode="HTML",
+    )
+
+
 async def cmd_proj(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     projects = await asyncio.to_thread(_get_active_projects_detail, 8)
     handle = state["target_handle"]
@@ -415,6 +479,7 @@ async def cmd_reload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     config.WORK_DIR = os.environ.get("WORK_DIR", str(os.path.expanduser("~")))
     state["screenshot_interval"] = config.SCREENSHOT_DELAY
     state["cwd"] = config.WORK_DIR
+    clear_tool_paths()  # GIT_BASH_PATH 可能已改，下次使用时重新校验
     await update.message.reply_text(
         f"<b>配置已重载</b>\n"
         f"SCREENSHOT_DELAY={config.SCREENSHOT_DELAY}\n"
@@ -462,6 +527,9 @@ def _build_panel_markup(rows):
     )
 
 
+REPLY_KEYBOARD = _build_panel_markup(REPLY_KEYBOARD_ROWS)
+
+
 def _get_keyboard():
     return state["custom_panel"] or REPLY_KEYBOARD
 
@@ -560,8 +628,8 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         img_data = await asyncio.to_thread(capture_window_screenshot, handle)
         if img_data:
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id, photo=img_data,
+            await send_photo_cached(
+                context.bot, query.message.chat_id, img_data,
                 caption=f"当前窗口{label_tag}",
             )
 
@@ -582,7 +650,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             await query.edit_message_text(f"✅ 已切换到 {proj_name} [{st_label}]")
             img_data = await asyncio.to_thread(capture_window_screenshot, matched["handle"])
             if img_data:
-                await context.bot.send_photo(chat_id=query.message.chat_id, photo=img_data)
+                await send_photo_cached(context.bot, query.message.chat_id, img_data)
         else:
             buttons = [[InlineKeyboardButton("🚀 启动新实例", callback_data=f"newdir:{proj_path}")]]
             await query.edit_message_text(
@@ -625,6 +693,88 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         else:
             await query.edit_message_text("❌ 发送失败")
 
+    elif data.startswith("shell:kill:"):
+        try:
+            run_id = int(data.split(":")[2])
+        except (ValueError, IndexError):
+            await query.edit_message_text("❌ 无效操作")
+            return
+        if not await cancel_run(run_id):
+            await query.edit_message_reply_markup(reply_markup=None)
+
+    elif data.startswith("job:"):
+        parts = data.split(":")
+        try:
+            action, job_id = parts[1], int(parts[2])
+        except (ValueError, IndexError):
+            return
+        job = get_job(job_id)
+        if not job:
+            await context.bot.send_message(chat_id=query.message.chat_id, text=f"任务 #{job_id} 已过期")
+        elif action == "tail":
+            await _send_job_tail(query.message.chat_id, job_id, 30, context)
+        elif action == "get":
+            await _send_job_output(query.message.chat_id, job, context)
+
+    elif data.startswith("full:"):
+        try:
+            handle = int(data[5:])
+        except ValueError:
+            return
+        text = delta_full_text(handle)
+        if text:
+            await send_result(query.message.chat_id, text, context)
+        else:
+            await context.bot.send_message(chat_id=query.message.chat_id, text="全文已过期")
+
+    elif data.startswith("zoom:"):
+        try:
+            handle = int(data[5:])
+        except ValueError:
+            return
+        img_data = await asyncio.to_thread(capture_window_screenshot, handle, None)
+        if not img_data:
+            await context.bot.send_message(chat_id=query.message.chat_id, text="❌ 截屏失败，窗口可能已关闭")
+            return
+        title = await asyncio.to_thread(get_window_title, handle)
+        label = state.get("window_labels", {}).get(handle, "")
+        st_label = {"thinking": "思考中", "idle": "空闲", "unknown": "未知"}.get(detect_claude_state(title), "?")
+        caption = f"{label or handle} [{st_label}]"
+        try:
+            await send_photo_cached(context.bot, query.message.chat_id, img_data, caption=caption)
+        except BadRequest:
+            # 超出照片尺寸限制时以文件发送原图
+            await context.bot.send_document(
+                chat_id=query.message.chat_id, document=img_data, filename=f"window_{handle}.jpg", caption=caption,
+            )
+
+    elif data.startswith("diff:"):
+        action = data[5:]
+        chat_id = query.message.chat_id
+        diff = get_view(chat_id)
+        if action == "refresh" and diff:
+            diff = await get_diff(diff["root"], diff["base"], refresh=True)
+            if diff is None or not diff["files"]:
+                await query.edit_message_text("无变更")
+                return
+            set_view(chat_id, diff)
+            action = "0"
+        if not diff:
+            await query.edit_message_text("diff 已过期，请重新 /diff")
+            return
+        if action == "html":
+            await _send_diff_html(chat_id, diff, context)
+        elif action == "list":
+            await send_result(chat_id, summary_text(diff), context)
+        elif action.isdigit() and int(action) < len(diff["files"]):
+            idx = int(action)
+            try:
+                await query.edit_message_text(
+                    _diff_page(diff, idx), parse_mode="HTML", reply_markup=_diff_markup(diff, idx),
+                )
+            except BadRequest:
+                pass
+
     elif data == "queue:view":
         async with _queue_lock:
             items = list(state["msg_queue"])
@@ -697,7 +847,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             img_data = await asyncio.to_thread(capture_window_screenshot, handle)
             if img_data:
                 try:
-                    await context.bot.send_photo(chat_id=query.message.chat_id, photo=img_data)
+                    await send_photo_cached(context.bot, query.message.chat_id, img_data)
                 except Exception:
                     pass
 
@@ -763,13 +913,17 @@ async def _launch_new_claude(chat_id: int, context: ContextTypes.DEFAULT_TYPE, w
     if work_dir is None:
         work_dir = state["cwd"]
     _save_recent_dir(work_dir)
+    asyncio.create_task(record_session_base(work_dir, force=True))
+    if backend().name != "win32":
+        await _launch_owned_claude(chat_id, context, work_dir)
+        return
     try:
         wt_path = os.path.expandvars(r"%LOCALAPPDATA%\Microsoft\WindowsApps\wt.exe")
-        git_bash = os.environ.get("GIT_BASH_PATH", GIT_BASH_PATH)
+        git_bash_path = await git_bash_async()
         bat_path = os.path.join(tempfile.gettempdir(), "bedcode_launch.bat")
         safe_dir = work_dir.replace('"', '')
         with open(bat_path, "w", encoding="utf-8") as f:
-            f.write(f"@set CLAUDE_CODE_GIT_BASH_PATH={git_bash}\n")
+            f.write(f"@set CLAUDE_CODE_GIT_BASH_PATH={git_bash_path}\n")
             f.write(f"@cd /d \"{safe_dir}\"\n")
             f.write("@claude\n")
         if new_window:
@@ -784,6 +938,7 @@ async def _launch_new_claude(chat_id: int, context: ContextTypes.DEFAULT_TYPE, w
         )
         await asyncio.sleep(8)
         def _auto_select():
+            from win32_api import _send_unicode_char, _send_vk, VK_RETURN
             _send_unicode_char("1")
             time.sleep(0.1)
             _send_vk(VK_RETURN)
@@ -800,6 +955,30 @@ async def _launch_new_claude(chat_id: int, context: ContextTypes.DEFAULT_TYPE, w
         )
 
 
+async def _launch_owned_claude(chat_id: int, context: ContextTypes.DEFAULT_TYPE, work_dir: str) -> None:
+    """tmux / pty 后端: 直接启动会话并锁定；出现信任目录确认时自动选第一项。"""
+    term = backend()
+    handle = await term.launch(work_dir)
+    if not handle:
+        await context.bot.send_message(chat_id=chat_id, text="❌ 启动失败，详见日志")
+        return
+    state["target_handle"] = handle
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"🚀 已启动 Claude Code ({term.name})\n📂 {work_dir}\n🔒 已锁定为当前窗口",
+    )
+    for _ in range(20):
+        await asyncio.sleep(0.5)
+        text = await asyncio.to_thread(read_terminal_text, handle)
+        tail = "\n".join(text.splitlines()[-15:]).lower() if text else ""
+        if "trust" in tail and "yes" in tail:
+            # 旧版为 "1. Yes, proceed"；新版默认光标在 "No, exit"，需要先下移
+            keys = ["1", "enter"] if "1. yes" in tail else ["down", "enter"] if "❯ no" in tail else ["enter"]
+            await asyncio.to_thread(send_raw_keys, handle, keys)
+            await context.bot.send_message(chat_id=chat_id, text="✅ 已自动信任该目录")
+            break
+
+
 # ── 消息处理 ──────────────────────────────────────────────────────
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if _is_readonly(update):
@@ -893,6 +1072,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text(f"❌ 目录不存在: <code>{html.escape(text)}</code>\n请重新 /new", parse_mode="HTML")
         return
 
+    if text.startswith("!&"):
+        cmd = text[2:].strip()
+        if cmd:
+            await _run_shell(update, context, cmd, background=True)
+        return
+
     if text.startswith("!"):
         cmd = text[1:].strip()
         if cmd:
@@ -916,10 +1101,11 @@ async def _inject_to_claude(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
     inject_text = text
     if not skip_file_check and _needs_file(text):
-        filepath = _save_msg_file(text)
+        filepath = await asyncio.to_thread(_save_msg_file, text)
         inject_text = f"请阅读这个文件并按其中的指示操作 {filepath}"
         logger.info(f"长消息保存为文件: {filepath}")
 
+    asyncio.create_task(record_session_base(state["cwd"], handle))
     title = await asyncio.to_thread(get_window_title, handle)
     st = detect_claude_state(title)
 
@@ -930,6 +1116,7 @@ async def _inject_to_claude(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 return
             state["msg_queue"].append(inject_text)
             state["queue_chat_id"] = update.effective_chat.id
+            log_event("inject.queued", hwnd=handle, chat_id=update.effective_chat.id, size=len(inject_text), depth=len(state["msg_queue"]))
             queue_text = "📋 " + " → ".join(
                 f"[{i+1}]{m[:20]}" for i, m in enumerate(state["msg_queue"])
             )
@@ -950,6 +1137,7 @@ async def _inject_to_claude(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
 
     logger.info(f"注入到窗口 {handle}: {inject_text[:80]}")
+    t0 = time.time()
     success = await asyncio.to_thread(send_keys_to_window, handle, inject_text)
 
     if not success:
@@ -962,43 +1150,84 @@ async def _inject_to_claude(update: Update, context: ContextTypes.DEFAULT_TYPE,
             await _update_status(update.effective_chat.id, "❌ 发送失败，窗口可能已关闭\n发 /windows 重新扫描", context)
             return
 
+    log_event("inject", hwnd=handle, chat_id=update.effective_chat.id, duration=time.time() - t0, size=len(inject_text))
     await _update_status(update.effective_chat.id, "✅ 已发送", context)
 
     if state["auto_monitor"]:
         _start_monitor(handle, update.effective_chat.id, context)
 
 
-async def _run_shell(update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str) -> None:
+async def _run_shell(update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str, background: bool = False) -> None:
     DANGEROUS_PATTERNS = {"rm -rf /", "rm -rf /*", "mkfs", "dd if=", ":(){ :|:&", "fork bomb", "> /dev/sd", "chmod -R 777 /", "chown -R", "> /dev/null 2>&1 &"}
     cmd_lower = cmd.lower().strip()
     if any(p in cmd_lower for p in DANGEROUS_PATTERNS):
         await update.message.reply_text("⚠️ 危险命令已拦截")
         return
-    thinking = await update.message.reply_text(
-        f"执行: <code>{html.escape(cmd[:80])}</code>", parse_mode="HTML"
-    )
-    try:
-        result = await asyncio.to_thread(
-            lambda: subprocess.run(
-                [GIT_BASH_PATH, "-c", cmd], capture_output=True, text=True,
-                timeout=SHELL_TIMEOUT, cwd=state["cwd"],
-            )
+    if background:
+        job = submit_job(update.effective_chat.id, cmd, context)
+        status = "运行中" if job["status"] == "running" else "排队中"
+        await update.message.reply_text(
+            f"🧵 后台任务 #{job['id']} {status}\n<code>{html.escape(cmd[:80])}</code>\n"
+            f"/jobs tail {job['id']} · /jobs kill {job['id']}",
+            parse_mode="HTML",
         )
-        output = result.stdout or ""
-        if result.stderr:
-            output += f"\n[STDERR]\n{result.stderr}"
-        if not output.strip():
-            output = f"(完成，退出码: {result.returncode})"
-        try:
-            await thinking.delete()
-        except Exception:
-            pass
-        await send_result(update.effective_chat.id, output, context)
-    except subprocess.TimeoutExpired:
-        await thinking.edit_text(f"超时 ({SHELL_TIMEOUT}s)")
-    except Exception as e:
-        logger.exception(f"Shell 命令执行失败: {e}")
-        await thinking.edit_text("❌ 执行出错，详见日志")
+        return
+    await run_streaming(update.effective_chat.id, cmd, context)
+
+
+async def _send_job_output(chat_id: int, job: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not os.path.exists(job["log_path"]) or not os.path.getsize(job["log_path"]):
+        await context.bot.send_message(chat_id=chat_id, text=f"任务 #{job['id']} 暂无输出")
+        return
+    await send_output_file(chat_id, job["log_path"], f"job_{job['id']}", context, caption=f"任务 #{job['id']} 输出")
+
+
+async def _send_job_tail(chat_id: int, job_id: int, n: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+    tail = await job_tail(job_id, n)
+    if tail is None:
+        await context.bot.send_message(chat_id=chat_id, text=f"任务 #{job_id} 不存在")
+        return
+    await send_result(chat_id, tail or "(暂无输出)", context)
+
+
+async def cmd_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    if not args:
+        jobs = list_jobs()
+        if not jobs:
+            await update.message.reply_text("暂无后台任务\n用法: !&命令 启动后台任务")
+            return
+        icons = {"queued": "⏸", "running": "⏳", "done": "✅", "failed": "❌", "killed": "⏹"}
+        lines = ["<b>后台任务：</b>"]
+        for j in jobs:
+            rc = f" rc={j['rc']}" if j["rc"] is not None else ""
+            dur = f" {int((j['end'] or time.time()) - j['start'])}s" if j["start"] else ""
+            lines.append(f"{icons.get(j['status'], '?')} #{j['id']}{rc}{dur} <code>{html.escape(j['cmd'][:50])}</code>")
+        lines.append("\n/jobs tail|kill|get 编号")
+        await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+        return
+    action = args[0].lower()
+    if action not in ("tail", "kill", "get") or len(args) < 2 or not args[1].isdigit():
+        await update.message.reply_text("用法: /jobs | /jobs tail 编号 [行数] | /jobs kill 编号 | /jobs get 编号")
+        return
+    job_id = int(args[1])
+    if action == "tail":
+        n = min(int(args[2]), 200) if len(args) > 2 and args[2].isdigit() else 30
+        await _send_job_tail(chat_id, job_id, n, context)
+        return
+    job = get_job(job_id)
+    if not job:
+        await update.message.reply_text(f"任务 #{job_id} 不存在")
+        return
+    if action == "kill":
+        if _is_readonly(update):
+            await update.message.reply_text("\ud83d\udd12 只读用户无此权限")
+            return
+        ok = await kill_job(job_id)
+        await update.message.reply_text(f"⏹ 已终止任务 #{job_id}" if ok else f"任务 #{job_id} 已结束")
+    else:
+        await _send_job_output(chat_id, job, context)
 
 
 # ── 语音消息处理 ──────────────────────────────────────────────────
@@ -1065,43 +1294,183 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 
 # ── 命令历史 ─────────────────────────────────────────────────────
+def _diff_markup(diff: dict, idx: int) -> InlineKeyboardMarkup:
+    n = len(diff["files"])
+    nav = []
+    if idx > 0:
+        nav.append(InlineKeyboardButton("⬅️ 上一个", callback_data=f"diff:{idx-1}"))
+    nav.append(InlineKeyboardButton(f"{idx+1}/{n}", callback_data="diff:list"))
+    if idx < n - 1:
+        nav.append(InlineKeyboardButton("➡️ 下一个", callback_data=f"diff:{idx+1}"))
+    return InlineKeyboardMarkup([nav, [
+        InlineKeyboardButton("📄 HTML", callback_data="diff:html"),
+        InlineKeyboardButton("🔄 刷新", callback_data="diff:refresh"),
+    ]])
+
+
+def _diff_page(diff: dict, idx: int) -> str:
+    f = diff["files"][idx]
+    header = f"<b>{html.escape(f['path'])}</b>  +{f['adds']} -{f['dels']}\n"
+    chunks = render_pre_chunks(f["patch"], "diff", max_len=3500)
+    if len(chunks) > 1:
+        header += f"<i>(本文件过长，仅显示第 1/{len(chunks)} 段，完整内容点 📄 HTML)</i>\n"
+    return header + chunks[0]
+
+
+async def _send_diff_html(chat_id: int, diff: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
+    data = diff_render_html(diff)
+    name = f"diff_{os.path.basename(diff['root'])}_{diff['base'][:8]}.html"
+    await context.bot.send_document(
+        chat_id=chat_id, document=data, filename=name,
+        caption=f"{len(diff['files'])} 个文件 · {_fmt_size(len(data))}",
+    )
+
+
 async def cmd_diff(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    base_ref = context.args[0] if context.args else None
+    chat_id = update.effective_chat.id
     try:
-        result = await asyncio.to_thread(
-            lambda: subprocess.run(
-                [GIT_BASH_PATH, "-c", "git diff --stat HEAD~1"],
-                capture_output=True, text=True, timeout=30, cwd=state["cwd"],
-            )
-        )
-        if result.returncode != 0:
-            await update.message.reply_text("当前目录不是 Git 仓库或无提交历史")
-            return
-        output = result.stdout.strip()
-        if not output:
-            await update.message.reply_text("无变更")
-            return
-        full = await asyncio.to_thread(
-            lambda: subprocess.run(
-                [GIT_BASH_PATH, "-c", "git diff HEAD~1"],
-                capture_output=True, text=True, timeout=30, cwd=state["cwd"],
-            )
-        )
-        await send_result(update.effective_chat.id, f"{output}\n\n{full.stdout}", context)
+        diff = await get_diff(state["cwd"], base_ref)
     except Exception as e:
         await update.message.reply_text(f"执行失败: {e}")
+        return
+    if diff is None:
+        await update.message.reply_text("当前目录不是 Git 仓库、无提交历史或基准无效")
+        return
+    if not diff["files"]:
+        await update.message.reply_text(f"无变更 (基准 {diff['base'][:8]})")
+        return
+    set_view(chat_id, diff)
+    await send_result(chat_id, summary_text(diff), context)
+    await update.message.reply_text(
+        _diff_page(diff, 0), parse_mode="HTML", reply_markup=_diff_markup(diff, 0),
+    )
+    if diff["total"] > config.OUTPUT_DOC_THRESHOLD:
+        await _send_diff_html(chat_id, diff, context)
 
 
 async def cmd_log(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    args = " ".join(context.args).strip() if context.args else ""
-    n = min(int(args), 100) if args.isdigit() else 30
-    log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.log")
+    args = list(context.args or [])
+    chat_id = update.effective_chat.id
+    if args and args[0].lower() in ("follow", "f"):
+        if len(args) > 1 and args[1].lower() in ("off", "stop"):
+            stopped = stop_follow(chat_id)
+            await update.message.reply_text("⏹ 已停止 follow" if stopped else "当前没有 follow")
+            return
+        try:
+            _, flt = parse_log_args(args[1:])
+        except re.error as e:
+            await update.message.reply_text(f"正则无效: {e}")
+            return
+        start_follow(chat_id, flt, context.bot)
+        desc = flt.describe()
+        await update.message.reply_text(
+            f"▶️ 开始 follow 日志{f' ({desc})' if desc else ''}\n/log follow off 停止"
+        )
+        return
+    try:
+        n, flt = parse_log_args(args)
+    except re.error as e:
+        await update.message.reply_text(f"正则无效: {e}")
+        return
+    records, scanned = await asyncio.to_thread(log_tail, n, flt)
+    if not records:
+        if not os.path.exists(LOG_PATH):
+            await update.message.reply_text("日志文件不存在")
+        else:
+            await update.message.reply_text(f"无匹配日志 (扫描 {scanned} 行)")
+        return
+    await send_result(chat_id, "\n".join(records), context)
+
+
+async def cmd_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    if args and args[0].lower() == "gc":
+        if _is_readonly(update):
+            await update.message.reply_text("\U0001f512 只读用户无此权限")
+            return
+        removed, freed = await run_storage_gc()
+        await update.message.reply_text(f"🧹 已清理 {removed} 个文件，释放 {_fmt_size(freed)}")
+        return
+    rows = await asyncio.to_thread(storage_usage)
+    lines = ["<b>缓存目录占用：</b>"]
+    for r in rows:
+        pct = f" ({r['size'] * 100 // r['max_bytes']}%)" if r["max_bytes"] else ""
+        oldest = f" · 最旧 {r['oldest'] / 86400:.1f} 天" if r["files"] else ""
+        lines.append(
+            f"<code>{r['name']:<10}</code> {r['files']} 个 · {_fmt_size(r['size'])}"
+            f" / {_fmt_size(r['max_bytes'])}{pct}{oldest} · 保留 {r['max_age'] // 86400} 天"
+        )
+    gc = storage_last_gc()
+    if gc["time"]:
+        ago = int(time.time() - gc["time"])
+        lines.append(f"\n上次清理: {ago}s 前，删除 {gc['removed']} 个，释放 {_fmt_size(gc['freed'])}")
+    ms = media_stats()
+    if ms["hits"] or ms["misses"]:
+        lines.append(
+            f"媒体缓存: 命中 {ms['hits']}/{ms['hits'] + ms['misses']} ({ms['hit_rate'] * 100:.0f}%)，"
+            f"节省上传 {_fmt_size(ms['bytes_saved'])}"
+        )
+    lines.append("/storage gc 立即清理")
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+
+async def cmd_timelapse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    if not args:
+        on = state.get("timelapse", False)
+        await update.message.reply_text(
+            f"🎞 延时动画: {'开启' if on else '关闭'} · 每轮最多 {timelapse_budget()} 帧\n"
+            "开启后思考期间不再定时发截图，结束时合成一段动画发送\n"
+            "用法: /timelapse on | off | 帧数(2-300) | reset"
+        )
+        return
+    arg = args[0].lower()
+    if arg in ("on", "off"):
+        state["timelapse"] = arg == "on"
+        await update.message.reply_text(f"🎞 延时动画已{'开启' if state['timelapse'] else '关闭'}")
+    elif arg == "reset":
+        state["timelapse_frames"] = 0
+        await update.message.reply_text(f"🎞 帧数恢复默认: {timelapse_budget()}")
+    elif arg.isdigit() and 2 <= int(arg) <= 300:
+        state["timelapse_frames"] = int(arg)
+        await update.message.reply_text(f"🎞 每轮最多 {arg} 帧")
+    else:
+        await update.message.reply_text("用法: /timelapse on | off | 帧数(2-300) | reset")
+        return
+    _save_state()
+
+
+async def cmd_output(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    limits = state.setdefault("output_limits", {})
+    if not args:
+        doc, plain = _output_limits(chat_id)
+        custom = " (自定义)" if chat_id in limits else ""
+        await update.message.reply_text(
+            f"长输出策略{custom}:\n"
+            f"• 超过 {doc} 字 → 首尾预览 + 附件\n"
+            f"• 附件 ≤ {_fmt_size(plain)} 为 .txt，更大压缩为 .zip / .gz\n\n"
+            "/output 字数 | /output plain KB | /output reset"
+        )
+        return
+    if args[0] == "reset":
+        limits.pop(chat_id, None)
+        _save_state()
+        await update.message.reply_text("✅ 已恢复默认长输出策略")
+        return
     try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        tail = "".join(lines[-n:])
-        await send_result(update.effective_chat.id, tail or "(日志为空)", context)
-    except FileNotFoundError:
-        await update.message.reply_text("日志文件不存在")
+        if args[0] == "plain" and len(args) > 1:
+            limits.setdefault(chat_id, {})["plain"] = max(1, int(args[1])) * 1024
+        else:
+            limits.setdefault(chat_id, {})["doc"] = max(500, int(args[0]))
+    except ValueError:
+        await update.message.reply_text("用法: /output 字数 | /output plain KB | /output reset")
+        return
+    _save_state()
+    doc, plain = _output_limits(chat_id)
+    await update.message.reply_text(f"✅ 超过 {doc} 字转附件，纯文本附件上限 {_fmt_size(plain)}")
 
 
 async def cmd_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1313,7 +1682,8 @@ async def cmd_tts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         outfile = os.path.join(VOICE_DIR, f"tts_{int(time.time())}.mp3")
         await tts.save(outfile)
         with open(outfile, "rb") as f:
-            await context.bot.send_voice(chat_id=update.effective_chat.id, voice=f)
+            voice = f.read()
+        await send_voice_cached(context.bot, update.effective_chat.id, voice)
     except ImportError:
         await update.message.reply_text("⚠️ edge-tts 未安装: pip install edge-tts")
     except Exception as e:
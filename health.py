@@ -1,26 +1,105 @@
-"""Minimal health-check HTTP endpoint."""
+"""Minimal health-check HTTP endpoint and event-loop heartbeat.
+
+POST /hook on the same port accepts events from notify_hook.py (see hook_ipc.py);
+any other request gets the health JSON.
+
+The heartbeat task sleeps HEARTBEAT_INTERVAL seconds at a time, measures how late
+it wakes up (loop lag) and writes {pid, ts, lag} to HEARTBEAT_FILE. The file keeps
+its last timestamp when the loop is blocked, so watchdog.py can detect a hang even
+though nothing in the process can answer any more.
+"""
 import os, time, asyncio, json
-from config import state, logger
+from config import state, logger, HEARTBEAT_FILE
 
 _START = time.time()
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 413: "Payload Too Large",
+            503: "Service Unavailable"}
+_MAX_BODY = 1024 * 1024
+HEARTBEAT_INTERVAL = 2.0
+_lag = {"last": 0.0, "max": 0.0, "beat": 0.0}
 
 
-async def _handle(reader, writer):
-    await reader.read(1024)
-    body = json.dumps({
+def _write_heartbeat() -> None:
+    tmp = HEARTBEAT_FILE + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "ts": round(_lag["beat"], 3),
+                       "lag_ms": round(_lag["last"] * 1000, 1), "max_lag_ms": round(_lag["max"] * 1000, 1)}, f)
+        os.replace(tmp, HEARTBEAT_FILE)
+    except OSError:
+        pass  # Windows 上 watchdog 正在读时 replace 可能失败，下一拍再写
+
+
+async def heartbeat_loop():
+    while True:
+        t0 = time.monotonic()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lag = max(0.0, time.monotonic() - t0 - HEARTBEAT_INTERVAL)
+        _lag["last"], _lag["max"], _lag["beat"] = lag, max(_lag["max"], lag), time.time()
+        if lag > 1:
+            logger.warning(f"事件循环阻塞 {lag:.1f}s")
+        _write_heartbeat()
+
+
+class _TooLarge(Exception):
+    pass
+
+
+async def _read_request(reader) -> tuple[str, str, dict, bytes]:
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+    lines = head.decode("latin-1").split("\r\n")
+    method, path = (lines[0].split() + ["", ""])[:2]
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > _MAX_BODY:
+        raise _TooLarge()  # 不能当作空请求体处理，否则 hook 以为已投递而不走兜底发送
+    body = b""
+    if length > 0:
+        body = await asyncio.wait_for(reader.readexactly(length), timeout=5)
+    return method, path, headers, body
+
+
+def _health() -> dict:
+    import hook_state
+    return {
         "status": "ok",
+        "pid": os.getpid(),
         "target_handle": state.get("target_handle"),
         "auto_monitor": state.get("auto_monitor"),
         "stream_mode": state.get("stream_mode"),
         "queue_length": len(state.get("msg_queue", [])),
         "session_costs": state.get("session_costs", {}),
         "uptime_seconds": round(time.time() - _START, 1),
-    })
-    body_bytes = body.encode("utf-8")
+        "loop_lag_ms": round(_lag["last"] * 1000, 1),
+        "max_loop_lag_ms": round(_lag["max"] * 1000, 1),
+        "hook_sessions": hook_state.stats(),
+    }
+
+
+async def _handle(reader, writer):
+    status = 200
+    try:
+        method, path, headers, body = await _read_request(reader)
+    except _TooLarge:
+        method, path, status = "", "", 413
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        writer.close()
+        return
+    payload = {"status": status} if status != 200 else _health()
+    if method == "POST" and path.split("?")[0] == "/hook":
+        import hook_ipc
+        status = hook_ipc.accept(body, headers.get("x-bedcode-token", ""))
+        payload = {"status": status}
+    body_bytes = json.dumps(payload).encode("utf-8")
     resp = (
-        f"HTTP/1.1 200 OK\r\n"
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
         f"Content-Type: application/json\r\n"
         f"Content-Length: {len(body_bytes)}\r\n"
+        f"Connection: close\r\n"
         f"\r\n"
     )
     writer.write(resp.encode("utf-8") + body_bytes)
@@ -37,3 +116,10 @@ async def start_health_server():
     srv = await asyncio.start_server(_handle, "127.0.0.1", port)
     state["_health_server"] = srv
     logger.info(f"Health endpoint on :{port}")
+    return port
+
+
+def start_heartbeat():
+    _lag["beat"] = time.time()
+    _write_heartbeat()
+    state["heartbeat_task"] = asyncio.create_task(heartbeat_loop())
@@ -0,0 +1,127 @@
+"""notify_hook.py → bot 的本地转交: hook 把事件 POST 到健康检查端口的 /hook，bot 排队后
+用自己的连接发送，hook 不再每次启动解释器后自己握手直连 Telegram。
+
+端口和令牌写在 hook_ipc.json，只有能读这个文件的进程才能投递。
+
+每个事件先交给 hook_state 更新会话状态；只有 Notification / Stop 会排队发消息，
+且会话已由被动监控按 hook 跟踪时也不发 (监控自己会报告进度和结果，避免重复)。
+"""
+import os
+import json
+import hmac
+import time
+import asyncio
+import secrets
+import logging
+
+import config
+import hook_state
+from config import state, HOOK_CHAT_ID
+from utils import send_result
+from eventlog import log_event
+
+logger = logging.getLogger("bedcode")
+
+_QUEUE_MAX = 100
+_token = None
+_queue = None
+
+
+def _chat_id() -> int | None:
+    # 没有活跃会话时发给 .env 中列出的第一个用户，与 notify_hook 直接发送时一致
+    return state.get("chat_id") or HOOK_CHAT_ID
+
+
+def accept(body: bytes, token: str) -> int:
+    """处理一次 /hook 请求，返回 HTTP 状态码。只入队，不等发送完成。"""
+    if _queue is None or not _token:
+        return 503
+    if not hmac.compare_digest(token or "", _token):
+        return 403
+    try:
+        event = json.loads(body or b"{}")
+    except ValueError:
+        return 400
+    if not isinstance(event, dict):
+        return 400
+    return 202 if ingest(event) else 503
+
+
+def _monitored(session: dict | None) -> bool:
+    """被动监控正在跟踪这个会话的窗口，会自己报告完成。"""
+    if not (session and session["hooked"] and hook_state.followed(session["handle"])):
+        return False
+    task = state.get("passive_monitor_task")
+    if not state.get("chat_id") or not task or task.done():
+        return False
+    # Telegram 触发的监控运行时被动监控让路，只有它盯着的目标窗口会被报告
+    active = state.get("monitor_task")
+    return not (active and not active.done()) or session["handle"] == state.get("target_handle")
+
+
+def ingest(event: dict) -> bool:
+    """记录事件并按需排队发送，队列满时返回 False。"""
+    event.setdefault("_ts", time.time())
+    try:
+        session = hook_state.ingest(event)
+    except Exception as e:  # 格式异常的事件不影响消息转交
+        logger.warning(f"[hook] 事件解析失败: {e}")
+        session = None
+    if event.get("hook_event_name", "") not in ("", "Notification", "Stop") or _monitored(session):
+        return True
+    if _queue is None:  # 未启动或已停止
+        return False
+    try:
+        _queue.put_nowait((event["_ts"], event))
+    except asyncio.QueueFull:
+        logger.warning("[hook] 队列已满，丢弃事件")
+        return False
+    return True
+
+
+async def _deliver(app, event: dict) -> None:
+    from notify_hook import build_message
+    text = await asyncio.to_thread(build_message, event)  # Stop 事件要读 transcript
+    chat_id = _chat_id()
+    if text and chat_id:
+        await send_result(chat_id, text, app)
+
+
+async def _worker(app) -> None:
+    """逐条发送，保证顺序，也不会一次性向 Telegram 发出大量并发请求。"""
+    while True:
+        ts, event = await _queue.get()
+        try:
+            await _deliver(app, event)
+            log_event("hook.delivered", chat_id=_chat_id(), duration=time.time() - ts,
+                      hook=event.get("hook_event_name", ""))
+        except Exception as e:
+            logger.warning(f"[hook] 发送失败: {e}")
+        finally:
+            _queue.task_done()
+
+
+def start(app, port: int) -> None:
+    """启动发送任务并写出 hook_ipc.json。需要在事件循环中调用。"""
+    global _token, _queue
+    _token = secrets.token_urlsafe(24)
+    _queue = asyncio.Queue(maxsize=_QUEUE_MAX)
+    state["hook_task"] = asyncio.create_task(_worker(app))
+    tmp = config.HOOK_IPC_FILE + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"port": port, "token": _token, "pid": os.getpid()}, f)
+        os.replace(tmp, config.HOOK_IPC_FILE)
+    except OSError as e:
+        logger.warning(f"[hook] 写入 {config.HOOK_IPC_FILE} 失败，hook 将直接发送: {e}")
+
+
+def stop() -> None:
+    """删除 hook_ipc.json，之后的 hook 直接走兜底发送，不必先尝试连接。"""
+    try:
+        with open(config.HOOK_IPC_FILE, "r", encoding="utf-8") as f:
+            if json.load(f).get("pid") != os.getpid():
+                return
+        os.remove(config.HOOK_IPC_FILE)
+    except (OSError, ValueError):
+        pass
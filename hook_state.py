@@ -0,0 +1,234 @@
+"""Claude Code hook 事件 → 按会话的实时状态: 忙闲、当前工具、工具耗时、权限请求、回合完成。
+
+事件由 hook_ipc 转交 (notify_hook.py 运行在 Claude 里)，也可以由 sim_claude 直接送入。
+每个事件带 _ts (hook 收到事件的时间) 和 _origin (hook 进程的 TMUX_PANE / BEDCODE_SESSION)，
+后者由终端后端换算成窗口 handle。收到过 UserPromptSubmit / PreToolUse 的会话视为
+hook 驱动: 被动监控不再用标题判断它的忙闲，进度和完成都以这里为准。
+
+只接收 Notification / Stop 的旧配置不会进入 hook 驱动，监控照旧轮询标题。
+"""
+import time
+import logging
+from collections import Counter, deque
+
+logger = logging.getLogger("bedcode")
+
+_TOOL_HISTORY = 50
+_STALE = 6 * 3600  # 这么久没有事件且未对应窗口的会话丢弃
+
+_sessions = {}   # session_id → 会话状态
+_handles = {}    # 窗口 handle → session_id
+_listeners = []  # f(handle)，状态变化后在事件循环线程中调用
+_followed = set()  # 被动监控当前跟踪的窗口，由监控在每次扫描后更新
+
+
+def _new_session(sid: str, ts: float) -> dict:
+    return {
+        "session_id": sid, "cwd": "", "transcript": "", "handle": None,
+        "hooked": False,       # 收到过回合开始类事件，可以完全依赖 hook
+        "busy": False, "turn_start": None, "turns": 0, "last_turn": None,
+        "running": {},         # tool_use_id → (工具名, 摘要, 开始时间)
+        "tools": deque(maxlen=_TOOL_HISTORY),  # 最近完成的 (工具名, 耗时, 成功)
+        "turn_tools": Counter(), "turn_tool_time": Counter(),
+        "prompt": None,        # 权限请求说明
+        "first": ts, "last_ts": ts, "last_event": "", "events": Counter(),
+    }
+
+
+def _detail(tool_input) -> str:
+    """工具参数里最能说明在做什么的一项，单行截断。"""
+    if not isinstance(tool_input, dict):
+        return ""
+    for key in ("command", "file_path", "path", "pattern", "url", "query", "description", "prompt"):
+        value = tool_input.get(key)
+        if isinstance(value, str) and value.strip():
+            line = value.strip().splitlines()[0]
+            return line if len(line) <= 60 else line[:57] + "..."
+    return ""
+
+
+def _resolve_handle(origin, sid: str) -> int | None:
+    from terminal import backend
+    term = backend()
+    try:
+        handle = term.hook_handle(origin if isinstance(origin, dict) else {})
+    except Exception as e:
+        logger.debug(f"[hook] 无法定位会话窗口: {e}")
+        handle = None
+    if handle is not None:
+        # 同一 pane 里仍在运行的另一个会话 (如 Bash 工具里又启动了 claude，继承了 TMUX_PANE) 不让出窗口
+        owner = _sessions.get(_handles.get(handle))
+        return None if owner and owner["session_id"] != sid and owner["busy"] else handle
+    if term.name != "win32":
+        return None  # tmux 外、IDE 里的 Claude: 认不出来就不对应窗口
+    # Windows Terminal 的 hook 进程认不出窗口，只有一个 Claude 窗口才能确定是它；只用缓存，不阻塞事件循环
+    import claude_detect
+    windows = claude_detect._windows_cache
+    if len(windows) == 1 and _handles.get(windows[0]["handle"]) not in _sessions:
+        return windows[0]["handle"]
+    return None
+
+
+def _end_turn(s: dict, ts: float) -> None:
+    if s["turn_start"] is not None:
+        s["last_turn"] = ts - s["turn_start"]
+        s["turns"] += 1
+    s.update(busy=False, turn_start=None, prompt=None)
+    s["running"].clear()
+
+
+def ingest(event: dict) -> dict | None:
+    """记录一个 hook 事件，返回会话状态；缺少 session_id / 事件名时忽略。"""
+    sid = event.get("session_id") or ""
+    name = event.get("hook_event_name") or ""
+    if not sid or not name:
+        return None
+    ts = float(event.get("_ts") or time.time())
+    s = _sessions.get(sid)
+    if s is None:
+        s = _sessions[sid] = _new_session(sid, ts)
+    if s["handle"] is None:
+        s["handle"] = _resolve_handle(event.get("_origin"), sid)
+        if s["handle"] is not None:
+            old = _handles.get(s["handle"])
+            if old and old != sid:
+                _sessions.pop(old, None)  # 同一 pane 里先前的会话已结束 (没有 SessionEnd)
+            _handles[s["handle"]] = sid
+    s["cwd"] = event.get("cwd") or s["cwd"]
+    s["transcript"] = event.get("transcript_path") or s["transcript"]
+    s["events"][name] += 1
+    s["last_event"], s["last_ts"] = name, ts
+    tool = event.get("tool_name") or ""
+
+    if name == "UserPromptSubmit":
+        if s["busy"]:
+            _end_turn(s, ts)  # 上一轮被中断时不会有 Stop
+        s.update(hooked=True, busy=True, turn_start=ts, prompt=None)
+        s["turn_tools"].clear()
+        s["turn_tool_time"].clear()
+    elif name == "PreToolUse":
+        if not s["busy"]:
+            s.update(busy=True, turn_start=ts)
+            s["turn_tools"].clear()
+            s["turn_tool_time"].clear()
+        s.update(hooked=True, prompt=None)
+        key = event.get("tool_use_id") or f"{tool}@{ts}"
+        s["running"][key] = (tool, _detail(event.get("tool_input")), ts)
+    elif name in ("PostToolUse", "PostToolUseFailure"):
+        key = event.get("tool_use_id")
+        if key not in s["running"]:
+            key = next((k for k, v in s["running"].items() if v[0] == tool), None)
+        started = s["running"].pop(key)[2] if key is not None else ts
+        s["tools"].append((tool, ts - started, name == "PostToolUse"))
+        s["turn_tools"][tool] += 1
+        s["turn_tool_time"][tool] += ts - started
+        s["prompt"] = None
+    elif name == "PermissionRequest":
+        detail = _detail(event.get("tool_input"))
+        s["prompt"] = f"{tool} 需要授权" + (f": {detail}" if detail else "")
+    elif name == "Notification":
+        message = event.get("message") or ""
+        if "permission" in message.lower():
+            s["prompt"] = message
+        elif "waiting for your input" in message.lower() and s["busy"]:
+            _end_turn(s, ts)
+    elif name == "Stop":
+        _end_turn(s, ts)
+    elif name == "SessionEnd":
+        _end_turn(s, ts)
+        _sessions.pop(sid, None)
+        if s["handle"] is not None and _handles.get(s["handle"]) == sid:
+            del _handles[s["handle"]]
+
+    for listener in list(_listeners):
+        try:
+            listener(s["handle"])
+        except Exception as e:
+            logger.debug(f"[hook] 监听回调异常: {e}")
+    return s
+
+
+def subscribe(listener) -> None:
+    _listeners.append(listener)
+
+
+def unsubscribe(listener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def follow(handles) -> None:
+    _followed.clear()
+    _followed.update(handles)
+
+
+def followed(handle) -> bool:
+    """被动监控是否在跟踪这个窗口 (会报告它的进度和完成)。"""
+    return handle is not None and handle in _followed
+
+
+def for_handle(handle: int) -> dict | None:
+    sid = _handles.get(handle)
+    return _sessions.get(sid) if sid else None
+
+
+def driven(handle: int) -> bool:
+    """该窗口的忙闲是否完全由 hook 事件给出。"""
+    s = for_handle(handle)
+    return bool(s and s["hooked"])
+
+
+def mark_idle(handle: int) -> None:
+    """标题显示已空闲但没等到 Stop (用户在终端里中断时 Claude 不发 Stop)。"""
+    s = for_handle(handle)
+    if s and s["busy"]:
+        _end_turn(s, time.time())
+
+
+def prune(live_handles) -> None:
+    """窗口关闭后丢掉对应的会话；长期没有事件且未对应窗口的会话一并清理。"""
+    live = set(live_handles)
+    for handle in [h for h in _handles if h not in live]:
+        _sessions.pop(_handles.pop(handle), None)
+    cutoff = time.time() - _STALE
+    for sid in [k for k, s in _sessions.items() if s["handle"] is None and s["last_ts"] < cutoff]:
+        del _sessions[sid]
+
+
+def _fmt_secs(secs: float) -> str:
+    secs = int(secs)
+    return f"{secs // 60}m {secs % 60}s" if secs >= 60 else f"{secs}s"
+
+
+def progress(s: dict, now: float | None = None) -> str:
+    """思考中的一行进度: 当前工具及已运行时间、本轮已完成的工具数。"""
+    now = now or time.time()
+    parts = [f"思考中... ({_fmt_secs(now - (s['turn_start'] or now))})"]
+    if s["prompt"]:
+        parts.append(f"🔐 {s['prompt']}")
+    for tool, detail, started in list(s["running"].values())[-2:]:
+        parts.append(f"🔧 {tool}{': ' + detail if detail else ''} ({_fmt_secs(now - started)})")
+    done = sum(s["turn_tools"].values())
+    if done:
+        parts.append(f"已完成 {done} 次工具调用")
+    return " · ".join(parts)
+
+
+def summary(s: dict) -> str:
+    """回合结束时的摘要: 用时和各工具次数/耗时。"""
+    parts = []
+    if s["last_turn"] is not None:
+        parts.append(f"用时 {_fmt_secs(s['last_turn'])}")
+    if s["turn_tools"]:
+        tools = ", ".join(f"{t}×{n} {_fmt_secs(s['turn_tool_time'][t])}" for t, n in s["turn_tools"].most_common(4))
+        parts.append(f"工具 {sum(s['turn_tools'].values())} 次 ({tools})")
+    return " · ".join(parts)
+
+
+def stats() -> dict:
+    return {
+        "sessions": len(_sessions),
+        "hooked": sum(s["hooked"] for s in _sessions.values()),
+        "busy": sum(s["busy"] for s in _sessions.values()),
+        "mapped": len(_handles),
+    }
@@ -0,0 +1,247 @@
+"""日志查看: 从文件尾部按块倒序读取，跨轮转文件过滤，支持 follow 推送。"""
+import os
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from config import _BASE_DIR
+
+logger = logging.getLogger("bedcode")
+
+LOG_PATH = os.path.join(_BASE_DIR, "bot.log")
+_BACKUPS = 3  # 与 config 中 RotatingFileHandler 的 backupCount 一致
+_BLOCK = 64 * 1024
+_HEAD_RE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ \[(\w+)\] ")
+_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "WARN": 30, "ERROR": 40, "CRITICAL": 50}
+_NOISE_RE = re.compile(r"\] HTTP Request: ")  # httpx 请求日志，follow 时默认跳过避免自我刷屏
+_FOLLOW_POLL = 1.0
+_FOLLOW_INTERVAL = 3.0
+_FOLLOW_MAX_CHARS = 3500
+_FOLLOW_TTL = 30 * 60
+
+_followers = {}  # chat_id → asyncio.Task
+
+
+class LogFilter:
+    """最低级别 / 时间范围 / 正则，作用于整条记录（含 traceback 续行）。"""
+
+    def __init__(self, level: str | None = None, since: datetime | None = None,
+                 until: datetime | None = None, pattern: str | None = None):
+        self.min_level = _LEVELS.get(level.upper(), 0) if level else 0
+        self.since = since
+        self.until = until
+        self.regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+
+    def describe(self) -> str:
+        parts = []
+        if self.min_level:
+            parts.append(f"≥{logging.getLevelName(self.min_level)}")
+        if self.since:
+            parts.append(f"从 {self.since:%m-%d %H:%M}")
+        if self.until:
+            parts.append(f"到 {self.until:%m-%d %H:%M}")
+        if self.regex:
+            parts.append(f"/{self.regex.pattern}/")
+        return " ".join(parts)
+
+    def match(self, record: str, ts: datetime | None, level: str | None) -> bool:
+        if self.min_level and _LEVELS.get(level or "", 0) < self.min_level:
+            return False
+        if ts is not None:
+            if self.since and ts < self.since:
+                return False
+            if self.until and ts > self.until:
+                return False
+        if self.regex and not self.regex.search(record):
+            return False
+        return True
+
+
+def parse_args(args: list[str]) -> tuple[int, LogFilter]:
+    """/log [行数] [级别] [10m|2h|1d|HH:MM|HH:MM-HH:MM] [正则...]"""
+    n = 30
+    level = since = until = None
+    rest = []
+    now = datetime.now()
+    for a in args:
+        low = a.lower()
+        if a.isdigit() and not rest:
+            n = min(int(a), 500)
+        elif a.upper() in _LEVELS and level is None:
+            level = a
+        elif re.fullmatch(r"\d+[smhd]", low) and since is None:
+            unit = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}[low[-1]]
+            since = now - timedelta(**{unit: int(low[:-1])})
+        elif re.fullmatch(r"\d{1,2}:\d\d(-\d{1,2}:\d\d)?", a) and since is None:
+            start, _, end = a.partition("-")
+            since = _today_at(start, now)
+            if since > now:
+                since -= timedelta(days=1)
+            if end:
+                until = _today_at(end, since)
+                if until < since:
+                    until += timedelta(days=1)
+        else:
+            rest.append(a)
+    return n, LogFilter(level, since, until, " ".join(rest) or None)
+
+
+def _today_at(hhmm: str, ref: datetime) -> datetime:
+    h, m = hhmm.split(":")
+    return ref.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+
+
+def _log_files() -> list[str]:
+    """从新到旧: bot.log, bot.log.1, ... bot.log.N"""
+    paths = [LOG_PATH] + [f"{LOG_PATH}.{i}" for i in range(1, _BACKUPS + 1)]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def _reverse_lines(path: str):
+    """按块从文件尾部向前读，逐行倒序产出，不把整个文件读入内存。"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0:
+            size = min(_BLOCK, pos)
+            pos -= size
+            f.seek(pos)
+            buf = f.read(size) + tail
+            lines = buf.split(b"\n")
+            tail = lines[0]  # 块首行可能不完整，留给下一块
+            for line in reversed(lines[1:]):
+                yield line.decode("utf-8", errors="replace").rstrip("\r")
+        yield tail.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def _parse_head(line: str) -> tuple[datetime | None, str | None]:
+    m = _HEAD_RE.match(line)
+    if not m:
+        return None, None
+    try:
+        return datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S"), m.group(2)
+    except ValueError:
+        return None, m.group(2)
+
+
+def tail(n: int, flt: LogFilter) -> tuple[list[str], int]:
+    """返回最近 n 条匹配记录（旧→新）以及扫描过的行数。同步函数，需在线程中调用。"""
+    found = []
+    pending = []  # 倒序读到的续行（traceback 等），等遇到记录头再拼接
+    scanned = 0
+    for path in _log_files():
+        for line in _reverse_lines(path):
+            scanned += 1
+            if not line and not pending:
+                continue
+            ts, level = _parse_head(line)
+            if ts is None and level is None:
+                pending.append(line)
+                continue
+            record = "\n".join([line] + pending[::-1])
+            pending = []
+            if flt.match(record, ts, level):
+                found.append(record)
+                if len(found) >= n:
+                    return found[::-1], scanned
+            if flt.since and ts is not None and ts < flt.since:
+                # 日志按时间顺序写入，再往前都更早
+                return found[::-1], scanned
+    return found[::-1], scanned
+
+
+# ── follow ───────────────────────────────────────────────────────
+def _read_new(pos: int) -> tuple[str, int]:
+    try:
+        size = os.path.getsize(LOG_PATH)
+    except OSError:
+        return "", 0
+    if size < pos:  # 已轮转，从新文件开头读
+        pos = 0
+    if size == pos:
+        return "", pos
+    with open(LOG_PATH, "rb") as f:
+        f.seek(pos)
+        data = f.read(min(size - pos, 1024 * 1024))
+    end = data.rfind(b"\n")
+    if end < 0:
+        return "", pos
+    return data[:end + 1].decode("utf-8", errors="replace"), pos + end + 1
+
+
+def _filter_block(text: str, flt: LogFilter, skip_noise: bool) -> list[str]:
+    records = []
+    for line in text.rstrip("\n").split("\n"):
+        ts, level = _parse_head(line)
+        if ts is None and level is None and records:
+            records[-1][0].append(line)
+        else:
+            records.append(([line], ts, level))
+    out = []
+    for lines, ts, level in records:
+        rec = "\n".join(lines)
+        if skip_noise and _NOISE_RE.search(rec):
+            continue
+        if flt.match(rec, ts, level):
+            out.append(rec)
+    return out
+
+
+async def _follow_loop(chat_id: int, flt: LogFilter, bot) -> None:
+    pos = os.path.getsize(LOG_PATH) if os.path.exists(LOG_PATH) else 0
+    skip_noise = flt.regex is None
+    pending = []
+    last_sent = 0.0
+    deadline = time.time() + _FOLLOW_TTL
+    try:
+        while time.time() < deadline:
+            await asyncio.sleep(_FOLLOW_POLL)
+            text, pos = await asyncio.to_thread(_read_new, pos)
+            if text:
+                pending.extend(_filter_block(text, flt, skip_noise))
+            if not pending or time.time() - last_sent < _FOLLOW_INTERVAL:
+                continue
+            body = "\n".join(pending)
+            dropped = 0
+            while len(body) > _FOLLOW_MAX_CHARS and len(pending) > 1:
+                pending.pop(0)
+                dropped += 1
+                body = "\n".join(pending)
+            if dropped:
+                body = f"... 省略 {dropped} 条\n{body}"
+            pending = []
+            last_sent = time.time()
+            try:
+                await bot.send_message(chat_id=chat_id, text=body[-4000:])
+            except Exception as e:
+                logger.debug(f"[log] follow 推送失败: {e}")
+        try:
+            await bot.send_message(chat_id=chat_id, text="⏹ /log follow 已超时停止")
+        except Exception:
+            pass
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if _followers.get(chat_id) is asyncio.current_task():
+            _followers.pop(chat_id, None)
+
+
+def start_follow(chat_id: int, flt: LogFilter, bot) -> None:
+    stop_follow(chat_id)
+    _followers[chat_id] = asyncio.create_task(_follow_loop(chat_id, flt, bot))
+
+
+def stop_follow(chat_id: int) -> bool:
+    task = _followers.pop(chat_id, None)
+    if task and not task.done():
+        task.cancel()
+        return True
+    return False
+
+
+def stop_all_follows() -> None:
+    for chat_id in list(_followers):
+        stop_follow(chat_id)
@@ -0,0 +1,68 @@
+"""媒体 file_id 缓存: 相同内容的照片/语音直接用 Telegram 返回的 file_id 重发，不再上传。"""
+import hashlib
+import logging
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger("bedcode")
+
+_MAX_ENTRIES = 512
+_cache = OrderedDict()  # (类型, sha256) → (file_id, 字节数)
+_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "bytes_uploaded": 0}
+
+
+def _key(kind: str, data: bytes) -> tuple[str, str]:
+    return kind, hashlib.sha256(data).hexdigest()
+
+
+def _remember(key: tuple[str, str], file_id: str, size: int) -> None:
+    _cache[key] = (file_id, size)
+    _cache.move_to_end(key)
+    while len(_cache) > _MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+
+async def _send(kind: str, sender, data: bytes, extract, **kwargs):
+    key = _key(kind, data)
+    hit = _cache.get(key)
+    if hit:
+        file_id, size = hit
+        try:
+            msg = await sender(**{kind: file_id}, **kwargs)
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            _stats["bytes_saved"] += size
+            return msg
+        except BadRequest as e:
+            # file_id 失效（极少见），丢弃后重新上传
+            logger.debug(f"[媒体缓存] file_id 失效: {e}")
+            _cache.pop(key, None)
+    msg = await sender(**{kind: data}, **kwargs)
+    _stats["misses"] += 1
+    _stats["bytes_uploaded"] += len(data)
+    try:
+        _remember(key, extract(msg), len(data))
+    except (AttributeError, IndexError, TypeError):
+        pass
+    return msg
+
+
+async def send_photo_cached(bot, chat_id: int, photo: bytes, **kwargs):
+    """与 bot.send_photo 相同，内容重复时按 file_id 发送。"""
+    return await _send(
+        "photo", lambda **kw: bot.send_photo(chat_id=chat_id, **kw), photo,
+        lambda m: m.photo[-1].file_id, **kwargs,
+    )
+
+
+async def send_voice_cached(bot, chat_id: int, voice: bytes, **kwargs):
+    return await _send(
+        "voice", lambda **kw: bot.send_voice(chat_id=chat_id, **kw), voice,
+        lambda m: m.voice.file_id, **kwargs,
+    )
+
+
+def stats() -> dict:
+    total = _stats["hits"] + _stats["misses"]
+    return dict(_stats, entries=len(_cache), hit_rate=_stats["hits"] / total if total else 0.0)
@@ -9,12 +9,17 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from config import state
-from win32_api import (
+from terminal import (
     capture_window_screenshot, _image_hash, get_window_title,
     send_keys_to_window, send_raw_keys,
 )
 from claude_detect import detect_claude_state, read_terminal_text, read_last_transcript_response, find_claude_windows
 from utils import send_result
+from media_cache import send_photo_cached
+from timelapse import Timelapse, send_timelapse
+from text_delta import delta as text_delta
+import tmux_control
+import hook_state
 
 logger = logging.getLogger("bedcode")
 _queue_lock = asyncio.Lock()
@@ -37,6 +42,9 @@ def _build_queue_text() -> str:
     return text
 
 
+_PROMPT_MARKERS = ("(y/n)", "(Y/n)", "❯", "◯", "◉", "☐", "☑", "Select an option", "allowedPrompts", "Do you want")
+
+
 def _detect_interactive_prompt(text: str) -> str | None:
     if not text:
         return None
@@ -44,10 +52,7 @@ def _detect_interactive_prompt(text: str) -> str | None:
     tail = "\n".join(lines[-30:])
     last_few = "\n".join(lines[-5:])
     # Exact prompt markers (only match in last 5 lines)
-    for p in ("(y/n)", "(Y/n)", "❯", "◯", "◉", "☐", "☑"):
-        if p in last_few:
-            return tail
-    for p in ("Select an option", "allowedPrompts", "Do you want"):
+    for p in _PROMPT_MARKERS:
         if p in last_few:
             return tail
     return None
@@ -67,6 +72,10 @@ def _parse_prompt_type(prompt_text: str) -> list[tuple[str, str]]:
     return []
 
 
+def _full_markup(handle: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("📄 显示全文", callback_data=f"full:{handle}")]])
+
+
 _BREAK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🛑 Ctrl+C", callback_data="break:ctrlc")]])
 
 
@@ -96,23 +105,38 @@ async def _delete_status() -> None:
         state["status_msg"] = None
 
 
-async def _forward_result(chat_id: int, handle: int, ctx) -> None:
-    """截图+文本转发到 Telegram。ctx 可以是 ContextTypes 或 Application。"""
+async def _forward_result(chat_id: int, handle: int, ctx, transcript: str | None = None) -> None:
+    """截图+文本转发到 Telegram。ctx 可以是 ContextTypes 或 Application；transcript 为 hook 给出的会话记录路径。"""
     bot = ctx.bot if hasattr(ctx, 'bot') else ctx
     state["last_screenshot_hash"] = None
     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
     if img_data:
         for _attempt in range(2):
             try:
-                await bot.send_photo(chat_id=chat_id, photo=img_data)
+                await send_photo_cached(bot, chat_id, img_data)
                 break
             except Exception:
                 if _attempt == 0:
                     await asyncio.sleep(1)
-    term_text = await asyncio.to_thread(read_last_transcript_response)
+    source = "transcript"
+    term_text = await asyncio.to_thread(read_last_transcript_response, transcript)
     if not term_text or len(term_text.strip()) <= 10:
+        source = "uia"
         term_text = await asyncio.to_thread(read_terminal_text, handle)
+    omitted = 0
     if term_text and len(term_text.strip()) > 10:
+        # 终端文本只转发上次之后新增的行 (transcript 回复整条发送)，已发过的回滚内容用按钮按需查看
+        term_text, is_delta, omitted = text_delta(handle, term_text, source)
+        if is_delta and not term_text.strip():
+            try:
+                await bot.send_message(
+                    chat_id=chat_id, text=f"(无新输出，已省略 {omitted} 行)",
+                    reply_markup=_full_markup(handle),
+                )
+            except Exception:
+                pass
+            return
+    if term_text and (omitted or len(term_text.strip()) > 10):
         # Detect notification level
         _err_kw = ("error", "Error", "failed", "Failed", "❌", "traceback", "Traceback", "exception", "Exception")
         _ok_kw = ("✅", "完成", "done", "success", "passed")
@@ -131,6 +155,14 @@ async def _forward_result(chat_id: int, handle: int, ctx) -> None:
             if proj_label:
                 term_text = f"📂 {proj_label}\n\n{term_text}"
         await send_result(chat_id, prefix + term_text if prefix else term_text, ctx)
+        if omitted:
+            try:
+                await bot.send_message(
+                    chat_id=chat_id, text=f"🆕 仅显示新增内容，已省略 {omitted} 行",
+                    reply_markup=_full_markup(handle), disable_notification=True,
+                )
+            except Exception:
+                pass
 
         if level == "error":
             await bot.send_message(chat_id=chat_id, text="🚨 检测到错误输出，请检查！")
@@ -146,6 +178,8 @@ async def _monitor_loop(
     idle_count = 0
     last_state = None
     grace_period = 5
+    # 延时模式: 思考期间只缓存帧，本轮结束时合成一段动画发送
+    tl = Timelapse() if state.get("timelapse") else None
 
     try:
         title = await asyncio.to_thread(get_window_title, handle)
@@ -160,6 +194,8 @@ async def _monitor_loop(
             await asyncio.sleep(1.5)
 
             if time.time() - start_time > max_duration:
+                if tl is not None:
+                    await send_timelapse(tl, chat_id, context.bot)
                 await _update_status(chat_id, "⏰ 监控已运行60分钟，自动停止。发 /watch 继续监控或 /screenshot 查看状态", context)
                 break
 
@@ -179,7 +215,7 @@ async def _monitor_loop(
                     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
                     if img_data:
                         try:
-                            await context.bot.send_photo(chat_id=chat_id, photo=img_data)
+                            await send_photo_cached(context.bot, chat_id, img_data)
                         except Exception:
                             pass
                     await _delete_status()
@@ -197,9 +233,11 @@ async def _monitor_loop(
                 elapsed = int(time.time() - start_time)
                 if elapsed in range(30, 32) or elapsed in range(90, 92) or elapsed in range(180, 182):
                     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
-                    if img_data:
+                    if img_data and tl is not None:
+                        tl.add(img_data)
+                    elif img_data:
                         try:
-                            await context.bot.send_photo(chat_id=chat_id, photo=img_data, caption=f"⏳ 思考已 {_fmt_elapsed(start_time)}")
+                            await send_photo_cached(context.bot, chat_id, img_data, caption=f"⏳ 思考已 {_fmt_elapsed(start_time)}")
                         except Exception:
                             pass
 
@@ -229,10 +267,12 @@ async def _monitor_loop(
                             idle_count = 0
                             grace_period = 5
                             continue
+                    if tl is not None:
+                        await send_timelapse(tl, chat_id, context.bot)
                     img_data = await asyncio.to_thread(capture_window_screenshot, handle)
                     if img_data:
                         try:
-                            await context.bot.send_photo(chat_id=chat_id, photo=img_data)
+                            await send_photo_cached(context.bot, chat_id, img_data)
                         except Exception:
                             pass
                     qr_buttons = _parse_prompt_type(prompt)
@@ -270,6 +310,9 @@ async def _monitor_loop(
 
                     await _delete_status()
 
+                    if tl is not None:
+                        await send_timelapse(tl, chat_id, context.bot)
+                        tl.reset()
                     await _forward_result(chat_id, handle, context)
 
                     if state.get("auto_pin", True):
@@ -333,13 +376,16 @@ async def _monitor_loop(
             if now - last_screenshot_time >= state["screenshot_interval"]:
                 last_screenshot_time = now
                 img_data = await asyncio.to_thread(capture_window_screenshot, handle)
-                if img_data:
+                if img_data and tl is not None:
+                    if st == "thinking":
+                        tl.add(img_data)
+                elif img_data:
                     img_hash = _image_hash(img_data)
                     if img_hash != state["last_screenshot_hash"]:
                         state["last_screenshot_hash"] = img_hash
                         for _attempt in range(2):
                             try:
-                                await context.bot.send_photo(chat_id=chat_id, photo=img_data)
+                                await send_photo_cached(context.bot, chat_id, img_data)
                                 break
                             except Exception:
                                 if _attempt == 0:
@@ -371,136 +417,371 @@ def _start_monitor(handle: int, chat_id: int, context: ContextTypes.DEFAULT_TYPE
     )
 
 
-async def _passive_monitor_loop(app) -> None:
-    """常驻后台监控：检测所有 Claude 窗口的 thinking→idle 转换，自动转发结果到 Telegram。"""
-    window_states = {}  # handle → {"was_thinking", "idle_count", "think_start", "status_msg"}
+_ELAPSED = re.compile(r" \((?:\d+m )?\d+s\)")  # 进度文本里的耗时，比较工具/权限状态是否变化时忽略
 
-    while True:
-        try:
-            await asyncio.sleep(5)
 
-            # 定期清理已完成的 scheduled_tasks
-            if state.get("scheduled_tasks"):
-                state["scheduled_tasks"] = [t for t in state["scheduled_tasks"] if not t["task"].done()]
+def _new_window_state() -> dict:
+    return {
+        "was_thinking": False, "idle_count": 0,
+        "think_start": None, "status_msg": None, "last_edit": 0, "prompt": None,
+        "status_text": "",
+    }
 
-            chat_id = state.get("chat_id")
-            if not chat_id:
-                continue
 
-            # 如果 Telegram 触发的监控正在运行，让它处理，被动监控跳过
-            active_task = state.get("monitor_task")
-            if active_task and not active_task.done():
-                for ws in window_states.values():
-                    if ws["status_msg"]:
-                        try: await ws["status_msg"].delete()
-                        except Exception: pass
-                window_states.clear()
-                continue
+async def _drop_window_states(window_states: dict, keep=()) -> None:
+    """删除不在 keep 中的窗口状态及其思考状态消息。"""
+    for h in list(window_states):
+        if h not in keep:
+            ws = window_states.pop(h)
+            if ws["status_msg"]:
+                try: await ws["status_msg"].delete()
+                except Exception: pass
+
 
-            windows = await asyncio.to_thread(find_claude_windows)
-            live_handles = {w["handle"] for w in windows}
-
-            # Clean up entries for windows that no longer exist
-            for h in list(window_states):
-                if h not in live_handles:
-                    ws = window_states.pop(h)
-                    if ws["status_msg"]:
-                        try: await ws["status_msg"].delete()
-                        except Exception: pass
-
-            # Auto-update target_handle if current one is gone
-            if state.get("target_handle") not in live_handles:
-                if windows:
-                    state["target_handle"] = windows[0]["handle"]
-                    logger.info(f"[被动监控] 窗口已关闭，自动切换到 {windows[0]['handle']}")
-                else:
-                    state["target_handle"] = None
+def _follow_target(windows: list[dict]) -> bool:
+    """目标窗口已关闭时自动切换到第一个窗口；没有窗口时返回 False。"""
+    if state.get("target_handle") not in {w["handle"] for w in windows}:
+        if windows:
+            state["target_handle"] = windows[0]["handle"]
+            logger.info(f"[被动监控] 窗口已关闭，自动切换到 {windows[0]['handle']}")
+        else:
+            state["target_handle"] = None
+            return False
+    return True
+
+
+async def _passive_step(app, chat_id: int, handle: int, label: str, st: str, ws: dict,
+                        hook: dict | None = None) -> None:
+    """单个窗口的 thinking→idle 状态机，轮询和 tmux 推送两种模式共用。
+
+    hook 为 hook_state 的会话状态时 st 来自 hook 事件: 进度显示当前工具，完成不再二次确认。
+    """
+    if st == "thinking":
+        ws["idle_count"] = 0
+        if not ws["was_thinking"]:
+            ws["was_thinking"] = True
+            ws["think_start"] = (hook and hook["turn_start"]) or time.time()
+            ws["last_edit"] = time.time()
+            ws["status_text"] = hook_state.progress(hook) if hook else "思考中... (0s)"
+            try:
+                ws["status_msg"] = await app.bot.send_message(
+                    chat_id=chat_id, text=f"🧠 [{label}] {ws['status_text']}")
+            except Exception:
+                ws["status_msg"] = None
+        elif ws["status_msg"] and ws["think_start"]:
+            if hook:
+                # 工具/权限状态变化时尽快更新 (至少间隔 3s)，否则每 ~10s 刷新耗时
+                text = hook_state.progress(hook)
+                changed = _ELAPSED.sub("", text) != _ELAPSED.sub("", ws["status_text"])
+                due = time.time() - ws["last_edit"] >= (3 if changed else 10)
+            else:
+                text = f"思考中... ({_fmt_elapsed(ws['think_start'])})"
+                due = time.time() - ws["last_edit"] >= 10  # 每 ~10s 更新一次，避免 TG API 刷屏
+            if due:
+                ws["last_edit"] = time.time()
+                ws["status_text"] = text
+                try:
+                    await ws["status_msg"].edit_text(f"🧠 [{label}] {text}")
+                except Exception:
+                    pass
+
+    elif st == "idle" and ws["was_thinking"]:
+        ws["idle_count"] += 1
+        if hook or ws["idle_count"] >= 2:
+            # 再次确认 (hook 的 Stop 事件本身就是确定的完成信号)
+            if not hook:
+                title2 = await asyncio.to_thread(get_window_title, handle)
+                if title2 and detect_claude_state(title2) == "thinking":
+                    ws["idle_count"] = 0
+                    return
+
+            # 删除思考状态消息
+            if ws["status_msg"]:
+                try: await ws["status_msg"].delete()
+                except Exception: pass
+                ws["status_msg"] = None
+                ws["think_start"] = None
+
+            logger.info(f"[被动监控] [{label}] 检测到完成，转发结果")
+            ws["prompt"] = None
+
+            # Check quiet hours
+            qs, qe = state.get("quiet_start"), state.get("quiet_end")
+            if qs is not None and qe is not None:
+                hour = time.localtime().tm_hour
+                in_quiet = (hour >= qs or hour < qe) if qs > qe else (qs <= hour < qe)
+                if in_quiet:
+                    await app.bot.send_message(chat_id=chat_id, text=f"🔇 [{label}] 完成（静默时段）", disable_notification=True)
+                    ws["was_thinking"] = False; ws["idle_count"] = 0; return
+
+            # 智能通知: 5分钟内没有 TG 消息则静默通知（不丢弃结果）
+            summary = hook_state.summary(hook) if hook else ""
+            summary = f"\n{summary}" if summary else ""
+            transcript = hook["transcript"] if hook else None
+            if time.time() - state.get("last_tg_msg_time", 0) > 300:
+                logger.info("[被动监控] 用户不在 TG，静默通知")
+                await app.bot.send_message(chat_id=chat_id, text=f"📌 [{label}] 完成（静默）{summary}", disable_notification=True)
+                await _forward_result(chat_id, handle, app, transcript)
+                ws["was_thinking"] = False; ws["idle_count"] = 0; return
+
+            await app.bot.send_message(chat_id=chat_id, text=f"📌{label} 完成{summary}")
+            await _forward_result(chat_id, handle, app, transcript)
+
+            ws["was_thinking"] = False
+            ws["idle_count"] = 0
+    else:
+        ws["idle_count"] = 0
+
+
+# ── hook 驱动: Claude Code hook 事件给出忙闲和进度 ──────────────────
+_HOOK_STALE = 60  # 会话忙碌却这么久没有 hook 事件、标题又已空闲，视为在终端里被中断 (中断不发 Stop)
+
+
+def _hook_stale(s: dict, title_state: str) -> bool:
+    return (s["busy"] and not s["prompt"] and title_state == "idle"
+            and time.time() - s["last_ts"] > _HOOK_STALE)
+
+
+async def _send_prompt(app, chat_id: int, handle: int, label: str, prompt: str) -> None:
+    markup = None
+    # 快捷按钮作用于当前目标窗口，其他窗口只提示
+    qr_buttons = _parse_prompt_type(prompt) if handle == state.get("target_handle") else []
+    if qr_buttons:
+        markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(text, callback_data=f"qr:{keys}") for text, keys in qr_buttons]]
+        )
+    safe_prompt = html.escape(prompt[-1500:])[:3800]
+    try:
+        await app.bot.send_message(
+            chat_id=chat_id, text=f"🔘 [{label}] 等待你选择:\n\n{safe_prompt}", reply_markup=markup,
+        )
+    except Exception:
+        pass
+
+
+async def _hook_step(app, chat_id: int, handle: int, label: str, ws: dict, s: dict) -> None:
+    """hook 驱动的窗口: 权限请求出现时读一次屏幕发出选项，其余交给 _passive_step。"""
+    if s["busy"] and s["prompt"] and ws["prompt"] != s["prompt"]:
+        ws["prompt"] = s["prompt"]
+        text = await asyncio.to_thread(read_terminal_text, handle)
+        logger.info(f"[被动监控] [{label}] 权限请求: {s['prompt']}")
+        await _send_prompt(app, chat_id, handle, label, (_detect_interactive_prompt(text) if text else None) or s["prompt"])
+    elif not s["prompt"]:
+        ws["prompt"] = None
+    await _passive_step(app, chat_id, handle, label, "thinking" if s["busy"] else "idle", ws, s)
+
+
+async def _passive_monitor_loop(app) -> None:
+    """常驻后台监控：检测所有 Claude 窗口的 thinking→idle 转换，自动转发结果到 Telegram。
+
+    hook 驱动的窗口收到事件立即处理；窗口全部由 hook 驱动且都空闲时，标题扫描放宽到 _RESYNC 秒。
+    """
+    window_states = {}  # handle → _new_window_state()
+    windows = []
+    woken = set()       # 收到 hook 事件的窗口
+    probed = set()      # 为之立即扫描过但不在列表中的窗口，到下次定时扫描前不再为它扫描
+    wake = asyncio.Event()
+    next_scan = time.time() + 5
+    next_tick = float("inf")  # hook 驱动的窗口忙碌时定时刷新进度，不必扫描标题
+
+    def _on_hook(handle):
+        woken.add(handle)
+        wake.set()
+
+    hook_state.subscribe(_on_hook)
+    try:
+        while True:
+            try:
+                wait = min(next_scan, next_tick) - time.time()
+                if wait > 0:
+                    try:
+                        await asyncio.wait_for(wake.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                wake.clear()
+                hooked, now = set(woken), time.time()
+                woken.clear()
+                # 新会话的 hook 事件来自还不认识的窗口时立即扫描
+                known = {w["handle"] for w in windows} | probed
+                unknown = {h for h in hooked if h is not None and h not in known}
+                if now >= next_scan:
+                    probed.clear()
+                probed |= unknown
+                scan = now >= next_scan or bool(unknown)
+                tick = now >= next_tick
+                if scan:
+                    next_scan = now + 5
+                    # 定期清理已完成的 scheduled_tasks
+                    if state.get("scheduled_tasks"):
+                        state["scheduled_tasks"] = [t for t in state["scheduled_tasks"] if not t["task"].done()]
+                if tick:
+                    next_tick = float("inf")
+
+                chat_id = state.get("chat_id")
+                if not chat_id:
                     continue
 
-            for w_info in windows:
-                handle = w_info["handle"]
-                label = w_info.get("label") or f"窗口{handle}"
-                st = w_info["state"]
+                # 如果 Telegram 触发的监控正在运行，让它处理，被动监控跳过
+                active_task = state.get("monitor_task")
+                if active_task and not active_task.done():
+                    await _drop_window_states(window_states)
+                    continue
 
-                if handle not in window_states:
-                    window_states[handle] = {
-                        "was_thinking": False, "idle_count": 0,
-                        "think_start": None, "status_msg": None,
-                    }
-                ws = window_states[handle]
+                if scan:
+                    windows = await asyncio.to_thread(find_claude_windows, 0 if unknown else 5)
+                    await _drop_window_states(window_states, {w["handle"] for w in windows})
+                    hook_state.prune(w["handle"] for w in windows)
+                    hook_state.follow(w["handle"] for w in windows)
+                    if not _follow_target(windows):
+                        continue
 
-                if st == "thinking":
-                    ws["idle_count"] = 0
-                    if not ws["was_thinking"]:
-                        ws["was_thinking"] = True
-                        ws["think_start"] = time.time()
-                        try:
-                            ws["status_msg"] = await app.bot.send_message(
-                                chat_id=chat_id, text=f"🧠 [{label}] 思考中... (0s)")
-                        except Exception:
-                            ws["status_msg"] = None
-                    elif ws["status_msg"] and ws["think_start"]:
-                        elapsed = int(time.time() - ws["think_start"])
-                        if elapsed % 10 < 3:  # 每 ~10s 更新一次，避免 TG API 刷屏
-                            try:
-                                await ws["status_msg"].edit_text(
-                                    f"🧠 [{label}] 思考中... ({_fmt_elapsed(ws['think_start'])})")
-                            except Exception:
-                                pass
-
-                elif st == "idle" and ws["was_thinking"]:
-                    ws["idle_count"] += 1
-                    if ws["idle_count"] >= 2:
-                        # 再次确认
-                        title2 = await asyncio.to_thread(get_window_title, handle)
-                        if title2 and detect_claude_state(title2) == "thinking":
-                            ws["idle_count"] = 0
-                            continue
+                for w_info in windows:
+                    handle = w_info["handle"]
+                    label = w_info.get("label") or f"窗口{handle}"
+                    ws = window_states.setdefault(handle, _new_window_state())
+                    s = hook_state.for_handle(handle) if hook_state.driven(handle) else None
+                    if s is None:
+                        if scan:
+                            await _passive_step(app, chat_id, handle, label, w_info["state"], ws)
+                        continue
+                    if scan and _hook_stale(s, w_info["state"]):
+                        logger.info(f"[被动监控] [{label}] 未收到 Stop 但标题已空闲，按完成处理")
+                        hook_state.mark_idle(handle)
+                    if scan or tick or handle in hooked:
+                        await _hook_step(app, chat_id, handle, label, ws, s)
+
+                sessions = [hook_state.for_handle(w["handle"]) if hook_state.driven(w["handle"]) else None
+                            for w in windows]
+                if any(s and s["busy"] for s in sessions):
+                    next_tick = min(next_tick, time.time() + 5)
+                if scan and windows and all(sessions):
+                    next_scan = now + _RESYNC
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"被动监控异常: {e}")
+                await asyncio.sleep(5)
+    finally:
+        hook_state.unsubscribe(_on_hook)
+        hook_state.follow(())
 
-                        # 删除思考状态消息
-                        if ws["status_msg"]:
-                            try: await ws["status_msg"].delete()
-                            except Exception: pass
-                            ws["status_msg"] = None
-                            ws["think_start"] = None
-
-                        logger.info(f"[被动监控] [{label}] 检测到完成，转发结果")
-
-                        # Check quiet hours
-                        qs, qe = state.get("quiet_start"), state.get("quiet_end")
-                        if qs is not None and qe is not None:
-                            hour = time.localtime().tm_hour
-                            in_quiet = (hour >= qs or hour < qe) if qs > qe else (qs <= hour < qe)
-                            if in_quiet:
-                                await app.bot.send_message(chat_id=chat_id, text=f"🔇 [{label}] 完成（静默时段）", disable_notification=True)
-                                ws["was_thinking"] = False; ws["idle_count"] = 0; continue
-
-                        # 智能通知: 5分钟内没有 TG 消息则静默通知（不丢弃结果）
-                        if time.time() - state.get("last_tg_msg_time", 0) > 300:
-                            logger.info("[被动监控] 用户不在 TG，静默通知")
-                            await app.bot.send_message(chat_id=chat_id, text=f"📌 [{label}] 完成（静默）", disable_notification=True)
-                            await _forward_result(chat_id, handle, app)
-                            ws["was_thinking"] = False; ws["idle_count"] = 0; continue
-
-                        await app.bot.send_message(chat_id=chat_id, text=f"📌{label} 完成")
-                        await _forward_result(chat_id, handle, app)
-
-                        ws["was_thinking"] = False
-                        ws["idle_count"] = 0
-                else:
-                    ws["idle_count"] = 0
 
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"被动监控异常: {e}")
-            await asyncio.sleep(5)
+# ── tmux 控制模式: 推送驱动的被动监控 ────────────────────────────
+_IDLE_CONFIRM = 1.5  # 标题变为 idle 后隔多久再确认一次（相当于轮询模式的第二次 idle）
+_RESYNC = 30         # 兜底的窗口重新扫描间隔
+
+
+async def _passive_prompt(app, chat_id: int, handle: int, label: str, ws: dict, ctl) -> None:
+    """输出静默后检查交互提示: 推送的输出尾部出现提示标记才读取屏幕；提示出现时通知一次，消失后才会再通知。"""
+    if not ws["was_thinking"]:
+        return
+    prompt = None
+    if any(m in ctl.tail(handle)[-2000:] for m in _PROMPT_MARKERS):
+        text = await asyncio.to_thread(read_terminal_text, handle)
+        prompt = _detect_interactive_prompt(text) if text else None
+    shown, ws["prompt"] = ws["prompt"], prompt
+    if not prompt or shown:
+        return
+    logger.info(f"[被动监控] [{label}] 检测到交互提示")
+    await _send_prompt(app, chat_id, handle, label, prompt)
+
+
+async def _passive_event_loop(app) -> None:
+    """tmux 控制模式下的被动监控: 标题和输出由 tmux -C 推送，毫秒级响应，不再定时轮询标题。
+
+    hook 驱动的 pane 以 hook 事件为准，标题事件只用来刷新进度和发现被中断的回合。
+    """
+    ctl = tmux_control.ControlMonitor()
+    window_states = {}
+    labels = {}  # 当前 Claude 窗口 handle → 标签
+    probed = set()  # 为 hook 事件立即扫描过但不在 labels 中的 pane，到下次定时扫描前不再为它扫描
+    next_sync = 0.0
+
+    def _on_hook(handle):
+        if handle is not None:
+            ctl.emit("hook", handle)
+
+    hook_state.subscribe(_on_hook)
+    try:
+        while True:
+            try:
+                ev = None
+                wait = next_sync - time.time()
+                if wait > 0:
+                    try:
+                        ev = await asyncio.wait_for(ctl.events.get(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+                # 兜底定时扫描、会话增删、非 Claude pane 里新启动了 claude、或未知 pane 的首个 hook 事件时重新扫描
+                unknown_hook = ev is not None and ev.kind == "hook" and ev.handle not in labels and ev.handle not in probed
+                rescan = ev is None or ev.kind == "sessions" or (
+                    ev.kind == "title" and ev.handle not in labels and "claude" in ev.value.lower()
+                ) or unknown_hook
+                if ev is None:
+                    probed.clear()
+                elif unknown_hook:
+                    probed.add(ev.handle)
+                if rescan:
+                    if state.get("scheduled_tasks"):
+                        state["scheduled_tasks"] = [t for t in state["scheduled_tasks"] if not t["task"].done()]
+                    await ctl.sync()
+                    windows = await asyncio.to_thread(find_claude_windows, 0)
+                    labels = {w["handle"]: w.get("label") or f"窗口{w['handle']}" for w in windows}
+                    ctl.prune(set(labels))
+                    hook_state.prune(labels)
+                    hook_state.follow(labels)
+                    await _drop_window_states(window_states, labels)
+                    _follow_target(windows)
+                    # tmux 服务器未启动时没有客户端可接收通知，退回 5 秒扫描
+                    next_sync = time.time() + (_RESYNC if ctl.attached else 5)
+                if ev is None or ev.handle not in labels:
+                    continue
+
+                chat_id = state.get("chat_id")
+                if not chat_id:
+                    continue
+                active_task = state.get("monitor_task")
+                if active_task and not active_task.done():
+                    await _drop_window_states(window_states)
+                    continue
+
+                handle = ev.handle
+                ws = window_states.setdefault(handle, _new_window_state())
+                s = hook_state.for_handle(handle) if hook_state.driven(handle) else None
+                if s is not None:
+                    if ev.kind == "title" and _hook_stale(s, detect_claude_state(ev.value)):
+                        logger.info(f"[被动监控] [{labels[handle]}] 未收到 Stop 但标题已空闲，按完成处理")
+                        hook_state.mark_idle(handle)
+                    if ev.kind in ("hook", "title"):
+                        await _hook_step(app, chat_id, handle, labels[handle], ws, s)
+                elif ev.kind == "title":
+                    st = detect_claude_state(ev.value)
+                    await _passive_step(app, chat_id, handle, labels[handle], st, ws)
+                    if st == "idle" and ws["was_thinking"]:
+                        asyncio.get_running_loop().call_later(_IDLE_CONFIRM, ctl.emit, "confirm", handle)
+                elif ev.kind == "confirm":
+                    if ws["idle_count"] and detect_claude_state(ctl.title(handle) or "") == "idle":
+                        await _passive_step(app, chat_id, handle, labels[handle], "idle", ws)
+                elif ev.kind == "quiet":
+                    await _passive_prompt(app, chat_id, handle, labels[handle], ws, ctl)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"被动监控异常: {e}")
+                await asyncio.sleep(5)
+    finally:
+        hook_state.unsubscribe(_on_hook)
+        hook_state.follow(())
+        await _drop_window_states(window_states)
+        await ctl.close()
 
 
 def _start_passive_monitor(app):
     task = state.get("passive_monitor_task")
     if task and not task.done():
         return
-    state["passive_monitor_task"] = asyncio.create_task(
-        _passive_monitor_loop(app)
-    )
+    loop = _passive_event_loop if tmux_control.enabled() else _passive_monitor_loop
+    state["passive_monitor_task"] = asyncio.create_task(loop(app))
@@ -1,38 +1,72 @@
 #!/usr/bin/env python3
 """BedCode Notification Hook — Claude Code 完成时自动发送结果到 Telegram
 
-支持两种 hook 事件:
+会发消息的 hook 事件:
 - Notification: Claude Code 发通知时触发，直接拿通知内容
 - Stop: Claude 完成回复时触发，从 transcript 读取最后的 assistant 回复
+其他事件 (UserPromptSubmit / PreToolUse / PostToolUse 等) 只交给 bot 更新监控状态
+(见 hook_state.py)，bot 不在时忽略。
+
+bot 在运行时，事件原样交给它的本地端点 (hook_ipc.json 记录端口和令牌)，由 bot
+用已有的连接发送，hook 几毫秒内返回；bot 不在时才自己读 .env 直接调用 Bot API。
 """
 import sys
 import json
 import os
-import urllib.request
+import time
+import http.client
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOOK_IPC_FILE = os.path.join(_BASE_DIR, "hook_ipc.json")  # 与 config.HOOK_IPC_FILE 一致
 
-from dotenv import load_dotenv
 
-# 加载 .env（与 bot.py 同目录）
-env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
-load_dotenv(env_path)
+def send_to_bot(input_data: dict, timeout: float = 2) -> bool:
+    """交给运行中的 bot，成功返回 True。bot 未运行时连接会立即被拒绝。
+
+    附带事件时间和来源 (tmux pane / bot 启动会话时设置的 BEDCODE_SESSION)，
+    bot 据此把事件对应到窗口。
+    """
+    try:
+        with open(HOOK_IPC_FILE, "r", encoding="utf-8") as f:
+            ipc = json.load(f)
+        input_data = dict(input_data, _ts=time.time(), _origin={
+            "tmux_pane": os.environ.get("TMUX_PANE", ""),
+            "session": os.environ.get("BEDCODE_SESSION", ""),
+        })
+        conn = http.client.HTTPConnection("127.0.0.1", int(ipc["port"]), timeout=timeout)
+        try:
+            conn.request("POST", "/hook", body=json.dumps(input_data).encode("utf-8"), headers={
+                "Content-Type": "application/json", "X-BedCode-Token": ipc["token"],
+            })
+            return conn.getresponse().status == 202
+        finally:
+            conn.close()
+    except Exception:
+        return False
 
-BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
-_raw_chat_id = os.environ.get("ALLOWED_USER_IDS", "").split(",")[0].strip()
-try:
-    CHAT_ID = int(_raw_chat_id) if _raw_chat_id else None
-except ValueError:
-    print(f"WARNING: ALLOWED_USER_IDS 无效值 '{_raw_chat_id}'，通知已禁用")
-    CHAT_ID = None
 
-# 代理绕过（与 bot.py 一致）
-for key in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY",
-            "http_proxy", "https_proxy", "all_proxy"):
-    os.environ.pop(key, None)
+def _load_env() -> tuple[str, int | None]:
+    """直接发送时才需要: 加载 .env（与 bot.py 同目录），返回 (token, chat_id)。"""
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(_BASE_DIR, ".env"))
+    # 代理绕过（与 bot.py 一致）
+    for key in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY",
+                "http_proxy", "https_proxy", "all_proxy"):
+        os.environ.pop(key, None)
+    raw_chat_id = os.environ.get("ALLOWED_USER_IDS", "").split(",")[0].strip()
+    try:
+        chat_id = int(raw_chat_id) if raw_chat_id else None
+    except ValueError:
+        print(f"WARNING: ALLOWED_USER_IDS 无效值 '{raw_chat_id}'，通知已禁用", file=sys.stderr)
+        chat_id = None
+    return os.environ.get("TELEGRAM_BOT_TOKEN", ""), chat_id
 
 
 def send_telegram(text: str) -> bool:
-    """通过 Telegram Bot API 发送消息。"""
-    if not BOT_TOKEN or not CHAT_ID:
+    """通过 Telegram Bot API 直接发送消息 (bot 未运行时的兜底)。"""
+    import urllib.request
+    bot_token, chat_id = _load_env()
+    if not bot_token or not chat_id:
         return False
     # 截断过长消息，分片发送
     chunks = []
@@ -49,10 +83,10 @@ def send_telegram(text: str) -> bool:
     for i, chunk in enumerate(chunks):
         prefix = f"[{i+1}/{len(chunks)}]\n" if len(chunks) > 1 else ""
         payload = json.dumps({
-            "chat_id": CHAT_ID,
+            "chat_id": chat_id,
             "text": f"{prefix}{chunk}",
         }).encode("utf-8")
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
         req = urllib.request.Request(
             url, data=payload,
             headers={"Content-Type": "application/json"},
@@ -92,38 +126,46 @@ def read_last_response(transcript_path: str) -> str:
     return ""
 
 
-def handle_notification(input_data: dict) -> None:
-    """处理 Notification 事件。"""
+def notification_message(input_data: dict) -> str:
+    """Notification 事件的消息文本，没有内容时为空。"""
     title = input_data.get("title", "")
     body = input_data.get("body", "")
     message = input_data.get("message", "")
 
     text = title or message or body
     if not text:
-        return
+        return ""
 
     msg = f"🔔 Claude Code\n\n{text}"
     if body and body != text:
         msg += f"\n{body}"
-
-    send_telegram(msg.strip())
+    return msg.strip()
 
 
-def handle_stop(input_data: dict) -> None:
-    """处理 Stop 事件 — 从 transcript 读取完整回复。"""
+def stop_message(input_data: dict) -> str:
+    """Stop 事件 — 从 transcript 读取完整回复。"""
     transcript_path = input_data.get("transcript_path", "")
     stop_reason = input_data.get("stop_reason", "")
 
     response = read_last_response(transcript_path)
     if not response or len(response.strip()) < 5:
-        return
+        return ""
 
     # 构建消息
     header = "📝 Claude 回复"
     if stop_reason:
         header += f" ({stop_reason})"
+    return f"{header}\n\n{response}"
+
 
-    send_telegram(f"{header}\n\n{response}")
+def build_message(input_data: dict) -> str:
+    """按 hook 事件生成要发送的文本，不需要发消息的事件返回空；bot 收到转交的事件后也用它。"""
+    hook_event = input_data.get("hook_event_name", "")
+    if hook_event == "Stop":
+        return stop_message(input_data)
+    if hook_event in ("", "Notification"):  # 兼容旧格式
+        return notification_message(input_data)
+    return ""
 
 
 def main():
@@ -133,15 +175,10 @@ def main():
     except Exception:
         input_data = {}
 
-    hook_event = input_data.get("hook_event_name", "")
-
-    if hook_event == "Notification":
-        handle_notification(input_data)
-    elif hook_event == "Stop":
-        handle_stop(input_data)
-    else:
-        # 兼容旧格式 / 未知事件
-        handle_notification(input_data)
+    if not send_to_bot(input_data):
+        text = build_message(input_data)
+        if text:
+            send_telegram(text)
 
     # hook 必须输出 JSON 响应
     json.dump({"continue": True}, sys.stdout)
@@ -0,0 +1,201 @@
+"""OCR 服务: 独立进程池 + 终端画面预处理 + 按帧/按行带缓存。
+
+流程: 灰度 → 深色背景反色 → Otsu 二值化 → 按空白行把画面切成若干文本带，
+每条带按灰度像素哈希缓存，只有内容变化的带才送进进程池，按带自身的 Otsu 阈值放大后识别。
+滚动、光标闪烁等只影响少数带，其余直接命中缓存 (画面别处变化不影响其他带的阈值)。
+
+本模块会被进程池子进程导入（Windows 为 spawn），导入时不能有副作用: 顶层只导入
+eventlog (日志文件在首次写事件时才打开)，config 只在父进程建进程池时导入，不导入 telegram；
+PIL、pytesseract 在用到时才导入，不拖慢 bot 启动。
+"""
+import io
+import time
+import atexit
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from eventlog import log_event
+
+logger = logging.getLogger("bedcode")
+
+_UPSCALE = 2
+_BAND_MAX_H = 96     # 原图中每条文本带的最大高度(px)
+_TESS_CONFIG = "--psm 6"
+_FRAME_CACHE_MAX = 32
+_BAND_CACHE_MAX = 1024
+
+_pool = None
+_frame_cache = OrderedDict()  # 整帧 md5 → 文本
+_band_cache = OrderedDict()   # 文本带灰度像素 md5 → 文本
+_stats = {"frames": 0, "frame_hits": 0, "bands": 0, "band_hits": 0}
+
+
+def available() -> bool:
+    try:
+        import pytesseract  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        import config
+        _pool = ProcessPoolExecutor(max_workers=max(1, config.OCR_WORKERS))
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown)
+
+
+def _cache_put(cache: OrderedDict, key, value, limit: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+def _otsu(hist: list[int]) -> int:
+    total = sum(hist)
+    if not total:
+        return 128
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_b = w_b = 0
+    best_t, best_var = 128, -1.0
+    for t in range(256):
+        w_b += hist[t]
+        if w_b == 0:
+            continue
+        w_f = total - w_b
+        if w_f == 0:
+            break
+        sum_b += t * hist[t]
+        m_b = sum_b / w_b
+        m_f = (sum_all - sum_b) / w_f
+        var = w_b * w_f * (m_b - m_f) ** 2
+        if var > best_var:
+            best_var, best_t = var, t
+    return best_t
+
+
+def preprocess(img: "Image.Image") -> tuple["Image.Image", int]:
+    """返回 (白底黑字的灰度图, 二值化阈值)。"""
+    from PIL import ImageStat
+    gray = img.convert("L")
+    if ImageStat.Stat(gray).mean[0] < 128:
+        # 终端多为深色背景，tesseract 对白底黑字识别更好
+        gray = gray.point(lambda p: 255 - p)
+    return gray, _otsu(gray.histogram())
+
+
+def _binarize(img: "Image.Image", threshold: int) -> "Image.Image":
+    return img.point(lambda p: 255 if p > threshold else 0)
+
+
+def split_bands(bw: "Image.Image") -> list[tuple[int, int]]:
+    """按空白行切分文本带，返回 [(top, bottom)]，每带不超过 _BAND_MAX_H。
+
+    有任一黑色像素的行即为文本行；不能用整行均值，宽屏上 `$ ls` 这样的短行达不到阈值。"""
+    h = bw.height
+    _, rows = bw.point(lambda p: 255 - p).getprojection()  # 反色后文字为非零
+    lines = []
+    start = None
+    for y, ink in enumerate(rows):
+        if ink and start is None:
+            start = y
+        elif not ink and start is not None:
+            lines.append((start, y))
+            start = None
+    if start is not None:
+        lines.append((start, h))
+    bands = []
+    for top, bottom in lines:
+        if bands and bottom - bands[-1][0] <= _BAND_MAX_H:
+            bands[-1] = (bands[-1][0], bottom)
+        else:
+            bands.append((top, bottom))
+    return [(max(0, t - 2), min(h, b + 2)) for t, b in bands]
+
+
+def _ocr_band(size: tuple[int, int], data: bytes) -> str:
+    """进程池任务: 放大 → 按本带的 Otsu 阈值二值化 → tesseract。"""
+    import pytesseract
+    from PIL import Image
+    img = Image.frombytes("L", size, data)
+    threshold = _otsu(img.histogram())
+    img = img.resize((size[0] * _UPSCALE, size[1] * _UPSCALE), Image.LANCZOS)
+    return pytesseract.image_to_string(_binarize(img, threshold), config=_TESS_CONFIG).rstrip()
+
+
+def _plan(img_data: bytes) -> list[tuple[str, tuple, bytes]]:
+    """解码并切带，返回 [(带哈希, 尺寸, 灰度像素)]。CPU 操作，在线程中运行。
+
+    整帧阈值只用来找文本行；识别结果只取决于带本身的灰度像素，缓存键也只哈希它。"""
+    from PIL import Image
+    gray, threshold = preprocess(Image.open(io.BytesIO(img_data)))
+    bw = _binarize(gray, threshold)
+    plan = []
+    for top, bottom in split_bands(bw):
+        band = gray.crop((0, top, gray.width, bottom))
+        data = band.tobytes()
+        plan.append((hashlib.md5(data).hexdigest(), band.size, data))
+    return plan
+
+
+async def ocr_image(img_data: bytes) -> str:
+    """识别截图文字；未安装 pytesseract 时返回空字符串。"""
+    if not available():
+        return ""
+    t0 = time.time()
+    _stats["frames"] += 1
+    frame_key = hashlib.md5(img_data).hexdigest()
+    if frame_key in _frame_cache:
+        _frame_cache.move_to_end(frame_key)
+        _stats["frame_hits"] += 1
+        log_event("ocr", duration=time.time() - t0, size=len(img_data), cached=True)
+        return _frame_cache[frame_key]
+
+    plan = await asyncio.to_thread(_plan, img_data)
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    pending = {}
+    for key, size, data in plan:
+        if key not in _band_cache and key not in pending:
+            pending[key] = loop.run_in_executor(pool, _ocr_band, size, data)
+    if pending:
+        results = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for key, res in zip(pending, results):
+            if isinstance(res, Exception):
+                logger.warning(f"[OCR] 文本带识别失败: {res}")
+                res = ""
+            _cache_put(_band_cache, key, res, _BAND_CACHE_MAX)
+    _stats["bands"] += len(plan)
+    _stats["band_hits"] += len(plan) - len(pending)
+
+    texts = []
+    for key, _, _ in plan:
+        band_text = _band_cache.get(key, "")
+        if band_text:
+            texts.append(band_text)
+    text = "\n".join(texts).strip()
+    _cache_put(_frame_cache, frame_key, text, _FRAME_CACHE_MAX)
+    log_event(
+        "ocr", duration=time.time() - t0, size=len(img_data),
+        bands=len(plan), ocr_bands=len(pending), cached=False,
+    )
+    return text
+
+
+def stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,220 @@
+"""自有 PTY 会话 (Linux/macOS): bot 自己在伪终端里启动 claude，输出流喂给 vscreen.Screen。
+
+读文本、检测提示、截图都只是读内存中的屏幕网格，不需要系统截屏，也不会抢焦点。
+多个会话共用同一个事件循环 (loop.add_reader)，句柄为子进程 pid。
+"""
+import os
+import time
+import shlex
+import codecs
+import signal
+import asyncio
+import logging
+import threading
+import uuid
+import subprocess
+
+import config
+from vscreen import Screen
+
+logger = logging.getLogger("bedcode")
+
+_DEAD_TTL = 600  # 已退出的会话保留多久 (秒)，便于读取最后输出
+
+_sessions = {}  # pid → PtySession
+
+
+def _set_ctty() -> None:
+    # 子进程已由 start_new_session 成为会话首进程，把 pty 设为控制终端，Ctrl+C 等信号才能送达
+    import fcntl
+    import termios
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+def _set_winsize(fd: int, cols: int, rows: int) -> None:
+    import fcntl
+    import struct
+    import termios
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+
+def _size() -> tuple[int, int]:
+    try:
+        cols, rows = (int(v) for v in config.PTY_SIZE.lower().split("x"))
+        return max(20, cols), max(5, rows)
+    except ValueError:
+        return 120, 40
+
+
+class PtySession:
+    def __init__(self, proc: subprocess.Popen, fd: int, cwd: str, cols: int, rows: int, token: str = ""):
+        self.proc = proc
+        self.token = token  # BEDCODE_SESSION 环境变量，hook 事件据此找回会话
+        self.fd = fd
+        self.cwd = cwd
+        self.screen = Screen(cols, rows)
+        self.lock = threading.Lock()  # 屏幕在事件循环里更新，读取多在 to_thread 线程里
+        self.started = time.time()
+        self.exited = None  # 退出时间
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._loop = None
+        self._replies = bytearray()  # 写不进去的终端应答，等 fd 可写时由事件循环补发
+
+    @property
+    def handle(self) -> int:
+        return self.proc.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.exited is None
+
+    def _attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        os.set_blocking(self.fd, False)
+        loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""  # 子进程退出后读 master 得到 EIO
+        if not data:
+            self._on_exit()
+            return
+        with self.lock:
+            self.screen.feed(self._decoder.decode(data))
+            responses, self.screen.responses = self.screen.responses, []
+        if responses:
+            self._reply("".join(responses).encode("utf-8"))
+
+    def _reply(self, data: bytes) -> None:
+        """在事件循环里回写 DSR/DA 应答，不能阻塞: 写不完的部分挂 add_writer 稍后补发。"""
+        if not self._replies:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                logger.warning(f"[PTY] 写入失败 {self.handle}: {e}")
+                return
+            if not data:
+                return
+            self._loop.add_writer(self.fd, self._flush_replies)
+        self._replies += data
+
+    def _flush_replies(self) -> None:
+        try:
+            del self._replies[:os.write(self.fd, self._replies)]
+        except BlockingIOError:
+            return
+        except OSError:
+            self._replies.clear()
+        if not self._replies:
+            self._loop.remove_writer(self.fd)
+
+    def _detach(self) -> None:
+        if self._loop:
+            self._loop.remove_reader(self.fd)
+            self._loop.remove_writer(self.fd)
+        self._replies.clear()
+
+    def _on_exit(self) -> None:
+        self._detach()
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.exited = time.time()
+        code = self.proc.poll()
+        logger.info(f"[PTY] 会话 {self.handle} 已退出" + (f" (code={code})" if code is not None else ""))
+
+    def write(self, data: bytes) -> bool:
+        """写入 pty；master 为非阻塞，缓冲满时稍等重试 (大段粘贴)。"""
+        if not self.alive:
+            return False
+        view = memoryview(data)
+        deadline = time.time() + 5
+        while view:
+            try:
+                n = os.write(self.fd, view)
+                view = view[n:]
+            except BlockingIOError:
+                if time.time() > deadline:
+                    return False
+                time.sleep(0.01)
+            except OSError as e:
+                logger.warning(f"[PTY] 写入失败 {self.handle}: {e}")
+                return False
+        return True
+
+    def title(self) -> str:
+        return self.screen.title
+
+    def text(self, history: int = 2000) -> str:
+        with self.lock:
+            return self.screen.text(history)
+
+    def resize(self, cols: int, rows: int) -> None:
+        with self.lock:
+            self.screen.resize(cols, rows)
+        if self.alive:
+            _set_winsize(self.fd, cols, rows)  # 内核会向前台进程组发 SIGWINCH
+
+    def terminate(self) -> None:
+        if self.alive:
+            try:
+                os.killpg(self.proc.pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+            self._detach()
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.exited = time.time()
+
+
+async def spawn(cwd: str, command: str | None = None) -> PtySession:
+    """在新 pty 中启动命令 (默认 PTY_COMMAND)，注册到当前事件循环。"""
+    now = time.time()
+    for pid, s in list(_sessions.items()):
+        if not s.alive and now - s.exited > _DEAD_TTL:
+            del _sessions[pid]
+    cols, rows = _size()
+    master, slave = os.openpty()
+    try:
+        _set_winsize(master, cols, rows)
+        token = f"pty-{uuid.uuid4().hex[:12]}"
+        env = dict(os.environ, TERM="xterm-256color", COLORTERM="truecolor",
+                   COLUMNS=str(cols), LINES=str(rows), BEDCODE_SESSION=token)
+        proc = subprocess.Popen(
+            shlex.split(command or config.PTY_COMMAND), cwd=cwd, env=env,
+            stdin=slave, stdout=slave, stderr=slave,
+            start_new_session=True, preexec_fn=_set_ctty, close_fds=True,
+        )
+    except Exception:
+        os.close(master)
+        raise
+    finally:
+        os.close(slave)
+    session = PtySession(proc, master, cwd, cols, rows, token)
+    session._attach(asyncio.get_running_loop())
+    _sessions[session.handle] = session
+    logger.info(f"[PTY] 已启动 {session.handle}: {command or config.PTY_COMMAND} @ {cwd}")
+    return session
+
+
+def get(handle: int) -> PtySession | None:
+    return _sessions.get(handle)
+
+
+def sessions(alive_only: bool = True) -> list[PtySession]:
+    return [s for s in _sessions.values() if s.alive or not alive_only]
+
+
+def close_all() -> None:
+    for s in list(_sessions.values()):
+        s.terminate()
+    _sessions.clear()
@@ -0,0 +1,213 @@
+"""Telegram 渲染: 单遍 Markdown → HTML 转换与按行分段。
+
+整段文本只按行扫描一次，分段时在行边界切开；若切点落在代码块内，
+当前段补上闭合标签，下一段重新打开同语言的代码块，保证每段都是
+合法的 HTML，发送时只需一次 API 调用。
+"""
+import re
+import html
+
+_FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+#.-]*)")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET_RE = re.compile(r"^(\s*)[-*+]\s+")
+_TABLE_SEP_RE = re.compile(r"^[-:]+$")
+_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_BOLD_RE = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*")
+_LINK_RE = re.compile(r"\[([^\]\n]+)\]\((https?://[^)\s]+)\)")
+
+
+def split_text(text: str, max_len: int = 3500) -> list[str]:
+    """按行边界分段（线性时间）；代码块被切开时在两侧补齐 ``` 围栏。"""
+    if len(text) <= max_len:
+        return [text]
+    chunks = []
+    cur = []
+    cur_len = 0
+    fence = None  # 当前打开的围栏行，如 "```python"
+    for line in text.split("\n"):
+        m = _FENCE_RE.match(line)
+        pieces = [line[i:i + max_len] for i in range(0, len(line), max_len)] or [""]
+        for piece in pieces:
+            if cur and cur_len + len(piece) + 1 > max_len - (4 if fence else 0):
+                if fence:
+                    cur.append("```")
+                chunks.append("\n".join(cur))
+                cur = [fence] if fence else []
+                cur_len = len(fence) + 1 if fence else 0
+            cur.append(piece)
+            cur_len += len(piece) + 1
+        if m:
+            fence = None if fence else line.strip()
+    if cur and (len(cur) > 1 or cur[0].strip()):
+        chunks.append("\n".join(cur))
+    return chunks or [""]
+
+
+def _tg_len(s: str) -> int:
+    """Telegram 按 UTF-16 码元计长度，emoji 等占 2。"""
+    if s.isascii():
+        return len(s)
+    return len(s.encode("utf-16-le")) // 2
+
+
+def _format_table(rows: list[str]) -> list[str]:
+    cells = [[c.strip() for c in r.strip().strip("|").split("|")] for r in rows]
+    cells = [r for r in cells if not all(_TABLE_SEP_RE.match(c) for c in r)]
+    if not cells:
+        return []
+    ncols = max(len(r) for r in cells)
+    widths = [0] * ncols
+    for r in cells:
+        for i, c in enumerate(r):
+            widths[i] = max(widths[i], len(c))
+    out = []
+    for i, r in enumerate(cells):
+        out.append("  ".join((r[j] if j < len(r) else "").ljust(widths[j]) for j in range(ncols)).rstrip())
+        if i == 0:
+            out.append("  ".join("-" * w for w in widths))
+    return out
+
+
+def _inline(line: str) -> str:
+    """转换一行普通文本中的 `code`、**bold**、[text](url)，其余全部转义。"""
+    out = []
+    pos = 0
+    for m in _INLINE_CODE_RE.finditer(line):
+        out.append(_inline_plain(line[pos:m.start()]))
+        out.append(f"<code>{html.escape(m.group(1))}</code>")
+        pos = m.end()
+    out.append(_inline_plain(line[pos:]))
+    return "".join(out)
+
+
+def _inline_plain(seg: str) -> str:
+    if not seg:
+        return ""
+    seg = html.escape(seg)
+    if "**" in seg:
+        seg = _BOLD_RE.sub(r"<b>\1</b>", seg)
+    if "](" in seg:
+        seg = _LINK_RE.sub(r'<a href="\2">\1</a>', seg)
+    return seg
+
+
+def _render_line(line: str) -> str:
+    m = _HEADING_RE.match(line)
+    if m:
+        return f"<b>{_inline(m.group(2))}</b>"
+    m = _BULLET_RE.match(line)
+    if m:
+        return f"{m.group(1)}• {_inline(line[m.end():])}"
+    return _inline(line)
+
+
+class _ChunkBuilder:
+    def __init__(self, max_len: int):
+        self.max_len = max_len
+        self.chunks = []
+        self.parts = []
+        self.size = 0      # 当前段可见字符数（Telegram 按解析后的文本计长度）
+        self.open_tag = ""  # 当前段中尚未闭合的 <pre> 开标签
+
+    def add(self, rendered: str, visible: int) -> None:
+        if self.parts and self.size + visible + 1 > self.max_len:
+            self.flush()
+        self.parts.append(rendered)
+        self.size += visible + 1
+
+    def open_pre(self, tag: str) -> None:
+        self.open_tag = tag
+        self.parts.append(tag)
+
+    def close_pre(self) -> None:
+        if not self.open_tag:
+            return
+        if self.parts and self.parts[-1] == self.open_tag:
+            self.parts.pop()  # 空代码块直接丢弃，Telegram 不接受空实体
+        else:
+            if self.parts[-1].endswith("\n"):
+                self.parts[-1] = self.parts[-1][:-1]
+            self.parts.append("</code></pre>" if "<code" in self.open_tag else "</pre>")
+        self.open_tag = ""
+
+    def flush(self) -> None:
+        tag = self.open_tag
+        if tag:
+            self.close_pre()
+        body = "".join(self.parts).strip("\n")
+        if body:
+            self.chunks.append(body)
+        self.parts = []
+        self.size = 0
+        if tag:
+            self.open_pre(tag)
+
+
+def render_html_chunks(text: str, max_len: int = 3500) -> list[str]:
+    """把 Markdown 文本转换为 Telegram HTML 并分段，每段可直接 parse_mode=HTML 发送。"""
+    b = _ChunkBuilder(max_len)
+    in_fence = False
+    table = []
+
+    def _flush_table():
+        if not table:
+            return
+        b.open_pre("<pre>")
+        for row in _format_table(table):
+            b.add(html.escape(row) + "\n", _tg_len(row))
+        b.close_pre()
+        b.parts.append("\n")
+        table.clear()
+
+    for line in text.split("\n"):
+        fm = _FENCE_RE.match(line)
+        if fm:
+            _flush_table()
+            if in_fence:
+                b.close_pre()
+                b.parts.append("\n")
+            else:
+                lang = fm.group(2)
+                b.open_pre(f'<pre><code class="language-{html.escape(lang)}">' if lang else "<pre><code>")
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            for i in range(0, max(len(line), 1), max_len):
+                piece = line[i:i + max_len]
+                b.add(html.escape(piece) + "\n", _tg_len(piece))
+            continue
+        if line.lstrip().startswith("|") and "|" in line.strip()[1:]:
+            table.append(line)
+            continue
+        _flush_table()
+        if len(line) > max_len:
+            for i in range(0, len(line), max_len):
+                piece = line[i:i + max_len]
+                b.add(html.escape(piece) + "\n", _tg_len(piece))
+            continue
+        b.add(_render_line(line) + "\n", _tg_len(line))
+    _flush_table()
+    b.close_pre()
+    b.flush()
+    return b.chunks or [html.escape(text.strip()) or "(空输出)"]
+
+
+def render_pre_chunks(text: str, lang: str = "", max_len: int = 3500) -> list[str]:
+    """原样文本 (如 git diff) 按行分段，每段转义后包进 <pre>；不经过 Markdown 解析，
+    内容里的 ``` 行不会提前结束代码块。"""
+    tag = f'<pre><code class="language-{html.escape(lang)}">' if lang else "<pre><code>"
+    chunks = []
+    cur = []
+    cur_len = 0
+    for line in text.split("\n"):
+        for i in range(0, max(len(line), 1), max_len):
+            piece = line[i:i + max_len]
+            n = _tg_len(piece) + 1
+            if cur and cur_len + n > max_len:
+                chunks.append(cur)
+                cur, cur_len = [], 0
+            cur.append(html.escape(piece))
+            cur_len += n
+    if cur:
+        chunks.append(cur)
+    return [tag + "\n".join(c) + "</code></pre>" for c in chunks]
@@ -0,0 +1,661 @@
+"""Shell 执行: 流式输出、实时编辑消息、进程树终止、常驻会话、后台任务。"""
+import os
+import html
+import time
+import uuid
+import codecs
+import shlex
+import signal
+import asyncio
+import logging
+import subprocess
+from collections import deque
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+import config
+from config import state
+from toolpaths import git_bash_async
+from utils import SHELL_DIR, send_output_file, _fmt_size
+from eventlog import log_event
+
+logger = logging.getLogger("bedcode")
+
+_EDIT_INTERVAL = 2.0   # 实时消息最短编辑间隔（秒），避免触发 TG 限流
+_TAIL_LINES = 30       # 实时窗口显示的尾部行数
+_TAIL_CHARS = 3000     # 实时窗口最大字符数
+_READ_SIZE = 8192
+
+_runs = {}  # run_id → {"proc", "cmd", "cancelled"}
+_run_seq = 0
+
+
+class _OutputTail:
+    """增量维护输出尾部窗口，完整输出只写入磁盘。"""
+
+    def __init__(self, max_lines: int = _TAIL_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.partial = ""
+        self.total_chars = 0
+        self.total_lines = 0
+        self.version = 0
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self.total_chars += len(text)
+        self.version += 1
+        parts = (self.partial + text).split("\n")
+        self.partial = parts.pop()
+        self.total_lines += len(parts)
+        self.lines.extend(parts)
+
+    def render(self) -> str:
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        text = "\n".join(lines).replace("\r", "")
+        if len(text) > _TAIL_CHARS:
+            text = "…" + text[-_TAIL_CHARS:]
+        return text
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_lines > self.lines.maxlen or self.total_chars > _TAIL_CHARS
+
+
+def _spawn_kwargs() -> dict:
+    """让子进程成为独立进程组，便于整棵进程树一起终止。"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _kill_tree(pid: int) -> None:
+    if os.name == "nt":
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(pid)],
+            capture_output=True, creationflags=0x08000000,
+        )
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def kill_process_tree(proc) -> None:
+    if proc.returncode is None:
+        await asyncio.to_thread(_kill_tree, proc.pid)
+
+
+class _Sink:
+    """把原始字节写入磁盘 spool，同时解码后喂给尾部窗口。"""
+
+    def __init__(self, tail: _OutputTail, spool):
+        self.tail = tail
+        self.spool = spool
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def __call__(self, data: bytes) -> None:
+        self.spool.write(data)
+        self.tail.feed(self.decoder.decode(data))
+
+    def close(self) -> None:
+        self.tail.feed(self.decoder.decode(b"", final=True))
+
+
+async def _pump(stream, sink: _Sink) -> None:
+    while True:
+        data = await stream.read(_READ_SIZE)
+        if not data:
+            sink.close()
+            break
+        sink(data)
+
+
+# ── 常驻 Shell 会话 ───────────────────────────────────────────────
+_SENTINEL = "__BEDCODE_DONE_"
+_INIT_CMD = "export PS1='' PS2='' PROMPT_COMMAND=''; set +H\n"
+
+_sessions = {}  # chat_id → ShellSession
+_reaper_task = None
+
+
+class ShellSessionClosed(Exception):
+    pass
+
+
+class ShellSession:
+    """每个 chat 一个常驻 bash：POSIX 下走 pty，Windows 下走管道。
+
+    每条命令后追加一行 printf 哨兵，读到哨兵即得到退出码，因此单条命令的开销
+    只有一次写入和若干次读取，cd / export / venv 激活在命令之间保持。
+    """
+
+    def __init__(self, chat_id: int, cwd: str):
+        self.chat_id = chat_id
+        self.cwd = cwd
+        self.proc = None
+        self.master_fd = None
+        self.last_used = time.time()
+        self.lock = asyncio.Lock()
+        self._chunks = asyncio.Queue()
+        self._reader_task = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self) -> None:
+        env = os.environ.copy()
+        env.update({"PS1": "", "PS2": "", "TERM": "dumb"})
+        if os.name != "nt":
+            import pty
+            import termios
+            master, slave = pty.openpty()
+            attrs = termios.tcgetattr(slave)
+            attrs[1] &= ~termios.ONLCR
+            attrs[3] &= ~termios.ECHO
+            attrs[3] |= termios.NOFLSH  # ^C 时不要丢弃已写入的哨兵行
+            termios.tcsetattr(slave, termios.TCSANOW, attrs)
+            try:
+                self.proc = await asyncio.create_subprocess_exec(
+                    await git_bash_async(), "--noprofile", "--norc",
+                    stdin=slave, stdout=slave, stderr=slave,
+                    cwd=self.cwd, env=env, start_new_session=True,
+                    preexec_fn=_set_controlling_tty,
+                )
+            finally:
+                os.close(slave)
+            self.master_fd = master
+            asyncio.get_running_loop().add_reader(master, self._on_readable)
+        else:
+            self.proc = await asyncio.create_subprocess_exec(
+                await git_bash_async(), "--noprofile", "--norc", "-s",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.cwd, env=env, **_spawn_kwargs(),
+            )
+            self._reader_task = asyncio.create_task(self._pipe_reader())
+        await self._write(_INIT_CMD.encode())
+        logger.info(f"[Shell] 会话启动 chat={self.chat_id} PID={self.proc.pid} cwd={self.cwd}")
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self.master_fd, 65536)
+        except OSError:
+            data = b""
+        if not data:
+            asyncio.get_running_loop().remove_reader(self.master_fd)
+            self._chunks.put_nowait(None)
+            return
+        self._chunks.put_nowait(data)
+
+    async def _pipe_reader(self) -> None:
+        while True:
+            data = await self.proc.stdout.read(_READ_SIZE)
+            if not data:
+                self._chunks.put_nowait(None)
+                return
+            self._chunks.put_nowait(data)
+
+    async def _write(self, data: bytes) -> None:
+        if self.master_fd is not None:
+            os.write(self.master_fd, data)
+        else:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+
+    async def run(self, cmd: str, sink) -> int:
+        """执行一条命令，输出逐块交给 sink，返回退出码。"""
+        async with self.lock:
+            if not self.alive:
+                raise ShellSessionClosed()
+            self.last_used = time.time()
+            while not self._chunks.empty():
+                if self._chunks.get_nowait() is None:
+                    raise ShellSessionClosed()
+            token = uuid.uuid4().hex[:12]
+            marker = f"\n{_SENTINEL}{token}:".encode()
+            # stdin 重定向到 /dev/null，避免命令吞掉后面的哨兵行
+            await self._write(
+                f"{{ {cmd}\n}} </dev/null\nprintf '\\n{_SENTINEL}{token}:%s\\n' \"$?\"\n".encode()
+            )
+            buf = b""
+            while True:
+                chunk = await self._chunks.get()
+                if chunk is None:
+                    if buf:
+                        sink(buf)
+                    raise ShellSessionClosed()
+                buf += chunk
+                idx = buf.find(marker)
+                if idx >= 0:
+                    end = buf.find(b"\n", idx + len(marker))
+                    if end < 0:
+                        continue
+                    sink(buf[:idx])
+                    self.last_used = time.time()
+                    try:
+                        return int(buf[idx + len(marker):end])
+                    except ValueError:
+                        return -1
+                # 保留可能是半截哨兵的尾部
+                if len(buf) > len(marker):
+                    sink(buf[:-len(marker)])
+                    buf = buf[-len(marker):]
+
+    async def interrupt(self) -> bool:
+        """pty 下发送 ^C 给前台任务；管道模式无法中断，返回 False。"""
+        if self.master_fd is None or not self.alive:
+            return False
+        os.write(self.master_fd, b"\x03")
+        return True
+
+    async def close(self) -> None:
+        if self.proc and self.proc.returncode is None:
+            await kill_process_tree(self.proc)
+        if self.master_fd is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self.master_fd)
+            except Exception:
+                pass
+            try:
+                os.close(self.master_fd)
+            except OSError:
+                pass
+            self.master_fd = None
+        if self._reader_task and not self._reader_task.done():
+            self._reader_task.cancel()
+        self._chunks.put_nowait(None)
+        logger.info(f"[Shell] 会话关闭 chat={self.chat_id}")
+
+
+def _set_controlling_tty() -> None:
+    import fcntl
+    import termios
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+async def get_session(chat_id: int) -> ShellSession:
+    global _reaper_task
+    session = _sessions.get(chat_id)
+    if session and session.alive:
+        return session
+    session = ShellSession(chat_id, state["cwd"])
+    await session.start()
+    _sessions[chat_id] = session
+    if _reaper_task is None or _reaper_task.done():
+        _reaper_task = asyncio.create_task(_reap_idle_sessions())
+    return session
+
+
+async def reset_session(chat_id: int) -> bool:
+    session = _sessions.pop(chat_id, None)
+    if not session:
+        return False
+    await session.close()
+    return True
+
+
+async def change_dir(path: str) -> None:
+    """/cd 之后让常驻会话也切换目录；正在执行命令的会话排在该命令之后切换。"""
+    cmd = f"cd -- {shlex.quote(path)}"
+    for chat_id, session in list(_sessions.items()):
+        if not session.alive:
+            continue
+        session.cwd = path
+        if session.lock.locked():
+            asyncio.create_task(_cd_later(session, cmd))
+            continue
+        try:
+            await session.run(cmd, lambda data: None)
+        except ShellSessionClosed:
+            await reset_session(chat_id)
+
+
+async def _cd_later(session: ShellSession, cmd: str) -> None:
+    try:
+        await session.run(cmd, lambda data: None)
+    except ShellSessionClosed:
+        pass
+
+
+async def _reap_idle_sessions() -> None:
+    """关闭长时间未使用的常驻会话。"""
+    while _sessions:
+        await asyncio.sleep(60)
+        now = time.time()
+        for chat_id, session in list(_sessions.items()):
+            if session.lock.locked():
+                continue
+            if not session.alive or now - session.last_used > config.SHELL_IDLE_TIMEOUT:
+                logger.info(f"[Shell] 会话空闲超时，回收 chat={chat_id}")
+                await reset_session(chat_id)
+
+
+def session_info(chat_id: int) -> dict | None:
+    session = _sessions.get(chat_id)
+    if not session or not session.alive:
+        return None
+    return {"pid": session.proc.pid, "cwd": session.cwd, "idle": int(time.time() - session.last_used)}
+
+
+def _cancel_markup(run_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⏹ 取消", callback_data=f"shell:kill:{run_id}")]])
+
+
+def _live_text(cmd: str, header: str, tail: _OutputTail) -> str:
+    body = tail.render()
+    text = f"{header}\n<code>{html.escape(cmd[:80])}</code>"
+    if body.strip():
+        text += f"\n<pre>{html.escape(body)}</pre>"
+    return text
+
+
+async def _abort(run: dict) -> None:
+    """终止一次执行：独立进程直接杀进程树；常驻会话先发 ^C，无响应再重置会话。"""
+    session = run.get("session")
+    if session is None:
+        if run.get("proc"):
+            await kill_process_tree(run["proc"])
+        return
+    if await session.interrupt():
+        try:
+            await asyncio.wait_for(asyncio.shield(run["work"]), timeout=3)
+            return
+        except Exception:
+            pass
+    await reset_session(session.chat_id)
+
+
+async def _run(run_id: int, cmd: str, chat_id: int, msg, context: ContextTypes.DEFAULT_TYPE) -> None:
+    run = _runs[run_id]
+    timeout = config.SHELL_TIMEOUT
+    tail = _OutputTail()
+    spool_path = os.path.join(SHELL_DIR, f"shell_{int(time.time())}_{run_id}.log")
+    start = time.time()
+    status = "error"
+    rc = None
+    try:
+        with open(spool_path, "wb") as spool:
+            if state.get("shell_persistent"):
+                session = await get_session(chat_id)
+                run["session"] = session
+                sink = _Sink(tail, spool)
+                run["work"] = asyncio.ensure_future(session.run(cmd, sink))
+            else:
+                proc = await asyncio.create_subprocess_exec(
+                    await git_bash_async(), "-c", cmd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=state["cwd"],
+                    **_spawn_kwargs(),
+                )
+                run["proc"] = proc
+                run["work"] = asyncio.gather(
+                    _pump(proc.stdout, _Sink(tail, spool)),
+                    _pump(proc.stderr, _Sink(tail, spool)),
+                )
+                logger.info(f"[Shell] #{run_id} 启动 PID={proc.pid}: {cmd[:80]}")
+            work = run["work"]
+            shown_version = 0
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(work), timeout=_EDIT_INTERVAL)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                except ShellSessionClosed:
+                    break
+                elapsed = time.time() - start
+                if elapsed > timeout:
+                    status = "timeout"
+                    await _abort(run)
+                    break
+                if tail.version != shown_version:
+                    shown_version = tail.version
+                    header = f"⏳ 运行中 {int(elapsed)}s · {_fmt_size(tail.total_chars)}"
+                    try:
+                        await msg.edit_text(
+                            _live_text(cmd, header, tail), parse_mode="HTML",
+                            reply_markup=_cancel_markup(run_id),
+                        )
+                    except Exception:
+                        pass
+            if run.get("session"):
+                try:
+                    rc = await work
+                except ShellSessionClosed:
+                    rc = None
+            else:
+                await work
+                rc = await run["proc"].wait()
+        if run["cancelled"]:
+            status = "cancelled"
+        elif status != "timeout":
+            status = "ok" if rc == 0 else "failed"
+
+        elapsed = int(time.time() - start)
+        header = {
+            "ok": f"✅ 完成 · 退出码 0 · {elapsed}s",
+            "failed": f"❌ 退出码 {rc} · {elapsed}s" if rc is not None else f"❌ 会话已退出 · {elapsed}s",
+            "cancelled": f"⏹ 已取消 · {elapsed}s",
+            "timeout": f"⏰ 超时 ({timeout}s)，已终止",
+        }[status]
+        if not tail.total_chars and status in ("ok", "failed"):
+            tail.feed(f"(完成，退出码: {rc})")
+        try:
+            await msg.edit_text(_live_text(cmd, header, tail), parse_mode="HTML")
+        except Exception:
+            pass
+        if tail.truncated:
+            await send_output_file(chat_id, spool_path, f"shell_{run_id}", context, caption="完整输出")
+    except Exception as e:
+        logger.exception(f"Shell 命令执行失败: {e}")
+        await _abort(run)
+        try:
+            await msg.edit_text("❌ 执行出错，详见日志")
+        except Exception:
+            pass
+    finally:
+        _runs.pop(run_id, None)
+        try:
+            os.remove(spool_path)
+        except OSError:
+            pass
+        logger.info(f"[Shell] #{run_id} 结束: {status}")
+        log_event(
+            "shell.run", chat_id=chat_id, duration=time.time() - start, size=tail.total_chars,
+            status=status, rc=rc, session=bool(run.get("session")),
+        )
+
+
+async def run_streaming(chat_id: int, cmd: str, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """启动 Shell 命令，输出实时编辑到一条消息中；命令在后台任务中运行。"""
+    global _run_seq
+    _run_seq += 1
+    run_id = _run_seq
+    msg = await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"执行: <code>{html.escape(cmd[:80])}</code>",
+        parse_mode="HTML",
+        reply_markup=_cancel_markup(run_id),
+    )
+    _runs[run_id] = {"proc": None, "session": None, "work": None, "cmd": cmd, "cancelled": False}
+    _runs[run_id]["task"] = asyncio.create_task(_run(run_id, cmd, chat_id, msg, context))
+
+
+async def cancel_run(run_id: int) -> bool:
+    run = _runs.get(run_id)
+    if not run or not run["work"]:
+        return False
+    run["cancelled"] = True
+    await _abort(run)
+    return True
+
+
+def kill_all_runs() -> None:
+    for run in list(_runs.values()) + list(_jobs.values()):
+        proc = run.get("proc")
+        if proc and proc.returncode is None:
+            _kill_tree(proc.pid)
+    for session in list(_sessions.values()):
+        if session.alive:
+            _kill_tree(session.proc.pid)
+
+
+# ── 后台任务 ─────────────────────────────────────────────────────
+_jobs = {}  # job_id → {"id", "cmd", "chat_id", "status", "rc", "queued_at", "start", "end", "log_path", "proc", "bot"}
+_job_seq = 0
+_job_waiting = deque()
+_MAX_FINISHED_JOBS = 20
+
+
+def _job_duration(job: dict) -> int:
+    if not job["start"]:
+        return 0
+    return int((job["end"] or time.time()) - job["start"])
+
+
+def _running_jobs() -> int:
+    return sum(1 for j in _jobs.values() if j["status"] == "running")
+
+
+def _start_waiting_jobs() -> None:
+    while _job_waiting and _running_jobs() < max(1, config.SHELL_MAX_JOBS):
+        job_id = _job_waiting.popleft()
+        job = _jobs.get(job_id)
+        if job and job["status"] == "queued":
+            job["status"] = "running"
+            job["task"] = asyncio.create_task(_run_job(job))
+
+
+def _prune_jobs() -> None:
+    finished = [j for j in _jobs.values() if j["status"] not in ("queued", "running")]
+    for job in finished[:-_MAX_FINISHED_JOBS]:
+        _jobs.pop(job["id"], None)
+        try:
+            os.remove(job["log_path"])
+        except OSError:
+            pass
+
+
+def _job_markup(job_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("📜 尾部", callback_data=f"job:tail:{job_id}"),
+        InlineKeyboardButton("📄 完整输出", callback_data=f"job:get:{job_id}"),
+    ]])
+
+
+async def _run_job(job: dict) -> None:
+    job["start"] = time.time()
+    try:
+        with open(job["log_path"], "wb") as spool:
+            proc = await asyncio.create_subprocess_exec(
+                await git_bash_async(), "-c", job["cmd"],
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=spool,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=job["cwd"],
+                **_spawn_kwargs(),
+            )
+            job["proc"] = proc
+            logger.info(f"[Job] #{job['id']} 启动 PID={proc.pid}: {job['cmd'][:80]}")
+            job["rc"] = await proc.wait()
+        if job["status"] != "killed":
+            job["status"] = "done" if job["rc"] == 0 else "failed"
+    except Exception as e:
+        logger.exception(f"[Job] #{job['id']} 执行失败: {e}")
+        job["status"] = "failed"
+    finally:
+        job["end"] = time.time()
+        job["proc"] = None
+        logger.info(f"[Job] #{job['id']} 结束: {job['status']} rc={job['rc']} {_job_duration(job)}s")
+        _start_waiting_jobs()
+        _prune_jobs()
+
+    icon = {"done": "✅", "failed": "❌", "killed": "⏹"}.get(job["status"], "❔")
+    size = os.path.getsize(job["log_path"]) if os.path.exists(job["log_path"]) else 0
+    try:
+        await job["bot"].send_message(
+            chat_id=job["chat_id"],
+            text=(
+                f"{icon} 后台任务 #{job['id']} 结束\n"
+                f"<code>{html.escape(job['cmd'][:80])}</code>\n"
+                f"退出码: {job['rc']} · 耗时 {_job_duration(job)}s · 输出 {_fmt_size(size)}"
+            ),
+            parse_mode="HTML",
+            reply_markup=_job_markup(job["id"]),
+        )
+    except Exception as e:
+        logger.warning(f"[Job] 完成通知发送失败: {e}")
+
+
+def submit_job(chat_id: int, cmd: str, context: ContextTypes.DEFAULT_TYPE) -> dict:
+    """登记后台任务；并发数未满则立即启动，否则进入等待队列。"""
+    global _job_seq
+    _job_seq += 1
+    job = {
+        "id": _job_seq, "cmd": cmd, "chat_id": chat_id, "cwd": state["cwd"],
+        "status": "queued", "rc": None, "queued_at": time.time(), "start": None, "end": None,
+        "log_path": os.path.join(SHELL_DIR, f"job_{_job_seq}_{int(time.time())}.log"),
+        "proc": None, "bot": context.bot,
+    }
+    _jobs[job["id"]] = job
+    _job_waiting.append(job["id"])
+    _start_waiting_jobs()
+    return job
+
+
+def get_job(job_id: int) -> dict | None:
+    return _jobs.get(job_id)
+
+
+def list_jobs() -> list[dict]:
+    return sorted(_jobs.values(), key=lambda j: j["id"])
+
+
+async def kill_job(job_id: int) -> bool:
+    job = _jobs.get(job_id)
+    if not job or job["status"] not in ("queued", "running"):
+        return False
+    if job["status"] == "queued":
+        job["status"] = "killed"
+        job["end"] = time.time()
+        try:
+            _job_waiting.remove(job_id)
+        except ValueError:
+            pass
+        return True
+    job["status"] = "killed"
+    if job["proc"]:
+        await kill_process_tree(job["proc"])
+    return True
+
+
+def _read_tail(path: str, max_lines: int, max_bytes: int = 64 * 1024) -> str:
+    """从文件末尾读取最多 max_bytes 字节并截取最后 max_lines 行。"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read()
+    except OSError:
+        return ""
+    lines = data.decode("utf-8", errors="replace").replace("\r", "").rstrip("\n").split("\n")
+    if size > max_bytes:
+        lines = lines[1:]
+    return "\n".join(lines[-max_lines:])
+
+
+async def job_tail(job_id: int, max_lines: int = 30) -> str | None:
+    job = _jobs.get(job_id)
+    if not job:
+        return None
+    return await asyncio.to_thread(_read_tail, job["log_path"], max_lines)
@@ -0,0 +1,755 @@
+"""模拟 Claude 会话: 脚本化的窗口标题 (spinner / ✳)、终端文本、交互提示和 transcript 写入。
+
+配合虚拟时钟，可以在 Linux 上几秒内确定性地跑完监控、队列、autoyes 流程；
+也可以一次生成几百个窗口，给被动监控做压测。TERM_BACKEND=fake 时 terminal.FakeBackend
+从这里取会话 (/new 新建)，bot 不依赖任何真实终端即可运行。
+
+脚本: 每条消息消耗 SimSession.turns 中的一轮，一轮是若干步骤:
+  ("think", 秒)       标题显示 spinner，持续若干秒
+  ("tool", (名称, 秒, 参数)) 运行一个工具若干秒 (同样显示 spinner)
+  ("say", 文本)       追加到终端
+  ("prompt", 文本)    显示交互提示，等待按键 (数字/y/n/上下选择，enter 确认，esc 拒绝)
+  ("transcript", 文本) 写一条 assistant 记录到 ~/.claude/projects/<项目>/<会话>.jsonl
+没有预设脚本时按 think_time 思考后回显消息。
+
+SimHub.enable_hooks(sink) 后会话像配置了 notify_hook 的 Claude Code 一样发出 hook 事件
+(UserPromptSubmit / PreToolUse / PostToolUse / Notification / Stop，中断时不发 Stop)，
+并按步骤结束时间自行推进，不依赖监控轮询标题。
+
+用法:
+  python sim_claude.py flows
+  python sim_claude.py load --windows 300 --minutes 30 [--hooks]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import contextlib
+from collections import Counter, deque
+
+_SPINNER = "⠂⠐"
+_BOX = "─" * 60
+
+
+# ── 虚拟时钟 ─────────────────────────────────────────────────────
+class VirtualClock:
+    """事件循环没有可运行的任务时直接跳到下一个定时器；patch_time() 期间 time.time() 也走虚拟时间。"""
+
+    def __init__(self, start: float | None = None):
+        self.start = time.time() if start is None else start
+        self.elapsed = 0.0  # 事件循环用这个小数值，避免大时间戳的浮点精度让定时器到点却不触发
+
+    @property
+    def now(self) -> float:
+        return self.start + self.elapsed
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def advance(self, seconds: float) -> None:
+        self.elapsed += seconds
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        return _VirtualLoop(self)
+
+    @contextlib.contextmanager
+    def patch_time(self):
+        real = time.time
+        time.time = self.time
+        try:
+            yield self
+        finally:
+            time.time = real
+
+
+class _VirtualLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._clock = clock
+        self._in_executor = 0
+        select = self._selector.select
+
+        def _select(timeout=None):
+            if self._in_executor or timeout == 0:
+                # to_thread 任务未返回时按真实时间等它 (完成时会唤醒自管道)，不推进虚拟时间
+                return select(0 if timeout == 0 else 0.05)
+            events = select(0)
+            if events or timeout is None:
+                return events or select(None)
+            clock.advance(timeout)
+            return []
+
+        self._selector.select = _select
+
+    def time(self) -> float:
+        return self._clock.elapsed
+
+    def run_in_executor(self, executor, func, *args):
+        fut = super().run_in_executor(executor, func, *args)
+        self._in_executor += 1
+        fut.add_done_callback(self._executor_done)
+        return fut
+
+    def _executor_done(self, fut) -> None:
+        self._in_executor -= 1
+
+
+# ── 模拟会话 ─────────────────────────────────────────────────────
+class SimSession:
+    cols, rows = 120, 40
+
+    def __init__(self, hub: "SimHub", handle: int, cwd: str, project: str):
+        self.hub = hub
+        self.handle = handle
+        self.cwd = cwd
+        self.project = project
+        self.session_id = f"sim-{handle}"
+        self.alive = True
+        self.turns = deque()   # 预设脚本，每收到一条消息取一轮
+        self.inputs = []       # 收到的消息
+        self.keys = []         # 收到的按键
+        self.finished = []     # 每轮结束的 (虚拟) 时间
+        self.lines = ["✻ Welcome to Claude Code!", "", f"  cwd: {cwd}", ""]
+        self._steps = deque()
+        self._step_start = 0.0
+        self._turn_start = None
+        self._pending = deque()  # 忙碌时收到的消息，本轮结束后依次处理
+        self._prompt = None      # [提示文本, 选中项]
+        self._tool_started = False
+        self._tick_at = None     # 已安排的下一次推进时间 (hook 模式)
+        self._lock = threading.RLock()
+
+    @property
+    def busy(self) -> bool:
+        with self._lock:
+            self._advance()
+            return self._turn_start is not None
+
+    def _hook(self, name: str, at: float, **fields) -> None:
+        if self.hub.hook_sink:
+            self.hub.emit_hook(dict(
+                fields, session_id=self.session_id, hook_event_name=name, cwd=self.cwd,
+                transcript_path=self.hub.transcript_path(self), _ts=at, _origin={"session": self.session_id},
+            ))
+
+    def _start(self, text: str, at: float) -> None:
+        self.lines.append(f"> {text}")
+        steps = self.turns.popleft() if self.turns else [
+            ("think", self.hub.think_time), ("say", f"● 已处理: {text}"), ("transcript", f"已处理: {text}"),
+        ]
+        self._steps = deque(steps)
+        self._step_start = self._turn_start = at
+        self._tool_started = False
+        self._hook("UserPromptSubmit", at, prompt=text)
+
+    def _finish(self, at: float, stop: bool = True) -> None:
+        self._steps.clear()
+        self._prompt = None
+        self._turn_start = None
+        self.finished.append(at)
+        if stop:
+            self._hook("Stop", at, stop_hook_active=False)
+        if self._pending:
+            self._start(self._pending.popleft(), at)
+
+    def _advance(self) -> None:
+        """按当前时间执行到期的步骤。"""
+        now = self.hub.now()
+        while self._turn_start is not None:
+            while self._steps:
+                kind, arg = self._steps[0]
+                if kind == "think":
+                    end = self._step_start + arg
+                    if now < end:
+                        return self._schedule(end)
+                    self._step_start = end
+                elif kind == "tool":
+                    name, secs, tool_input = arg
+                    tool_id = f"{self.session_id}-{len(self.lines)}"
+                    if not self._tool_started:
+                        self._tool_started = True
+                        self.lines.append(f"● {name}({next(iter(tool_input.values()), '')})")
+                        self._hook("PreToolUse", self._step_start, tool_name=name, tool_input=tool_input,
+                                   tool_use_id=tool_id)
+                    end = self._step_start + secs
+                    if now < end:
+                        return self._schedule(end)
+                    self._tool_started = False
+                    self._hook("PostToolUse", end, tool_name=name, tool_input=tool_input,
+                               tool_use_id=tool_id, tool_response={"success": True})
+                    self._step_start = end
+                elif kind == "prompt":
+                    if self._prompt is None:
+                        self._prompt = [arg, 1]
+                        tool = arg.split(" ", 1)[0]
+                        self._hook("Notification", self._step_start, notification_type="permission_prompt",
+                                   message=f"Claude needs your permission to use {tool}")
+                    return
+                elif kind == "say":
+                    self.lines.extend(arg.splitlines())
+                elif kind == "transcript":
+                    self.hub.write_transcript(self, arg)
+                self._steps.popleft()
+            self._finish(self._step_start)
+
+    def _schedule(self, at: float) -> None:
+        """hook 模式下在步骤结束时自行推进，像真实 Claude 一样不等有人看它才发事件。"""
+        if self.hub.hook_sink and self._tick_at != at:
+            self._tick_at = at
+            self.hub.call_at(at, self._tick)
+
+    def _tick(self) -> None:
+        with self._lock:
+            self._tick_at = None
+            if self.alive:
+                self._advance()
+
+    def title(self) -> str:
+        with self._lock:
+            self.hub.calls["title"] += 1
+            if not self.alive:
+                return ""
+            self._advance()
+            if self._turn_start is not None:
+                return f"{_SPINNER[int(self.hub.now()) % len(_SPINNER)]} {self.project}"
+            return f"✳ {self.project}"
+
+    def text(self) -> str:
+        with self._lock:
+            self.hub.calls["text"] += 1
+            self._advance()
+            out = self.lines[-200:]
+            if self._prompt:
+                # 权限对话框取代输入框，选项在最后几行
+                out = out + ["╭" + _BOX] + [f"│ {l}" for l in self._prompt[0].splitlines()] + ["╰" + _BOX]
+                return "\n".join(out)
+            if self._turn_start is not None:
+                elapsed = int(self.hub.now() - self._turn_start)
+                out = out + ["", f"✻ Thinking… ({elapsed}s · esc to interrupt)"]
+            return "\n".join(out + ["╭" + _BOX, "│ > ", "╰" + _BOX])
+
+    def send_text(self, text: str) -> bool:
+        with self._lock:
+            self.hub.calls["send_text"] += 1
+            if not self.alive:
+                return False
+            self._advance()
+            self.inputs.append(text)
+            if self._turn_start is None:
+                self._start(text, self.hub.now())
+                self._advance()
+            else:
+                self._pending.append(text)
+            return True
+
+    def send_keys(self, parts: list[str]) -> bool:
+        with self._lock:
+            self.hub.calls["send_keys"] += 1
+            if not self.alive:
+                return False
+            self._advance()
+            self.keys.extend(parts)
+            for key in parts:
+                if not self._prompt:
+                    continue
+                options = len(re.findall(r"^\s*(?:❯\s*)?\d+\.", self._prompt[0], re.M)) or 2
+                if key.isdigit():
+                    self._prompt[1] = int(key)
+                elif key in ("y", "n"):
+                    self._prompt[1] = 1 if key == "y" else 2
+                elif key == "up":
+                    self._prompt[1] = max(1, self._prompt[1] - 1)
+                elif key == "down":
+                    self._prompt[1] = min(options, self._prompt[1] + 1)
+                elif key in ("enter", "esc"):
+                    now = self.hub.now()
+                    approved = key == "enter" and self._prompt[1] == 1
+                    self._prompt = None
+                    if approved:
+                        self.lines.append("  ⎿  Approved")
+                        self._steps.popleft()
+                        self._step_start = now
+                    else:
+                        self.lines.append("  ⎿  User rejected")
+                        self._finish(now, stop=False)
+            self._advance()
+            return True
+
+    def interrupt(self) -> bool:
+        with self._lock:
+            self.hub.calls["interrupt"] += 1
+            self._advance()
+            if self._turn_start is not None:
+                self.lines.append("  ⎿  Interrupted by user")
+                self._pending.clear()
+                self._finish(self.hub.now(), stop=False)
+            return self.alive
+
+
+class SimHub:
+    """模拟会话的集合。home 不为空时 transcript 写到 home/.claude/projects 下。"""
+
+    def __init__(self, now=None, home: str | None = None, think_time: float = 8.0, render: bool = True):
+        self.now = now or time.time
+        self.home = home
+        self.think_time = think_time
+        self.render = render  # False 时 capture 返回 None，压测时省掉截图渲染
+        self.sessions = {}
+        self.calls = Counter()  # 各后端操作的调用次数
+        self.hook_sink = None   # hook 事件的接收函数，在事件循环线程中调用
+        self._loop = None
+        self._next = 1001
+
+    def enable_hooks(self, sink, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """之后的会话发出 hook 事件；需要在事件循环中调用 (或传入 loop)。"""
+        self._loop = loop or asyncio.get_running_loop()
+        self.hook_sink = sink
+
+    def emit_hook(self, event: dict) -> None:
+        self.calls["hook"] += 1
+        self._loop.call_soon_threadsafe(self.hook_sink, event)
+
+    def call_at(self, at: float, callback) -> None:
+        """在 (虚拟) 时间 at 调用 callback；可以在任何线程调用。"""
+        def _later():
+            self._loop.call_later(max(0.0, at - self.now()) + 1e-3, callback)  # 略晚一点，避免浮点误差差一丝没到点
+        self._loop.call_soon_threadsafe(_later)
+
+    def spawn(self, cwd: str, project: str | None = None) -> SimSession:
+        s = SimSession(self, self._next, cwd, project or os.path.basename(cwd.rstrip("/\\")) or "claude")
+        self.sessions[s.handle] = s
+        self._next += 1
+        return s
+
+    def get(self, handle: int) -> SimSession | None:
+        s = self.sessions.get(handle)
+        return s if s and s.alive else None
+
+    def live(self) -> list[SimSession]:
+        self.calls["list"] += 1
+        return [s for s in self.sessions.values() if s.alive]
+
+    def close(self, handle: int) -> None:
+        s = self.sessions.get(handle)
+        if s:
+            s.alive = False
+
+    def transcript_path(self, session: SimSession) -> str:
+        proj = re.sub(r"[^A-Za-z0-9]", "-", session.cwd)
+        return os.path.join(self.home or "", ".claude", "projects", proj, f"{session.session_id}.jsonl")
+
+    def write_transcript(self, session: SimSession, text: str) -> None:
+        if not self.home:
+            return
+        path = self.transcript_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rec = {
+            "type": "assistant", "sessionId": session.session_id, "timestamp": self.now(),
+            "message": {"role": "assistant", "content": [{"type": "text", "text": text}]},
+        }
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+_hub = None
+
+
+def hub() -> SimHub:
+    """FakeBackend 使用的当前会话集合 (默认使用真实时间)。"""
+    global _hub
+    if _hub is None:
+        _hub = SimHub()
+    return _hub
+
+
+def set_hub(h: SimHub) -> None:
+    global _hub
+    _hub = h
+
+
+# ── 场景 ─────────────────────────────────────────────────────────
+CHAT_ID = 1000
+
+
+class _Ctx:
+    """monitor / 被动监控只用到 context.bot (或 app.bot)。"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+
+async def _fake_bot(api) -> _Ctx:
+    from telegram import Bot
+    from fake_tg import FAKE_TOKEN
+    bot = Bot(FAKE_TOKEN, request=api)
+    await bot.initialize()
+    api.reset()  # 不计 getMe
+    return _Ctx(bot)
+
+
+def _setup_env(tmp: str) -> None:
+    """在导入 bot 模块前调用: 使用模拟后端，日志/事件/transcript 都写到临时目录。"""
+    os.environ["TERM_BACKEND"] = "fake"
+    os.environ["HOME"] = os.environ["USERPROFILE"] = tmp
+    import logging
+    import eventlog
+    eventlog.EVENT_LOG_PATH = os.path.join(tmp, "events.jsonl")
+    logging.getLogger("bedcode").setLevel(logging.WARNING)
+
+
+def _reset_state(sim_hub: SimHub) -> None:
+    from config import state
+    import claude_detect
+    import hook_state
+    set_hub(sim_hub)
+    claude_detect._windows_cache_time = 0
+    hook_state._sessions.clear()  # 各场景的会话 id 会重复
+    hook_state._handles.clear()
+    hook_state.follow(())
+    state["msg_queue"].clear()
+    state.update(status_msg=None, auto_yes=False, target_handle=None, monitor_task=None,
+                 chat_id=CHAT_ID, last_tg_msg_time=sim_hub.now(), timelapse=False)
+
+
+async def _run_monitor(handle: int, ctx: _Ctx) -> None:
+    from config import state
+    from monitor import _start_monitor
+    _start_monitor(handle, CHAT_ID, ctx)
+    await state["monitor_task"]
+
+
+async def _flow_monitor(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    from terminal import send_keys_to_window
+    s = sim_hub.spawn("/work/demo")
+    s.turns.append([("think", 20), ("say", "● 修好了"), ("transcript", "修好了登录 bug，测试全部通过")])
+    send_keys_to_window(s.handle, "修一下登录 bug")
+    await _run_monitor(s.handle, ctx)
+    texts = api.texts()
+    errors = []
+    if s.inputs != ["修一下登录 bug"]:
+        errors.append(f"输入不符: {s.inputs}")
+    if not any("思考中" in t for t in texts):
+        errors.append("没有思考状态消息")
+    if not any("修好了登录 bug" in t for t in api.texts("sendMessage")):
+        errors.append("结果未转发")
+    if not any("已停止思考" in t for t in texts):
+        errors.append("没有完成按钮消息")
+    return errors
+
+
+async def _flow_queue(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    from config import state
+    from terminal import send_keys_to_window
+    s = sim_hub.spawn("/work/queue")
+    state["msg_queue"].extend(["第二条", "第三条"])
+    send_keys_to_window(s.handle, "第一条")
+    await _run_monitor(s.handle, ctx)
+    errors = []
+    if s.inputs != ["第一条", "第二条", "第三条"]:
+        errors.append(f"队列顺序不符: {s.inputs}")
+    if state["msg_queue"]:
+        errors.append(f"队列未清空: {list(state['msg_queue'])}")
+    if len(s.finished) != 3:
+        errors.append(f"完成轮数 {len(s.finished)} != 3")
+    if sum("发送队列消息" in t for t in api.texts()) != 2:
+        errors.append("队列发送提示次数不符")
+    return errors
+
+
+async def _flow_timelapse(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    """延时模式: 思考中的定时截图攒成一段动画，结束时一次发送，不再逐张发图。"""
+    from config import state
+    from terminal import send_keys_to_window
+    interval = state["screenshot_interval"]
+    state.update(timelapse=True, screenshot_interval=3)
+    s = sim_hub.spawn("/work/timelapse")
+    s.turns.append([("think", 40), ("say", "● 分析完成"), ("transcript", "性能瓶颈在 JSON 序列化")])
+    send_keys_to_window(s.handle, "分析一下性能")
+    try:
+        await _run_monitor(s.handle, ctx)
+    finally:
+        state["screenshot_interval"] = interval
+    photos = [c for c in api.calls if c.method == "sendPhoto" and "思考" in (c.params.get("caption") or "")]
+    clips = [c for c in api.calls if c.method in ("sendAnimation", "sendDocument")
+             and "思考过程" in (c.params.get("caption") or "")]
+    errors = []
+    if photos:
+        errors.append(f"思考中仍逐张发图: {len(photos)} 张")
+    if len(clips) != 1:
+        errors.append(f"延时动画发送 {len(clips)} 次")
+    if not any("JSON 序列化" in t for t in api.texts()):
+        errors.append("结果未转发")
+    return errors
+
+
+_PROCEED = "Bash command\n  {cmd}\nDo you want to proceed?\n❯ 1. Yes\n  2. No, and tell Claude what to do differently (esc)"
+
+
+async def _flow_autoyes(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    from config import state
+    from terminal import send_keys_to_window
+    state["auto_yes"] = True
+    s = sim_hub.spawn("/work/auto")
+    s.turns.append([
+        ("think", 6), ("prompt", _PROCEED.format(cmd="pytest -q")),
+        ("think", 6), ("say", "● 测试通过"), ("transcript", "测试已全部通过 (42 passed)"),
+    ])
+    send_keys_to_window(s.handle, "跑一下测试")
+    await _run_monitor(s.handle, ctx)
+    errors = []
+    if s.keys != ["1", "enter"]:
+        errors.append(f"按键不符: {s.keys}")
+    if not any("autoyes" in t for t in api.texts()):
+        errors.append("没有 autoyes 通知")
+    if len(s.finished) != 1 or not any("42 passed" in t for t in api.texts()):
+        errors.append("确认后未完成并转发结果")
+    return errors
+
+
+async def _flow_autoyes_deny(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    from config import state
+    from terminal import send_keys_to_window, send_raw_keys
+    state["auto_yes"] = True
+    s = sim_hub.spawn("/work/deny")
+    s.turns.append([("think", 6), ("prompt", _PROCEED.format(cmd="rm -rf build")), ("think", 3)])
+    send_keys_to_window(s.handle, "清理构建目录")
+    await _run_monitor(s.handle, ctx)
+    errors = []
+    if s.keys:
+        errors.append(f"危险操作被自动确认: {s.keys}")
+    prompts = [c.params for c in api.calls if c.method == "sendMessage" and "等待你选择" in c.params.get("text", "")]
+    if not prompts or not prompts[0].get("reply_markup"):
+        errors.append("没有带按钮的选择提示")
+    send_raw_keys(s.handle, ["esc"])  # 用户在 TG 上拒绝
+    if s.busy or len(s.finished) != 1:
+        errors.append("拒绝后会话未结束")
+    return errors
+
+
+async def _flow_passive(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    from config import state
+    from monitor import _passive_monitor_loop
+    s = sim_hub.spawn("/work/passive")
+    state["window_labels"][s.handle] = "后台"
+    s.turns.append([("think", 30), ("say", "● 重构完成"), ("transcript", "重构完成，删除了 3 个重复函数")])
+    task = asyncio.create_task(_passive_monitor_loop(ctx))
+    await asyncio.sleep(6)
+    s.send_text("重构 utils")  # 用户直接在终端输入，不经过 TG
+    await asyncio.sleep(60)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    state["window_labels"].pop(s.handle, None)
+    texts = api.texts()
+    errors = []
+    if not any("后台" in t and "思考中" in t for t in texts):
+        errors.append("没有思考状态消息")
+    if not any("后台" in t and "完成" in t for t in texts):
+        errors.append("没有完成通知")
+    if not any("删除了 3 个重复函数" in t for t in texts):
+        errors.append("结果未转发")
+    return errors
+
+
+async def _flow_hooks(sim_hub: SimHub, api, ctx: _Ctx) -> list[str]:
+    """被动监控由 hook 事件驱动: 工具进度、权限提示、即时完成；被中断 (没有 Stop) 时靠标题兜底。"""
+    import hook_ipc
+    from config import state
+    from monitor import _passive_monitor_loop
+    from terminal import send_raw_keys
+    hook_ipc._queue = asyncio.Queue()
+    sim_hub.enable_hooks(hook_ipc.ingest)
+    s = sim_hub.spawn("/work/hooks")
+    state["window_labels"][s.handle] = "钩子"
+    state["target_handle"] = s.handle
+    s.turns.append([
+        ("think", 4), ("tool", ("Bash", 40, {"command": "pytest -q"})), ("think", 2),
+        ("tool", ("Edit", 3, {"file_path": "app.py"})), ("prompt", _PROCEED.format(cmd="git push")),
+        ("think", 5), ("say", "● 已推送"), ("transcript", "测试通过并已推送到 origin/main"),
+    ])
+    s.turns.append([("think", 300)])
+    task = state["passive_monitor_task"] = asyncio.create_task(_passive_monitor_loop(ctx))
+    await asyncio.sleep(6)
+    s.send_text("跑测试然后推送")
+    await asyncio.sleep(60)
+    send_raw_keys(s.handle, ["1", "enter"])  # 用户在 TG 上点了按钮
+    await asyncio.sleep(20)
+    s.send_text("再看看性能")
+    await asyncio.sleep(10)
+    s.interrupt()  # 用户在终端里按了 esc，Claude 不发 Stop
+    await asyncio.sleep(120)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    state.update(passive_monitor_task=None, target_handle=None)
+    state["window_labels"].pop(s.handle, None)
+    queued, hook_ipc._queue, sim_hub.hook_sink = hook_ipc._queue.qsize(), None, None
+
+    texts = api.texts()
+    sends = [c for c in api.calls if c.method == "sendMessage"]
+    done = [c for c in sends if "钩子" in c.params.get("text", "") and "完成" in c.params.get("text", "")]
+    errors = []
+    if not any("Bash: pytest -q" in t for t in texts):
+        errors.append("进度中没有当前工具")
+    prompts = [c.params for c in sends if "等待你选择" in c.params.get("text", "")]
+    if not prompts or not prompts[0].get("reply_markup"):
+        errors.append("没有带按钮的权限提示")
+    if len(s.finished) != 2 or len(done) != 2:
+        errors.append(f"完成 {len(s.finished)} 轮，通知 {len(done)} 次")
+    elif done[0].t - s.finished[0] > 1:
+        errors.append(f"完成通知延迟 {done[0].t - s.finished[0]:.1f}s")
+    if done and "Bash×1" not in done[0].params["text"]:
+        errors.append("完成通知没有工具统计")
+    if not any("已推送到 origin/main" in t for t in texts):
+        errors.append("结果未转发")
+    if queued:
+        errors.append(f"hook 消息与监控重复: {queued} 条")
+    return errors
+
+
+_FLOWS = [
+    ("monitor", _flow_monitor), ("queue", _flow_queue), ("autoyes", _flow_autoyes),
+    ("autoyes-deny", _flow_autoyes_deny), ("passive", _flow_passive), ("hooks", _flow_hooks),
+    ("timelapse", _flow_timelapse),
+]
+
+
+async def _run_flows(clock: VirtualClock, tmp: str) -> bool:
+    from fake_tg import FakeBotAPI
+    ok = True
+    for name, flow in _FLOWS:
+        home = os.path.join(tmp, name)
+        os.environ["HOME"] = os.environ["USERPROFILE"] = home
+        sim_hub = SimHub(clock.time, home)
+        api = FakeBotAPI()
+        ctx = await _fake_bot(api)
+        _reset_state(sim_hub)
+        v0, t0 = clock.now, time.perf_counter()
+        try:
+            errors = await asyncio.wait_for(flow(sim_hub, api, ctx), 3600)
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"]
+        real = time.perf_counter() - t0
+        mark = "✅" if not errors else "❌"
+        print(f"{mark} {name:<14} 虚拟 {clock.now - v0:6.1f}s  实际 {real:5.2f}s  "
+              f"API {len(api.calls):3d} 次  后端 {sum(sim_hub.calls.values()):4d} 次")
+        for e in errors:
+            print(f"     - {e}")
+        ok = ok and not errors
+    return ok
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _run_load(clock: VirtualClock, tmp: str, windows: int, minutes: float, capture: bool, seed: int,
+                    hooks: bool = False) -> None:
+    from config import state
+    from monitor import _passive_monitor_loop
+    from fake_tg import FakeBotAPI
+    import hook_ipc
+    rnd = random.Random(seed)
+    sim_hub = SimHub(clock.time, tmp, render=capture)
+    api = FakeBotAPI()
+    ctx = await _fake_bot(api)
+    _reset_state(sim_hub)
+    if hooks:
+        hook_ipc._queue = asyncio.Queue()
+        sim_hub.enable_hooks(hook_ipc.ingest)
+    sessions = []
+    for i in range(windows):
+        s = sim_hub.spawn(f"/work/p{i % 40}", project=f"p{i % 40}")
+        state["window_labels"][s.handle] = f"w{i:03d}"
+        sessions.append(s)
+
+    async def user(s: SimSession) -> None:
+        # 每个窗口: 随机间隔发一条消息，思考 5s~3min
+        k = 0
+        while True:
+            await asyncio.sleep(rnd.uniform(5, 90))
+            if s.busy:
+                continue
+            k += 1
+            busy = rnd.uniform(5, 180)
+            s.turns.append([("think", busy * 0.4), ("tool", ("Bash", busy * 0.6, {"command": f"make t{k}"})),
+                            ("say", f"● 第 {k} 轮完成"), ("transcript", f"{s.project} 第 {k} 轮完成")])
+            s.send_text(f"任务 {k}")
+
+    duration = minutes * 60
+    v0, t0 = clock.now, time.perf_counter()
+    users = [asyncio.create_task(user(s)) for s in sessions]
+    mon = state["passive_monitor_task"] = asyncio.create_task(_passive_monitor_loop(ctx))
+    await asyncio.sleep(duration)
+    for t in users + [mon]:
+        t.cancel()
+    await asyncio.gather(*users, mon, return_exceptions=True)
+    real = time.perf_counter() - t0
+    state["passive_monitor_task"] = hook_ipc._queue = sim_hub.hook_sink = None
+
+    # 完成通知延迟: 每条 "📌 … 完成" 对应该窗口此前最后一次完成，更早未通知的计为漏报
+    by_label = {state["window_labels"][s.handle]: deque(s.finished) for s in sessions}
+    latencies, missed = [], 0
+    label_re = re.compile(r"📌\s*\[?(w\d+)\]?\s*完成")
+    for c in api.calls:
+        m = label_re.match(c.params.get("text") or "") if c.method == "sendMessage" else None
+        pending = by_label.get(m.group(1)) if m else None
+        if pending and pending[0] <= c.t:
+            last = pending.popleft()
+            while pending and pending[0] <= c.t:
+                last = pending.popleft()
+                missed += 1
+            latencies.append(c.t - last)
+    finished = sum(len(s.finished) for s in sessions)
+    for s in sessions:
+        state["window_labels"].pop(s.handle, None)
+
+    print(f"窗口 {windows}，虚拟 {clock.now - v0:.0f}s，实际 {real:.2f}s (加速 {(clock.now - v0) / real:.0f}x)")
+    print(f"完成 {finished} 轮，通知 {len(latencies)} 次，漏报 {missed} 次，"
+          f"延迟 p50 {_percentile(latencies, 0.5):.1f}s  p99 {_percentile(latencies, 0.99):.1f}s")
+    print("后端调用: " + ", ".join(f"{k}={v}" for k, v in sim_hub.calls.most_common()))
+    print("API 调用: " + ", ".join(f"{k}={v}" for k, v in api.count().most_common()))
+
+
+def main() -> None:
+    import tempfile
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("flows", help="端到端流程自检: monitor / queue / autoyes / passive / hooks")
+    lp = sub.add_parser("load", help="被动监控压测")
+    lp.add_argument("--windows", type=int, default=200)
+    lp.add_argument("--minutes", type=float, default=30, help="虚拟时长 (分钟)")
+    lp.add_argument("--capture", action="store_true", help="完成时渲染截图 (默认跳过)")
+    lp.add_argument("--seed", type=int, default=1)
+    lp.add_argument("--hooks", action="store_true", help="会话发出 hook 事件，被动监控按 hook 驱动")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bedcode-sim-") as tmp:
+        _setup_env(tmp)
+        clock = VirtualClock()
+        loop = clock.new_event_loop()
+        asyncio.set_event_loop(loop)
+        ok = True
+        try:
+            with clock.patch_time():
+                if args.cmd == "flows":
+                    ok = loop.run_until_complete(_run_flows(clock, tmp))
+                else:
+                    loop.run_until_complete(
+                        _run_load(clock, tmp, args.windows, args.minutes, args.capture, args.seed, args.hooks))
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    # 作为脚本运行时本文件是 __main__，而 FakeBackend 导入的是 sim_claude；统一用后者的会话集合
+    import sim_claude
+    sim_claude.main()
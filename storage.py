@@ -0,0 +1,167 @@
+"""缓存目录回收: 按目录的容量/时间配额做 LRU 淘汰，保护仍被队列引用的文件。"""
+import os
+import time
+import asyncio
+import logging
+
+import config
+from config import state
+from utils import IMG_DIR, VOICE_DIR, MSG_DIR, SHELL_DIR, _fmt_size, _spool_refs
+from eventlog import log_event
+
+logger = logging.getLogger("bedcode")
+
+_DIRS = {
+    "images": IMG_DIR,
+    "voices": VOICE_DIR,
+    "messages": MSG_DIR,
+    "shell_logs": SHELL_DIR,
+}
+_MIN_AGE = 120  # 刚写入的文件可能还没被使用，不参与淘汰
+_last_gc = {"time": 0.0, "removed": 0, "freed": 0}
+_gc_lock = asyncio.Lock()
+
+
+def _scan(path: str) -> list[tuple[str, int, float]]:
+    """递归列出 (路径, 大小, 最近使用时间)。"""
+    out = []
+    stack = [path]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(e.path)
+                        elif e.is_file(follow_symlinks=False):
+                            st = e.stat()
+                            out.append((e.path, st.st_size, max(st.st_atime, st.st_mtime)))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return out
+
+
+def _protected_paths() -> tuple[set[str], str]:
+    """仍在消息队列中、或后台任务仍可查看的文件。"""
+    queue = list(state.get("msg_queue", []))
+    queued = "\n".join(queue)
+    protected = {os.path.normcase(os.path.abspath(p)) for p in _spool_refs(queue)}
+    try:
+        from shell import list_jobs
+        for job in list_jobs():
+            protected.add(os.path.normcase(os.path.abspath(job["log_path"])))
+    except Exception:
+        pass
+    return protected, queued
+
+
+def _is_protected(path: str, protected: set[str], queued: str) -> bool:
+    return os.path.normcase(os.path.abspath(path)) in protected or (queued and path in queued)
+
+
+def _remove_empty_dirs(root: str) -> None:
+    for d, subdirs, files in os.walk(root, topdown=False):
+        if d != root and not subdirs and not files:
+            try:
+                os.rmdir(d)
+            except OSError:
+                pass
+
+
+def _collect(name: str, path: str, max_bytes: int, max_age: int,
+             protected: set[str], queued: str, now: float) -> tuple[int, int]:
+    files = _scan(path)
+    removed = freed = 0
+    keep = []
+    for f in files:
+        p, size, used = f
+        if now - used < _MIN_AGE or _is_protected(p, protected, queued):
+            keep.append((f, False))
+        elif max_age and now - used > max_age:
+            try:
+                os.remove(p)
+                removed += 1
+                freed += size
+            except OSError:
+                keep.append((f, False))
+        else:
+            keep.append((f, True))
+    total = sum(f[1] for f, _ in keep)
+    if max_bytes and total > max_bytes:
+        # LRU: 从最久未使用的开始删，直到回到配额内
+        for (p, size, _), evictable in sorted(keep, key=lambda x: x[0][2]):
+            if total <= max_bytes:
+                break
+            if not evictable:
+                continue
+            try:
+                os.remove(p)
+                removed += 1
+                freed += size
+                total -= size
+            except OSError:
+                pass
+    _remove_empty_dirs(path)
+    if removed:
+        logger.info(f"[存储] {name}: 清理 {removed} 个文件，释放 {_fmt_size(freed)}")
+    return removed, freed
+
+
+def collect_garbage(protected: set[str], queued: str) -> tuple[int, int]:
+    """同步执行一轮回收，返回 (删除文件数, 释放字节数)。需在线程中调用。"""
+    now = time.time()
+    removed = freed = 0
+    for name, path in _DIRS.items():
+        max_bytes, max_age = config.STORAGE_QUOTAS.get(name, (0, 0))
+        r, f = _collect(name, path, max_bytes, max_age, protected, queued, now)
+        removed += r
+        freed += f
+    _last_gc.update(time=now, removed=removed, freed=freed)
+    return removed, freed
+
+
+async def run_gc() -> tuple[int, int]:
+    async with _gc_lock:
+        t0 = time.time()
+        # 保护列表在事件循环线程里取快照，避免与队列修改并发
+        protected, queued = _protected_paths()
+        removed, freed = await asyncio.to_thread(collect_garbage, protected, queued)
+        log_event("storage.gc", duration=time.time() - t0, size=freed, removed=removed)
+        return removed, freed
+
+
+async def gc_loop() -> None:
+    """后台定期回收，在 post_init 中启动。"""
+    while True:
+        try:
+            await run_gc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[存储] 回收失败: {e}")
+        await asyncio.sleep(max(60, config.STORAGE_GC_INTERVAL))
+
+
+def usage() -> list[dict]:
+    """各目录占用统计。需在线程中调用。"""
+    now = time.time()
+    rows = []
+    for name, path in _DIRS.items():
+        files = _scan(path)
+        max_bytes, max_age = config.STORAGE_QUOTAS.get(name, (0, 0))
+        rows.append({
+            "name": name,
+            "files": len(files),
+            "size": sum(f[1] for f in files),
+            "oldest": max((now - f[2] for f in files), default=0),
+            "max_bytes": max_bytes,
+            "max_age": max_age,
+        })
+    return rows
+
+
+def last_gc() -> dict:
+    return dict(_last_gc)
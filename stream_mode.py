@@ -1,7 +1,6 @@
-"""流式模式: Git Bash 检测、子进程管理、流式读取。"""
+"""流式模式: 子进程管理、流式读取。"""
 import os
 import json
-import html
 import time
 import asyncio
 import subprocess
@@ -10,41 +9,14 @@ import logging
 from telegram.ext import ContextTypes
 
 from config import state
-from utils import split_text
+from utils import send_result
 from monitor import _update_status, _delete_status
+from eventlog import log_event, sample_event
+from toolpaths import git_bash_async
 
 logger = logging.getLogger("bedcode")
 
 
-def _find_git_bash() -> str:
-    env_path = os.environ.get("GIT_BASH_PATH", "")
-    if env_path and os.path.isfile(env_path):
-        return env_path
-    candidates = [
-        r"C:\Program Files\Git\bin\bash.exe",
-        r"C:\Program Files (x86)\Git\bin\bash.exe",
-        os.path.expandvars(r"%LOCALAPPDATA%\Programs\Git\bin\bash.exe"),
-    ]
-    for c in candidates:
-        if os.path.isfile(c):
-            return c
-    try:
-        result = subprocess.run(
-            ["where", "bash"], capture_output=True, text=True, timeout=5,
-        )
-        for line in result.stdout.strip().splitlines():
-            if "git" in line.lower() and os.path.isfile(line.strip()):
-                return line.strip()
-    except Exception:
-        pass
-    logger.warning("未找到 Git Bash，使用默认路径")
-    return r"C:\Program Files\Git\bin\bash.exe"
-
-
-GIT_BASH_PATH = _find_git_bash()
-logger.info(f"Git Bash: {GIT_BASH_PATH}")
-
-
 def _kill_stream_proc():
     proc = state.get("stream_proc")
     if proc and proc.poll() is None:
@@ -67,6 +39,7 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
     last_flush = time.time()
     notified_thinking = False
     line_count = 0
+    t0 = time.time()
 
     logger.info(f"[流式] reader 启动, PID={proc.pid}")
 
@@ -110,7 +83,7 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
                 continue
 
             msg_type = data.get("type", "")
-            logger.info(f"[流式] 消息类型: {msg_type}")
+            sample_event("stream.line", chat_id=chat_id, type=msg_type, size=len(line))
 
             if msg_type == "assistant":
                 content_raw = data.get("message", {}).get("content", [])
@@ -121,18 +94,18 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
                         text = item.get("text", "")
                         if text:
                             buf += text
-                            logger.info(f"[流式] 收到文本 ({len(text)}字): {text[:80]}")
+                            sample_event("stream.text", chat_id=chat_id, size=len(text))
                     elif item_type == "thinking":
-                        logger.info(f"[流式] 收到 thinking 块")
+                        sample_event("stream.thinking", chat_id=chat_id)
                         if not notified_thinking:
                             notified_thinking = True
                             await _update_status(chat_id, "⏳ Claude 思考中...", context)
                     elif item_type == "tool_use":
                         tool_name = item.get("name", "unknown")
-                        logger.info(f"[流式] 工具调用: {tool_name}")
+                        log_event("stream.tool", chat_id=chat_id, tool=tool_name)
                         await _update_status(chat_id, f"🔧 调用工具: {tool_name}", context)
                     else:
-                        logger.info(f"[流式] 其他内容类型: {item_type}")
+                        sample_event("stream.other", chat_id=chat_id, type=item_type)
 
                 now = time.time()
                 if buf and now - last_flush > 5:
@@ -140,29 +113,24 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
                     last_flush = now
 
             elif msg_type == "result":
-                logger.info(f"[流式] 收到 result, buf总计={len(buf)}字")
                 await _delete_status()
                 cost = data.get("total_cost_usd", 0)
+                log_event(
+                    "stream.result", hwnd=state.get("target_handle"), chat_id=chat_id,
+                    duration=time.time() - t0, size=len(buf), lines=line_count, cost=cost or None,
+                )
                 if cost:
                     handle = state.get("target_handle", 0)
                     state["session_costs"][handle] = state["session_costs"].get(handle, 0.0) + cost
                 if buf:
-                    chunks = split_text(buf, 3500)
-                    for chunk in chunks:
-                        safe = html.escape(chunk)
-                        try:
-                            await context.bot.send_message(
-                                chat_id=chat_id, text=f"<pre>{safe}</pre>", parse_mode="HTML",
-                            )
-                        except Exception:
-                            await context.bot.send_message(chat_id=chat_id, text=chunk)
+                    await send_result(chat_id, buf, context)
                     buf = ""
                 cost_text = f" | ${cost:.4f}" if cost else ""
                 await context.bot.send_message(
                     chat_id=chat_id, text=f"✅ 完成{cost_text}",
                 )
             else:
-                logger.info(f"[流式] 未处理类型: {msg_type}, keys={list(data.keys())}")
+                sample_event("stream.unhandled", type=msg_type, keys=list(data.keys()))
 
     except asyncio.CancelledError:
         logger.info("[流式] reader 被取消")
@@ -172,16 +140,10 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
     finally:
         # flush remaining buf
         if buf:
-            chunks = split_text(buf, 3500)
-            for chunk in chunks:
-                safe = html.escape(chunk)
-                try:
-                    await context.bot.send_message(chat_id=chat_id, text=f"<pre>{safe}</pre>", parse_mode="HTML")
-                except Exception:
-                    try:
-                        await context.bot.send_message(chat_id=chat_id, text=chunk)
-                    except Exception:
-                        pass
+            try:
+                await send_result(chat_id, buf, context)
+            except Exception:
+                pass
         # cleanup process
         if proc.poll() is None:
             proc.terminate()
@@ -198,6 +160,7 @@ async def _stream_reader(proc, chat_id: int, context: ContextTypes.DEFAULT_TYPE)
                     pass
         ret = proc.poll()
         logger.info(f"[流式] 子进程退出码: {ret}")
+        log_event("stream.exit", chat_id=chat_id, duration=time.time() - t0, lines=line_count, rc=ret)
 
 
 async def _stream_send(text: str, chat_id: int, context: ContextTypes.DEFAULT_TYPE):
@@ -207,7 +170,7 @@ async def _stream_send(text: str, chat_id: int, context: ContextTypes.DEFAULT_TY
     await _update_status(chat_id, "⏳ 启动 Claude...", context)
 
     env = os.environ.copy()
-    env["CLAUDE_CODE_GIT_BASH_PATH"] = GIT_BASH_PATH
+    env["CLAUDE_CODE_GIT_BASH_PATH"] = await git_bash_async()
 
     cmd = [
         "claude.cmd", "-p",
@@ -0,0 +1,186 @@
+"""终端渲染: 把 vscreen.Screen 的字符网格画成图片 (PNG/WebP/JPEG)，代替系统截屏。
+
+- 字形图集: 每个 (字符, 粗体) 只光栅化一次，之后按颜色用 mask 贴图；ASCII 预先光栅化。
+- 按行增量: 只重画 Screen.dirty 中的行；行图再按内容缓存，滚动或重绘相同内容时直接复用。
+"""
+import io
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from vscreen import BOLD, DIM, INVERSE, UNDERLINE, char_width
+
+_FONTS = ["consola.ttf", "DejaVuSansMono.ttf", "LiberationMono-Regular.ttf", "Menlo.ttc"]
+_BOLD_FONTS = ["consolab.ttf", "DejaVuSansMono-Bold.ttf", "LiberationMono-Bold.ttf"]
+_WIDE_FONTS = ["msyh.ttc", "simhei.ttf", "NotoSansCJK-Regular.ttc", "wqy-microhei.ttc", "DroidSansFallbackFull.ttf"]
+
+DEFAULT_FG = (204, 204, 204)
+DEFAULT_BG = (12, 12, 12)
+# Windows Terminal "Campbell" 配色
+_ANSI16 = [
+    (12, 12, 12), (197, 15, 31), (19, 161, 14), (193, 156, 0),
+    (0, 55, 218), (136, 23, 152), (58, 150, 221), (204, 204, 204),
+    (118, 118, 118), (231, 72, 86), (22, 198, 12), (249, 241, 165),
+    (59, 120, 255), (180, 0, 158), (97, 214, 214), (242, 242, 242),
+]
+
+
+def _palette256() -> list[tuple[int, int, int]]:
+    pal = list(_ANSI16)
+    steps = [0, 95, 135, 175, 215, 255]
+    pal += [(steps[r], steps[g], steps[b]) for r in range(6) for g in range(6) for b in range(6)]
+    pal += [(8 + 10 * i,) * 3 for i in range(24)]
+    return pal
+
+
+PALETTE = _palette256()
+
+
+def _load(names: list[str], size: int):
+    for name in names:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return None
+
+
+def _rgb(color, default):
+    if color is None:
+        return default
+    if isinstance(color, tuple):
+        return color
+    return PALETTE[color % 256]
+
+
+class GlyphAtlas:
+    """等宽字形缓存: (字符, 粗体) → 单元格大小的 L 模式 mask。"""
+
+    def __init__(self, size: int = 15):
+        self.font = _load(_FONTS, size) or ImageFont.load_default()
+        self.bold_font = _load(_BOLD_FONTS, size) or self.font
+        self.wide_font = _load(_WIDE_FONTS, size) or self.font
+        ascent, descent = self.font.getmetrics()
+        self.cell_w = max(1, round(self.font.getlength("M")))
+        self.cell_h = ascent + descent + 2
+        self.baseline = 1
+        self._masks = {}
+        for code in range(32, 127):
+            self.mask(chr(code), False)
+            self.mask(chr(code), True)
+
+    def mask(self, ch: str, bold: bool) -> Image.Image | None:
+        key = (ch, bold)
+        m = self._masks.get(key, False)
+        if m is not False:
+            return m
+        m = None
+        if ch.strip():
+            wide = char_width(ch[0]) == 2
+            font = self.wide_font if wide else (self.bold_font if bold else self.font)
+            m = Image.new("L", (self.cell_w * (2 if wide else 1), self.cell_h), 0)
+            ImageDraw.Draw(m).text((0, self.baseline), ch, font=font, fill=255)
+            if not m.getbbox():
+                m = None
+        self._masks[key] = m
+        return m
+
+
+class TermRenderer:
+    """一个屏幕对应一个渲染器，持有画布；render() 只重画脏行。"""
+
+    _ROW_CACHE = 512
+
+    def __init__(self, atlas: GlyphAtlas | None = None):
+        self.atlas = atlas or shared_atlas()
+        self.canvas = None
+        self._size = None
+        self._rows = OrderedDict()  # 行内容 → 行图
+        self.stats = {"frames": 0, "rows_drawn": 0, "rows_cached": 0}
+
+    def _row_image(self, row: list) -> Image.Image:
+        key = tuple(row)
+        img = self._rows.get(key)
+        if img is not None:
+            self._rows.move_to_end(key)
+            self.stats["rows_cached"] += 1
+            return img
+        a = self.atlas
+        cw, ch = a.cell_w, a.cell_h
+        img = Image.new("RGB", (cw * len(row), ch), DEFAULT_BG)
+        draw = ImageDraw.Draw(img)
+        # 先按背景色连续段填充，再逐格贴前景字形
+        run_start, run_bg = 0, None
+        cells = []
+        for x, (c, (fg, bg, flags)) in enumerate(row):
+            if flags & BOLD and isinstance(fg, int) and fg < 8:
+                fg += 8  # 粗体的基本色显示为亮色
+            fg_rgb, bg_rgb = _rgb(fg, DEFAULT_FG), _rgb(bg, DEFAULT_BG)
+            if flags & INVERSE:
+                fg_rgb, bg_rgb = bg_rgb, fg_rgb
+            if flags & DIM:
+                fg_rgb = tuple(v // 2 for v in fg_rgb)
+            if bg_rgb != run_bg:
+                if run_bg is not None and run_bg != DEFAULT_BG:
+                    draw.rectangle((run_start * cw, 0, x * cw - 1, ch - 1), fill=run_bg)
+                run_start, run_bg = x, bg_rgb
+            if c and c != " ":
+                cells.append((x, c, fg_rgb, flags))
+        if run_bg is not None and run_bg != DEFAULT_BG:
+            draw.rectangle((run_start * cw, 0, len(row) * cw - 1, ch - 1), fill=run_bg)
+        for x, c, fg_rgb, flags in cells:
+            m = a.mask(c, bool(flags & BOLD))
+            if m is not None:
+                img.paste(fg_rgb, (x * cw, 0), m)
+            if flags & UNDERLINE:
+                draw.line((x * cw, ch - 2, (x + 1) * cw - 1, ch - 2), fill=fg_rgb)
+        self._rows[key] = img
+        if len(self._rows) > self._ROW_CACHE:
+            self._rows.popitem(last=False)
+        self.stats["rows_drawn"] += 1
+        return img
+
+    def render(self, screen, full: bool = False) -> Image.Image:
+        """重画脏行并返回画布 (调用方需持有屏幕锁，且不要修改返回的画布)。"""
+        a = self.atlas
+        size = (screen.cols * a.cell_w, screen.rows * a.cell_h)
+        dirty = screen.take_dirty()
+        if self.canvas is None or self._size != size or full:
+            self.canvas = Image.new("RGB", size, DEFAULT_BG)
+            self._size = size
+            dirty = range(screen.rows)
+        for y in sorted(dirty):
+            if y < screen.rows:
+                self.canvas.paste(self._row_image(screen.buffer[y]), (0, y * a.cell_h))
+        self.stats["frames"] += 1
+        return self.canvas
+
+    def snapshot(self, screen, fmt: str = "png", max_w: int | None = None, cursor: bool = True) -> bytes:
+        """渲染并编码。PNG 对终端画面压缩率高且文字清晰；JPEG/WebP 用于需要更小体积的场合。"""
+        img = self.render(screen)
+        if cursor and screen.cursor_visible and self.canvas is not None:
+            img = img.copy()
+            a = self.atlas
+            x, y = min(screen.x, screen.cols - 1) * a.cell_w, screen.y * a.cell_h
+            ImageDraw.Draw(img).rectangle((x, y, x + a.cell_w - 1, y + a.cell_h - 1), outline=DEFAULT_FG)
+        if max_w and img.width > max_w:
+            img = img.resize((max_w, int(img.height * max_w / img.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "webp":
+            img.save(out, format="WEBP", lossless=True, method=0)
+        elif fmt == "jpeg":
+            img.save(out, format="JPEG", quality=80)
+        else:
+            img.save(out, format="PNG", compress_level=1)
+        return out.getvalue()
+
+
+_atlas = None
+
+
+def shared_atlas() -> GlyphAtlas:
+    """所有渲染器共用一个字形图集。"""
+    global _atlas
+    if _atlas is None:
+        _atlas = GlyphAtlas()
+    return _atlas
@@ -0,0 +1,525 @@
+"""终端后端: 枚举会话、读文本、发文本/按键、中断、截图。
+
+Windows 上走 win32_api (PrintWindow/SendInput) + pywinauto UIA；Linux 上走 tmux
+(list-panes / capture-pane / send-keys)，或由 bot 自己在 pty 里启动 claude (pty)。
+由 TERM_BACKEND 选择，默认按系统自动选 win32 / tmux；fake 为进程内模拟会话 (sim_claude.py)。
+句柄统一为整数: Win32 为 HWND，tmux 为 pane id + 1 (%0 → 1，0 在各处表示没有窗口)，pty 为子进程 pid，fake 从 1001 递增。
+"""
+import os
+import time
+import asyncio
+import shutil
+import hashlib
+import logging
+import subprocess
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger("bedcode")
+
+
+def _image_hash(img_bytes: bytes) -> str:
+    return hashlib.md5(img_bytes).hexdigest()
+
+
+class TerminalBackend:
+    """后端接口。所有方法都是同步阻塞的，调用方用 asyncio.to_thread 包装。"""
+
+    name = "base"
+
+    def list_sessions(self) -> list[dict]:
+        """返回 [{"handle", "title", "class"}]，只含 Claude 会话。"""
+        raise NotImplementedError
+
+    def get_title(self, handle: int) -> str:
+        raise NotImplementedError
+
+    def read_text(self, handle: int) -> str:
+        raise NotImplementedError
+
+    def send_text(self, handle: int, text: str) -> bool:
+        """输入文本并回车。"""
+        raise NotImplementedError
+
+    def send_keys(self, handle: int, key_parts: list[str]) -> bool:
+        raise NotImplementedError
+
+    def interrupt(self, handle: int) -> bool:
+        raise NotImplementedError
+
+    def undo(self, handle: int) -> bool:
+        raise NotImplementedError
+
+    def capture(self, handle: int, max_w: int | None = 1280) -> bytes | None:
+        raise NotImplementedError
+
+    async def launch(self, work_dir: str) -> int | None:
+        """在 work_dir 启动新的 Claude 会话，返回句柄；返回 None 表示由调用方用原有方式启动。"""
+        return None
+
+    def hook_handle(self, origin: dict) -> int | None:
+        """hook 事件来自哪个会话: origin 是 notify_hook 记录的 hook 进程环境
+        (tmux_pane / session)，认不出时返回 None。"""
+        return None
+
+    # 以下为可选能力，不支持的后端返回 False / ""，调用方自行降级
+    def copy_image(self, filepath: str) -> bool:
+        return False
+
+    def paste_image(self, handle: int) -> bool:
+        return False
+
+    def get_clipboard(self) -> str:
+        return ""
+
+    def set_clipboard(self, text: str) -> bool:
+        return False
+
+
+# ── Win32 ────────────────────────────────────────────────────────
+class Win32Backend(TerminalBackend):
+    """原有实现: PrintWindow 截屏、SendInput/pywinauto 注入、UIA 读文本。"""
+
+    name = "win32"
+
+    def __init__(self):
+        import win32_api  # 仅 Windows 可导入 (ctypes.windll)
+        self._api = win32_api
+
+    def list_sessions(self) -> list[dict]:
+        from pywinauto import Desktop
+        results = []
+        for w in Desktop(backend="uia").windows():
+            try:
+                title = w.window_text()
+                if "claude" in title.lower():
+                    results.append({"title": title, "handle": w.handle, "class": w.class_name()})
+            except Exception:
+                continue
+        return results
+
+    def get_title(self, handle: int) -> str:
+        return self._api.get_window_title(handle)
+
+    def read_text(self, handle: int) -> str:
+        try:
+            from pywinauto import Application as PwaApp
+            app = PwaApp(backend="uia").connect(handle=handle)
+            win = app.window(handle=handle)
+            for child in win.descendants():
+                try:
+                    iface = child.iface_text
+                    if iface:
+                        text = iface.DocumentRange.GetText(-1)
+                        if isinstance(text, bytes):
+                            text = text.decode('utf-8', errors='replace')
+                        if text and len(text.strip()) > 10:
+                            text = text.encode('utf-8', errors='replace').decode('utf-8')
+                            return text
+                except Exception:
+                    pass
+                try:
+                    val = child.legacy_properties().get("Value", "")
+                    if isinstance(val, bytes):
+                        val = val.decode('utf-8', errors='replace')
+                    if val and len(val.strip()) > 10:
+                        val = val.encode('utf-8', errors='replace').decode('utf-8')
+                        return val
+                except Exception:
+                    pass
+            return ""
+        except Exception as e:
+            logger.debug(f"UIA 文本读取失败: {e}")
+            return ""
+
+    def send_text(self, handle: int, text: str) -> bool:
+        return self._api.send_keys_to_window(handle, text)
+
+    def send_keys(self, handle: int, key_parts: list[str]) -> bool:
+        return self._api.send_raw_keys(handle, key_parts)
+
+    def interrupt(self, handle: int) -> bool:
+        return self._api.send_ctrl_c(handle)
+
+    def undo(self, handle: int) -> bool:
+        return self._api.send_ctrl_z(handle)
+
+    def capture(self, handle: int, max_w: int | None = 1280) -> bytes | None:
+        return self._api.capture_window_screenshot(handle, max_w)
+
+    def copy_image(self, filepath: str) -> bool:
+        return self._api.copy_image_to_clipboard(filepath)
+
+    def paste_image(self, handle: int) -> bool:
+        return self._api.paste_image_to_window(handle)
+
+    def get_clipboard(self) -> str:
+        return self._api.get_clipboard_text()
+
+    def set_clipboard(self, text: str) -> bool:
+        return self._api.set_clipboard_text(text)
+
+
+# ── tmux ─────────────────────────────────────────────────────────
+_TMUX_KEYS = {
+    "上": "Up", "up": "Up", "↑": "Up",
+    "下": "Down", "down": "Down", "↓": "Down",
+    "左": "Left", "left": "Left", "←": "Left",
+    "右": "Right", "right": "Right", "→": "Right",
+    "回车": "Enter", "enter": "Enter",
+    "tab": "Tab",
+    "退格": "BSpace", "backspace": "BSpace",
+    "esc": "Escape", "取消": "Escape",
+    "空格": "Space", "space": "Space",
+}
+
+
+def pane_handle(pane_id: str) -> int:
+    """"%12" → 13。"""
+    return int(pane_id.lstrip("%")) + 1
+
+
+_PANE_FORMAT = "#{pane_id}\t#{pane_current_command}\t#{session_name}:#{window_index}.#{pane_index}\t#{pane_title}"
+
+
+class TmuxBackend(TerminalBackend):
+    """tmux 会话: 读文本只需一次 capture-pane，无需截图和 UIA，也不抢焦点。"""
+
+    name = "tmux"
+    history = 2000  # capture-pane 回看的行数
+
+    def __init__(self):
+        self._exe = shutil.which("tmux") or "tmux"
+
+    def base_cmd(self) -> list[str]:
+        cmd = [self._exe]
+        if config.TMUX_SOCKET:
+            cmd += ["-L", config.TMUX_SOCKET]
+        return cmd
+
+    def _run(self, *args, input: str | None = None, timeout: float = 5) -> str | None:
+        try:
+            r = subprocess.run(self.base_cmd() + list(args), input=input, capture_output=True,
+                               text=True, encoding="utf-8", errors="replace", timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.debug(f"tmux {args[0]} 失败: {e}")
+            return None
+        if r.returncode != 0:
+            logger.debug(f"tmux {args[0]} 退出码 {r.returncode}: {r.stderr.strip()}")
+            return None
+        return r.stdout
+
+    @staticmethod
+    def _target(handle: int) -> str:
+        return f"%{handle - 1}"
+
+    def list_sessions(self) -> list[dict]:
+        out = self._run("list-panes", "-a", "-F", _PANE_FORMAT)
+        results = []
+        for line in (out or "").splitlines():
+            parts = line.split("\t", 3)
+            if len(parts) < 4 or not parts[0].startswith("%"):
+                continue
+            pane_id, command, where, title = parts
+            if "claude" in command.lower() or "claude" in title.lower():
+                results.append({"title": title, "handle": pane_handle(pane_id), "class": f"tmux:{where}"})
+        return results
+
+    def hook_handle(self, origin: dict) -> int | None:
+        pane = origin.get("tmux_pane") or ""
+        return pane_handle(pane) if pane.startswith("%") else None
+
+    def session_names(self) -> list[str]:
+        out = self._run("list-sessions", "-F", "#{session_name}")
+        return out.splitlines() if out else []
+
+    def get_title(self, handle: int) -> str:
+        out = self._run("display-message", "-p", "-t", self._target(handle), "#{pane_title}")
+        return out.rstrip("\n") if out else ""
+
+    def read_text(self, handle: int) -> str:
+        out = self._run("capture-pane", "-p", "-J", "-S", f"-{self.history}", "-t", self._target(handle))
+        return out.rstrip() if out else ""
+
+    def send_text(self, handle: int, text: str) -> bool:
+        # 经 paste buffer 粘贴 (-p 在程序开启时使用 bracketed paste)，多行文本不会被逐行回车提交
+        target = self._target(handle)
+        if self._run("load-buffer", "-b", "bedcode", "-", input=text) is None:
+            return False
+        if self._run("paste-buffer", "-p", "-d", "-b", "bedcode", "-t", target) is None:
+            return False
+        time.sleep(0.2)
+        ok = self._run("send-keys", "-t", target, "Enter") is not None
+        if ok:
+            logger.info(f"注入成功(tmux): {text[:50]}")
+        return ok
+
+    def send_keys(self, handle: int, key_parts: list[str]) -> bool:
+        target = self._target(handle)
+        for p in key_parts:
+            key = _TMUX_KEYS.get(p.lower())
+            args = ("send-keys", "-t", target, key) if key else ("send-keys", "-t", target, "-l", p)
+            if self._run(*args) is None:
+                logger.warning(f"按键发送失败(tmux): {p}")
+                return False
+        logger.info(f"按键发送: {' '.join(key_parts)}")
+        return True
+
+    def interrupt(self, handle: int) -> bool:
+        return self._run("send-keys", "-t", self._target(handle), "C-c") is not None
+
+    def undo(self, handle: int) -> bool:
+        # Unix 终端里 Ctrl+Z 会挂起进程，Claude Code 输入框的撤销键是 Ctrl+_
+        return self._run("send-keys", "-t", self._target(handle), "C-_") is not None
+
+    def capture(self, handle: int, max_w: int | None = 1280) -> bytes | None:
+        # 一次调用取尺寸 + 带颜色的屏幕内容，回放到虚拟屏幕后渲染 (行图缓存跨次复用)
+        target = self._target(handle)
+        out = self._run("display-message", "-p", "-t", target, "#{pane_width}x#{pane_height}",
+                        ";", "capture-pane", "-p", "-e", "-t", target)
+        if not out:
+            return None
+        size, _, body = out.partition("\n")
+        try:
+            cols, rows = (int(v) for v in size.split("x"))
+        except ValueError:
+            return None
+        return _render_text(handle, body, cols, rows, max_w)
+
+    async def launch(self, work_dir: str) -> int | None:
+        cmd = config.PTY_COMMAND
+        if await asyncio.to_thread(self.session_names):
+            out = await asyncio.to_thread(self._run, "new-window", "-P", "-F", "#{pane_id}", "-c", work_dir, cmd)
+        else:
+            out = await asyncio.to_thread(
+                self._run, "new-session", "-d", "-P", "-F", "#{pane_id}", "-s", "bedcode", "-c", work_dir, cmd)
+        return pane_handle(out.strip()) if out and out.strip() else None
+
+    def get_clipboard(self) -> str:
+        return self._run("show-buffer") or ""
+
+    def set_clipboard(self, text: str) -> bool:
+        return self._run("set-buffer", "--", text) is not None
+
+
+# ── 自有 PTY ─────────────────────────────────────────────────────
+_PTY_KEYS = {
+    "上": "\x1b[A", "up": "\x1b[A", "↑": "\x1b[A",
+    "下": "\x1b[B", "down": "\x1b[B", "↓": "\x1b[B",
+    "左": "\x1b[D", "left": "\x1b[D", "←": "\x1b[D",
+    "右": "\x1b[C", "right": "\x1b[C", "→": "\x1b[C",
+    "回车": "\r", "enter": "\r",
+    "tab": "\t",
+    "退格": "\x7f", "backspace": "\x7f",
+    "esc": "\x1b", "取消": "\x1b",
+    "空格": " ", "space": " ",
+}
+
+
+class PtyBackend(TerminalBackend):
+    """bot 自己在 pty 里启动的 claude (pty_session.py)，所有读取都是内存操作。"""
+
+    name = "pty"
+
+    def __init__(self):
+        import pty_session
+        self._pty = pty_session
+
+    def _write(self, handle: int, data: str) -> bool:
+        s = self._pty.get(handle)
+        return bool(s) and s.write(data.encode("utf-8"))
+
+    def list_sessions(self) -> list[dict]:
+        return [
+            {"title": s.title() or "claude", "handle": s.handle, "class": f"pty:{s.cwd}"}
+            for s in self._pty.sessions()
+        ]
+
+    def get_title(self, handle: int) -> str:
+        s = self._pty.get(handle)
+        return (s.title() or "claude") if s and s.alive else ""
+
+    def hook_handle(self, origin: dict) -> int | None:
+        token = origin.get("session")
+        return next((s.handle for s in self._pty.sessions() if token and s.token == token), None)
+
+    def read_text(self, handle: int) -> str:
+        s = self._pty.get(handle)
+        return s.text() if s else ""
+
+    def send_text(self, handle: int, text: str) -> bool:
+        s = self._pty.get(handle)
+        if not s:
+            return False
+        if s.screen.bracketed_paste:
+            text = f"\x1b[200~{text}\x1b[201~"
+        if not self._write(handle, text):
+            return False
+        time.sleep(0.2)
+        ok = self._write(handle, "\r")
+        if ok:
+            logger.info(f"注入成功(pty): {text[:50]}")
+        return ok
+
+    def send_keys(self, handle: int, key_parts: list[str]) -> bool:
+        for p in key_parts:
+            if not self._write(handle, _PTY_KEYS.get(p.lower(), p)):
+                return False
+            time.sleep(0.05)  # 单独的 ESC 与方向键序列需要间隔，否则会被合并解析
+        logger.info(f"按键发送: {' '.join(key_parts)}")
+        return True
+
+    def interrupt(self, handle: int) -> bool:
+        return self._write(handle, "\x03")
+
+    def undo(self, handle: int) -> bool:
+        return self._write(handle, "\x1f")  # Ctrl+_
+
+    def capture(self, handle: int, max_w: int | None = 1280) -> bytes | None:
+        s = self._pty.get(handle)
+        if not s:
+            return None
+        r = _renderer(handle)
+        with s.lock:
+            return r.snapshot(s.screen, max_w=max_w)
+
+    async def launch(self, work_dir: str) -> int | None:
+        try:
+            return (await self._pty.spawn(work_dir)).handle
+        except Exception as e:
+            logger.error(f"[PTY] 启动失败: {e}")
+            return None
+
+
+# ── 模拟会话 ─────────────────────────────────────────────────────
+class FakeBackend(TerminalBackend):
+    """进程内模拟的 Claude 会话 (sim_claude.py)，用于没有真实终端时跑通流程和压测。"""
+
+    name = "fake"
+
+    def __init__(self):
+        import sim_claude
+        self._sim = sim_claude
+
+    def list_sessions(self) -> list[dict]:
+        return [
+            {"title": s.title(), "handle": s.handle, "class": f"sim:{s.cwd}"}
+            for s in self._sim.hub().live()
+        ]
+
+    def get_title(self, handle: int) -> str:
+        s = self._sim.hub().get(handle)
+        return s.title() if s else ""
+
+    def hook_handle(self, origin: dict) -> int | None:
+        token = origin.get("session")
+        return next((s.handle for s in self._sim.hub().live() if token and s.session_id == token), None)
+
+    def read_text(self, handle: int) -> str:
+        s = self._sim.hub().get(handle)
+        return s.text() if s else ""
+
+    def send_text(self, handle: int, text: str) -> bool:
+        s = self._sim.hub().get(handle)
+        return bool(s) and s.send_text(text)
+
+    def send_keys(self, handle: int, key_parts: list[str]) -> bool:
+        s = self._sim.hub().get(handle)
+        return bool(s) and s.send_keys([p.lower() for p in key_parts])
+
+    def interrupt(self, handle: int) -> bool:
+        s = self._sim.hub().get(handle)
+        return bool(s) and s.interrupt()
+
+    def undo(self, handle: int) -> bool:
+        return self._sim.hub().get(handle) is not None
+
+    def capture(self, handle: int, max_w: int | None = 1280) -> bytes | None:
+        hub = self._sim.hub()
+        s = hub.get(handle)
+        if not s or not hub.render:
+            return None
+        return _render_text(handle, s.text(), s.cols, s.rows, max_w)
+
+    async def launch(self, work_dir: str) -> int | None:
+        return self._sim.hub().spawn(work_dir).handle
+
+
+# ── 文本屏幕渲染 (tmux / pty 没有像素，用 term_render 画) ──────────
+_renderers = OrderedDict()  # handle → TermRenderer
+
+
+def _renderer(handle: int):
+    from term_render import TermRenderer
+    r = _renderers.get(handle)
+    if r is None:
+        r = _renderers[handle] = TermRenderer()
+        while len(_renderers) > 32:
+            _renderers.popitem(last=False)
+    _renderers.move_to_end(handle)
+    return r
+
+
+def _render_text(handle: int, text: str, cols: int, rows: int, max_w: int | None) -> bytes:
+    from vscreen import Screen
+    screen = Screen(cols, rows, scrollback=0)
+    screen.feed(text.rstrip("\n").replace("\n", "\r\n"))
+    return _renderer(handle).snapshot(screen, max_w=max_w, cursor=False)
+
+
+# ── 后端选择 ─────────────────────────────────────────────────────
+_BACKENDS = {"win32": Win32Backend, "tmux": TmuxBackend, "pty": PtyBackend, "fake": FakeBackend}
+_backend = None
+
+
+def backend() -> TerminalBackend:
+    global _backend
+    if _backend is None:
+        name = config.TERM_BACKEND
+        if name not in _BACKENDS:
+            name = "win32" if os.name == "nt" else "tmux"
+        _backend = _BACKENDS[name]()
+        logger.info(f"终端后端: {_backend.name}")
+    return _backend
+
+
+# ── 兼容原 win32_api 的函数名，调用方只需改导入 ──────────────────
+def capture_window_screenshot(handle: int, max_w: int | None = 1280) -> bytes | None:
+    return backend().capture(handle, max_w)
+
+
+def get_window_title(handle: int) -> str:
+    return backend().get_title(handle)
+
+
+def send_keys_to_window(handle: int, text: str) -> bool:
+    return backend().send_text(handle, text)
+
+
+def send_raw_keys(handle: int, key_parts: list[str]) -> bool:
+    return backend().send_keys(handle, key_parts)
+
+
+def send_ctrl_c(handle: int) -> bool:
+    return backend().interrupt(handle)
+
+
+def send_ctrl_z(handle: int) -> bool:
+    return backend().undo(handle)
+
+
+def copy_image_to_clipboard(filepath: str) -> bool:
+    return backend().copy_image(filepath)
+
+
+def paste_image_to_window(handle: int) -> bool:
+    return backend().paste_image(handle)
+
+
+def get_clipboard_text() -> str:
+    return backend().get_clipboard()
+
+
+def set_clipboard_text(text: str) -> bool:
+    return backend().set_clipboard(text)
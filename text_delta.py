@@ -0,0 +1,66 @@
+"""终端文本增量: 每个窗口记住上次转发的内容，按行哈希对比，只发送新增的行。"""
+import difflib
+from collections import OrderedDict
+
+_MAX_WINDOWS = 32
+_MAX_LINES = 5000
+_FULL_RATIO = 0.8  # 新增部分超过全文 80% 时直接发全文
+
+_cursors = OrderedDict()  # key → {"hashes": [...], "full": str}
+
+
+def _hashes(lines: list[str]) -> list[int]:
+    return [hash(line.rstrip()) for line in lines]
+
+
+def delta(key, text: str, source: str = "") -> tuple[str, bool, int]:
+    """返回 (要发送的文本, 是否为增量, 省略的行数)，并把游标推进到 text。
+
+    用 SequenceMatcher 对比上次与本次的行哈希，取本次中新插入/替换的行；
+    终端底部重绘的输入框等不变的行会被识别为相同内容。来源 (transcript/uia) 变化时视为首次。
+    transcript 每次都是一条完整的新回复，不做行对比 (会误删与上条回复相同的空行、标题、代码)，
+    只有与上次完全相同时才省略。
+    """
+    lines = text.splitlines()[-_MAX_LINES:]
+    hashes = _hashes(lines)
+    prev = _cursors.get(key)
+    _cursors[key] = {"hashes": hashes, "full": text, "source": source}
+    _cursors.move_to_end(key)
+    while len(_cursors) > _MAX_WINDOWS:
+        _cursors.popitem(last=False)
+    if not prev or prev["source"] != source:
+        return text, False, 0
+    if source == "transcript":
+        if text == prev["full"]:
+            return "", True, len(lines)
+        return text, False, 0
+
+    sm = difflib.SequenceMatcher(None, prev["hashes"], hashes, autojunk=False)
+    picked = []
+    last_end = None
+    for tag, _, _, j1, j2 in sm.get_opcodes():
+        if tag not in ("insert", "replace"):
+            continue
+        block = lines[j1:j2]
+        if not any(l.strip() for l in block):
+            continue
+        if last_end is not None and j1 > last_end:
+            picked.append("⋯")
+        picked.extend(block)
+        last_end = j2
+    new_count = sum(1 for l in picked if l != "⋯")
+    if new_count >= len(lines) * _FULL_RATIO:
+        return text, False, 0
+    return "\n".join(picked).strip("\n"), True, len(lines) - new_count
+
+
+def full_text(key) -> str | None:
+    cur = _cursors.get(key)
+    return cur["full"] if cur else None
+
+
+def reset(key=None) -> None:
+    if key is None:
+        _cursors.clear()
+    else:
+        _cursors.pop(key, None)
@@ -0,0 +1,184 @@
+"""思考过程延时摄影: 缓存去重后的帧，结束时编码为一段动画（MP4/GIF/WebP）一次发送。"""
+import io
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import hashlib
+import logging
+import subprocess
+
+import config
+from config import state
+from eventlog import log_event
+
+logger = logging.getLogger("bedcode")
+
+_WIDTH = 960
+_FPS = 4
+
+
+class Timelapse:
+    """按帧预算保留均匀分布的帧: 超出预算时隔一帧丢一帧（保留首尾）。"""
+
+    def __init__(self, max_frames: int | None = None):
+        self.max_frames = max(2, max_frames or frame_budget())
+        self.frames = []  # [(时间戳, jpeg 字节)]
+        self.start = time.time()
+        self._last_hash = None
+        self._stride = 1   # 每 stride 个新帧收 1 个，丢帧后加倍，保持时间上均匀
+        self._skipped = 0
+        self._tail = None  # 最近一个被跳过的帧，保证动画以最终画面结束
+
+    def __len__(self) -> int:
+        return len(self.frames) + (1 if self._tail else 0)
+
+    def snapshot(self) -> list[tuple[float, bytes]]:
+        return self.frames + ([self._tail] if self._tail else [])
+
+    def add(self, img_data: bytes, ts: float | None = None) -> bool:
+        h = hashlib.md5(img_data).digest()
+        if h == self._last_hash:
+            return False
+        self._last_hash = h
+        self._skipped += 1
+        if self._skipped < self._stride:
+            self._tail = (ts or time.time(), img_data)
+            return False
+        self._skipped = 0
+        self._tail = None
+        self.frames.append((ts or time.time(), img_data))
+        if len(self.frames) >= self.max_frames:  # 给末尾帧留一个位置
+            self.frames = self.frames[:-1:2] + self.frames[-1:]
+            self._stride *= 2
+        return True
+
+    def reset(self) -> None:
+        self.__init__(self.max_frames)
+
+
+def frame_budget() -> int:
+    return state.get("timelapse_frames") or config.TIMELAPSE_MAX_FRAMES
+
+
+def _font():
+    from PIL import ImageFont
+    for name in ("consola.ttf", "DejaVuSansMono.ttf", "arial.ttf"):
+        try:
+            return ImageFont.truetype(name, 22)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _stamp(frames: list[tuple[float, bytes]], start: float):
+    """逐帧产出: 统一尺寸并在左上角加上 +MM:SS 时间戳。生成器，避免同时解码所有帧。"""
+    from PIL import Image, ImageDraw
+    font = _font()
+    size = None
+    for ts, data in frames:
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        if size is None:
+            w = min(_WIDTH, img.width) // 2 * 2  # H.264 需要偶数尺寸
+            size = (w, int(img.height * w / img.width) // 2 * 2)
+        img = img.resize(size)
+        draw = ImageDraw.Draw(img)
+        elapsed = int(ts - start)
+        label = f"+{elapsed // 60:02d}:{elapsed % 60:02d}"
+        draw.rectangle((0, 0, 12 + 14 * len(label), 34), fill=(0, 0, 0))
+        draw.text((6, 4), label, font=font, fill=(255, 210, 80))
+        yield img
+
+
+def _encode_mp4(tl: "Timelapse") -> bytes | None:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    images = _stamp(tl.snapshot(), tl.start)
+    first = next(images)
+    w, h = first.size
+    tmp = os.path.join(tempfile.gettempdir(), f"bedcode_timelapse_{os.getpid()}_{int(time.time())}.mp4")
+    try:
+        proc = subprocess.Popen(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+             "-s", f"{w}x{h}", "-r", str(_FPS), "-i", "-",
+             "-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "veryfast", "-crf", "28",
+             "-movflags", "+faststart", tmp],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            proc.stdin.write(first.tobytes())
+            for img in images:
+                proc.stdin.write(img.tobytes())
+            proc.stdin.close()
+            rc = proc.wait(timeout=120)
+        except Exception:
+            proc.kill()
+            raise
+        if rc != 0:
+            logger.warning(f"[延时] ffmpeg 退出码 {rc}")
+            return None
+        with open(tmp, "rb") as f:
+            return f.read()
+    except Exception as e:
+        logger.warning(f"[延时] ffmpeg 异常: {e}")
+        return None
+    finally:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def encode(tl: Timelapse) -> tuple[bytes, str] | None:
+    """编码为动画，返回 (数据, 扩展名)。CPU 密集，需在线程中调用。"""
+    if len(tl) < 2:
+        return None
+    fmt = config.TIMELAPSE_FORMAT
+    if fmt in ("auto", "mp4"):
+        data = _encode_mp4(tl)
+        if data:
+            return data, "mp4"
+    buf = io.BytesIO()
+    duration = int(1000 / _FPS)
+    if fmt == "webp":
+        images = list(_stamp(tl.snapshot(), tl.start))
+        images[0].save(buf, format="WEBP", save_all=True, append_images=images[1:],
+                       duration=duration, loop=0, quality=60)
+        return buf.getvalue(), "webp"
+    from PIL import Image
+    # GIF: 逐帧量化到自适应调色板，体积比直接保存小很多，内存也只占 1 字节/像素
+    pal = [img.quantize(colors=128, method=Image.Quantize.FASTOCTREE) for img in _stamp(tl.snapshot(), tl.start)]
+    pal[0].save(buf, format="GIF", save_all=True, append_images=pal[1:],
+                duration=duration, loop=0, optimize=True)
+    return buf.getvalue(), "gif"
+
+
+async def send_timelapse(tl: Timelapse, chat_id: int, bot) -> bool:
+    """编码并发送；帧数不足或失败时返回 False。"""
+    if len(tl) < 2:
+        return False
+    t0 = time.time()
+    try:
+        result = await asyncio.to_thread(encode, tl)
+    except Exception as e:
+        logger.warning(f"[延时] 编码失败: {e}")
+        return False
+    if not result:
+        return False
+    data, ext = result
+    span = int(tl.snapshot()[-1][0] - tl.start)
+    caption = f"🎞 思考过程 {len(tl)} 帧 · {span // 60}分{span % 60}秒"
+    filename = f"timelapse_{int(tl.start)}.{ext}"
+    try:
+        if ext == "webp":
+            await bot.send_document(chat_id=chat_id, document=data, filename=filename, caption=caption)
+        else:
+            await bot.send_animation(chat_id=chat_id, animation=data, filename=filename, caption=caption)
+    except Exception as e:
+        logger.warning(f"[延时] 发送失败: {e}")
+        return False
+    logger.info(f"[延时] {len(tl)} 帧 → {ext} {len(data) // 1024}KB ({time.time() - t0:.1f}s)")
+    log_event("timelapse", chat_id=chat_id, duration=time.time() - t0, size=len(data), frames=len(tl), fmt=ext)
+    return True
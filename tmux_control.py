@@ -0,0 +1,264 @@
+"""tmux 控制模式: 每个 tmux 会话挂一个 `tmux -C` 只读客户端，
+由 tmux 推送 %output / 标题变化，事件驱动地更新状态，代替每 5 秒轮询标题。
+
+事件 (ControlMonitor.events):
+  title     pane 标题变化 (OSC 0/2、%pane-title-changed 或订阅)，value 为新标题
+  quiet     pane 有输出后静默 QUIET 秒 (持续输出时每 MAX_BUSY 秒)，适合此时检查交互提示
+  sessions  会话/窗口增删或客户端退出，需要重新扫描
+"""
+import re
+import asyncio
+import logging
+from collections import namedtuple
+
+import config
+from terminal import backend, pane_handle
+
+logger = logging.getLogger("bedcode")
+
+Event = namedtuple("Event", "kind handle value")
+
+QUIET = 0.3       # 输出静默多久后发 quiet 事件
+MAX_BUSY = 1.0    # 连续输出时最长隔多久也发一次 quiet
+_TAIL = 8192      # 每个 pane 保留的去转义输出尾部
+_SUB = "bedcode"  # 标题订阅名
+_FAST_EXIT = 5.0  # 客户端接入后这么快就退出，视为接入失败，退避后再重连
+_BACKOFF_MAX = 60.0
+
+_OCTAL_RE = re.compile(rb"\\([0-7]{3})")
+_OSC_TITLE_RE = re.compile(r"\x1b\][02];([^\x07\x1b]*)(?:\x07|\x1b\\)")
+_ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[()][0-9A-Za-z]|\x1b[=>78]")
+_RESCAN = (b"%sessions-changed", b"%session-closed", b"%window-add", b"%window-close",
+           b"%unlinked-window-close", b"%window-renamed", b"%exit")
+
+
+def enabled() -> bool:
+    return config.TMUX_CONTROL and backend().name == "tmux"
+
+
+def _unescape(data: bytes) -> str:
+    """%output 中 ASCII 控制字符和反斜杠被转义为 \\ooo，其余字节原样 (UTF-8)。"""
+    return _OCTAL_RE.sub(lambda m: bytes([int(m.group(1), 8)]), data).decode("utf-8", errors="replace")
+
+
+class PaneBuffer:
+    """单个 pane 的推送状态: 最新标题 + 去掉控制序列后的输出尾部。"""
+
+    __slots__ = ("title", "tail", "_pending", "_quiet_handle", "_busy_since")
+
+    def __init__(self):
+        self.title = None
+        self.tail = ""
+        self._pending = ""  # 被截断在两条 %output 之间的转义序列
+        self._quiet_handle = None
+        self._busy_since = 0.0  # 本轮连续输出开始的时间
+
+    def feed(self, text: str) -> tuple[str | None, bool]:
+        """追加输出，返回 (其中最后一次设置的标题或 None, 是否有可见文本)。"""
+        text = self._pending + text
+        self._pending = ""
+        cut = text.rfind("\x1b")
+        if text.startswith("\x1b\\", cut):
+            cut = -1  # 以 ST 结尾，OSC 完整
+        if cut != -1 and len(text) - cut < 256 and not _ANSI_RE.match(text, cut):
+            text, self._pending = text[:cut], text[cut:]
+        titles = _OSC_TITLE_RE.findall(text)
+        visible = _ANSI_RE.sub("", text).replace("\r", "")
+        if visible:
+            self.tail = (self.tail + visible)[-_TAIL:]
+        return (titles[-1] if titles else None), bool(visible.strip())
+
+
+class _Client:
+    """一个 `tmux -C attach-session -r` 进程及其读取任务。"""
+
+    def __init__(self, monitor: "ControlMonitor", session: str):
+        self.monitor = monitor
+        self.session = session
+        self.proc = None
+        self.task = None
+        self.started = 0.0
+
+    async def start(self) -> None:
+        self.started = asyncio.get_running_loop().time()
+        self.proc = await asyncio.create_subprocess_exec(
+            *backend().base_cmd(), "-C", "attach-session", "-r", "-t", f"={self.session}",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self.task = asyncio.create_task(self._read())
+
+    def _command(self, line: str) -> None:
+        try:
+            self.proc.stdin.write(line.encode("utf-8") + b"\n")
+        except Exception:
+            pass
+
+    async def _read(self) -> None:
+        mon = self.monitor
+        try:
+            while True:
+                line = await self.proc.stdout.readline()
+                if not line:
+                    break
+                line = line.rstrip(b"\n")
+                if line.startswith(b"%output "):
+                    parts = line.split(b" ", 2)
+                    if len(parts) == 3:
+                        mon._on_output(pane_handle(parts[1].decode()), _unescape(parts[2]))
+                elif line.startswith(b"%pane-title-changed "):
+                    parts = line.decode("utf-8", errors="replace").split(" ", 2)
+                    if len(parts) == 3:
+                        mon._on_title(pane_handle(parts[1]), parts[2])
+                elif line.startswith(b"%subscription-changed "):
+                    # %subscription-changed 名称 $会话 @窗口 序号 %pane ... : 值
+                    head, _, value = line.decode("utf-8", errors="replace").partition(" : ")
+                    parts = head.split()
+                    if len(parts) >= 6 and parts[1] == _SUB and parts[5].startswith("%"):
+                        mon._on_title(pane_handle(parts[5]), value)
+                elif line.startswith(b"%session-changed"):
+                    # 客户端已接入: 不影响窗口尺寸，并订阅所有 pane 的标题 (tmux 3.2+，旧版本报错忽略)
+                    self._command("refresh-client -f ignore-size")
+                    self._command(f"refresh-client -B '{_SUB}:%*:#{{pane_title}}'")
+                    await self.proc.stdin.drain()
+                if line.startswith(_RESCAN):
+                    mon.emit("sessions", 0, self.session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[tmux -C] {self.session} 读取异常: {e}")
+        finally:
+            owned = mon._clients.get(self.session) is self  # 否则是 sync/close 主动停止的
+            if owned:
+                del mon._clients[self.session]
+            loop = asyncio.get_running_loop()
+            if owned and loop.time() - self.started < _FAST_EXIT:
+                # 会话不可接入时 attach 立即退出，马上重连会空转: 退避后再触发重新扫描
+                loop.call_later(mon._defer(self.session), mon.emit, "sessions", 0, self.session)
+            else:
+                mon._retry.pop(self.session, None)
+                mon.emit("sessions", 0, self.session)
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+        if self.proc and self.proc.returncode is None:
+            try:
+                self._command("detach-client")
+                self.proc.stdin.close()
+                await asyncio.wait_for(self.proc.wait(), 2)
+            except Exception:
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    pass
+
+
+class ControlMonitor:
+    """管理各会话的控制客户端，把推送汇总成 Event 队列，并缓存各 pane 的标题与输出尾部。"""
+
+    def __init__(self):
+        self.events = asyncio.Queue()
+        self.panes = {}     # handle → PaneBuffer
+        self._clients = {}  # 会话名 → _Client
+        self._retry = {}    # 会话名 → (退避秒数, 最早可重连的 loop 时间)
+
+    def _pane(self, handle: int) -> PaneBuffer:
+        pb = self.panes.get(handle)
+        if pb is None:
+            pb = self.panes[handle] = PaneBuffer()
+        return pb
+
+    def emit(self, kind: str, handle: int, value=None) -> None:
+        """入队一个事件；监控循环也用它投递延迟确认等合成事件。"""
+        self.events.put_nowait(Event(kind, handle, value))
+
+    def _on_title(self, handle: int, title: str) -> None:
+        pb = self._pane(handle)
+        if title != pb.title:
+            pb.title = title
+            self.emit("title", handle, title)
+
+    def _on_output(self, handle: int, text: str) -> None:
+        pb = self._pane(handle)
+        title, visible = pb.feed(text)
+        if title is not None:
+            self._on_title(handle, title)
+        if not visible:  # 只改标题/光标的输出 (如 spinner) 不算活动
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if pb._quiet_handle:
+            pb._quiet_handle.cancel()
+        elif not pb._busy_since:
+            pb._busy_since = now
+        if now - pb._busy_since >= MAX_BUSY:
+            # 持续输出 (如计时动画) 时也定期发一次，免得提示一直等不到静默
+            pb._busy_since = now
+            self.emit("quiet", handle)
+        pb._quiet_handle = loop.call_later(QUIET, self._on_quiet, handle)
+
+    def _on_quiet(self, handle: int) -> None:
+        pb = self.panes.get(handle)
+        if pb:
+            pb._quiet_handle = None
+            pb._busy_since = 0.0
+        self.emit("quiet", handle)
+
+    def title(self, handle: int) -> str | None:
+        pb = self.panes.get(handle)
+        return pb.title if pb else None
+
+    def tail(self, handle: int) -> str:
+        pb = self.panes.get(handle)
+        return pb.tail if pb else ""
+
+    def prune(self, live: set[int]) -> None:
+        """丢弃已不是 Claude 窗口的 pane 缓存。"""
+        for h in list(self.panes):
+            if h not in live:
+                pb = self.panes.pop(h)
+                if pb._quiet_handle:
+                    pb._quiet_handle.cancel()
+
+    def _defer(self, session: str) -> float:
+        """记录一次接入失败，返回本次退避秒数 (1, 2, 4 … 最多 _BACKOFF_MAX)。"""
+        delay = min(self._retry.get(session, (0.5, 0))[0] * 2, _BACKOFF_MAX)
+        self._retry[session] = (delay, asyncio.get_running_loop().time() + delay)
+        return delay
+
+    @property
+    def attached(self) -> int:
+        return len(self._clients)
+
+    async def sync(self) -> None:
+        """每个 tmux 会话挂一个客户端 (含非 Claude 会话，才能收到新建窗口/新启动 claude 的通知)。
+        新客户端订阅后 tmux 会推送各 pane 的当前标题。"""
+        sessions = set(await asyncio.to_thread(backend().session_names))
+        for name in list(self._clients):
+            if name not in sessions:
+                await self._clients.pop(name).stop()
+        for name in list(self._retry):
+            if name not in sessions:
+                del self._retry[name]
+        now = asyncio.get_running_loop().time()
+        for name in sessions - set(self._clients):
+            if name in self._retry and now < self._retry[name][1]:
+                continue  # 仍在退避中，到期后会再发 sessions 事件
+            client = _Client(self, name)
+            try:
+                await client.start()
+            except Exception as e:
+                logger.warning(f"[tmux -C] 无法接入会话 {name}: {e}")
+                asyncio.get_running_loop().call_later(self._defer(name), self.emit, "sessions", 0, name)
+                continue
+            self._clients[name] = client
+            logger.info(f"[tmux -C] 已接入会话 {name}")
+
+    async def close(self) -> None:
+        for client in list(self._clients.values()):
+            await client.stop()
+        self._clients.clear()
+        for pb in self.panes.values():
+            if pb._quiet_handle:
+                pb._quiet_handle.cancel()
@@ -0,0 +1,142 @@
+"""外部工具路径探测 (Git Bash、git)，结果缓存到 tool_paths.json。
+
+探测可能要逐个检查候选路径甚至调用 `where`，只在首次使用时做一次；之后启动只校验
+缓存的文件仍然存在、相关环境变量没变，否则重新探测。未找到的工具也缓存一天
+(/reload 时清掉)，免得每次重启都重新探测。
+
+探测会阻塞，事件循环里用 git_bash_async() / git_async()；bot 启动后 warm() 在线程里先解析好。
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import subprocess
+
+import config
+
+logger = logging.getLogger("bedcode")
+
+_GIT_BASH_DEFAULT = r"C:\Program Files\Git\bin\bash.exe"
+_MISSING_TTL = 86400  # 未找到的结果缓存多久
+
+_cache = None   # 磁盘缓存: 名称 → {"path", "env"}
+_resolved = {}  # 本进程已确认的结果
+
+
+def _load() -> dict:
+    global _cache
+    if _cache is None:
+        try:
+            with open(config.TOOL_PATHS_FILE, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save(cache: dict) -> None:
+    try:
+        with open(config.TOOL_PATHS_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        logger.warning(f"保存工具路径缓存失败: {e}")
+
+
+def _store(name: str, path: str | None, env: str) -> None:
+    cache = _load()
+    cache[name] = {"path": path or "", "env": env, "ts": int(time.time())}
+    _save(cache)
+
+
+def _resolve(name: str, env_var: str, probe) -> str | None:
+    """先查进程内结果，再查磁盘缓存 (文件存在且环境变量未变才有效)，最后调用 probe 探测。"""
+    if name in _resolved:
+        return _resolved[name]
+    env = os.environ.get(env_var, "") if env_var else ""
+    entry = _load().get(name)
+    if entry and entry.get("env", "") == env and os.path.isfile(entry.get("path", "")):
+        path = entry["path"]
+    elif entry and entry.get("env", "") == env and not entry.get("path") \
+            and time.time() - entry.get("ts", 0) < _MISSING_TTL:
+        path = None
+    else:
+        path = probe(env)
+        _store(name, path, env)
+    _resolved[name] = path
+    return path
+
+
+def _probe_git_bash(env_path: str) -> str | None:
+    if env_path and os.path.isfile(env_path):
+        return env_path
+    candidates = [
+        _GIT_BASH_DEFAULT,
+        r"C:\Program Files (x86)\Git\bin\bash.exe",
+        os.path.expandvars(r"%LOCALAPPDATA%\Programs\Git\bin\bash.exe"),
+    ]
+    for c in candidates:
+        if os.path.isfile(c):
+            return c
+    try:
+        result = subprocess.run(
+            ["where", "bash"], capture_output=True, text=True, timeout=5,
+        )
+        for line in result.stdout.strip().splitlines():
+            if "git" in line.lower() and os.path.isfile(line.strip()):
+                return line.strip()
+    except Exception:
+        pass
+    return None
+
+
+def git_bash() -> str:
+    """Git Bash 路径；找不到时返回默认安装路径。"""
+    if "git_bash" not in _resolved:
+        path = _resolve("git_bash", "GIT_BASH_PATH", _probe_git_bash)
+        if path:
+            logger.info(f"Git Bash: {path}")
+        else:
+            logger.warning("未找到 Git Bash，使用默认路径")
+    return _resolved["git_bash"] or _GIT_BASH_DEFAULT
+
+
+def _probe_git(_env: str) -> str | None:
+    found = shutil.which("git")
+    if found:
+        return found
+    # Git for Windows: Git\bin\bash.exe 旁边就是 git.exe
+    candidate = os.path.join(os.path.dirname(git_bash()), "git.exe")
+    return candidate if os.path.isfile(candidate) else None
+
+
+def git() -> str:
+    return _resolve("git", "", _probe_git) or "git"
+
+
+async def git_bash_async() -> str:
+    return git_bash() if "git_bash" in _resolved else await asyncio.to_thread(git_bash)
+
+
+async def git_async() -> str:
+    return git() if "git" in _resolved else await asyncio.to_thread(git)
+
+
+def warm() -> None:
+    """在线程里调用: 启动后预先解析，第一条命令不用等探测。"""
+    git_bash()
+    git()
+
+
+def clear() -> None:
+    """丢弃缓存 (/reload 后环境变量可能已变或刚装好工具，下次使用时重新校验/探测)。"""
+    global _cache
+    _cache = None
+    _resolved.clear()
+    cache = _load()
+    missing = [name for name, entry in cache.items() if not entry.get("path")]
+    if missing:
+        for name in missing:
+            del cache[name]
+        _save(cache)
@@ -1,19 +1,28 @@
 """工具函数: 文本分割、结果发送、文件保存、路径持久化。"""
+import io
 import os
+import gzip
 import json
 import re
 import time
 import html
 import asyncio
 import logging
+import zipfile
+import hashlib
+import threading
 from pathlib import Path
 
 from telegram import InlineKeyboardButton
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+import config
 from config import state, LABELS_FILE, RECENT_DIRS_FILE, TEMPLATES_FILE, PANEL_FILE, ALIASES_FILE, STATE_FILE
-from win32_api import get_window_title
+from terminal import get_window_title
 from claude_detect import find_claude_windows
+from render import render_html_chunks
+from eventlog import log_event
 
 logger = logging.getLogger("bedcode")
 
@@ -22,95 +31,124 @@ IMG_DIR = os.path.join(_BASE_DIR, "images")
 os.makedirs(IMG_DIR, exist_ok=True)
 MSG_DIR = os.path.join(_BASE_DIR, "messages")
 os.makedirs(MSG_DIR, exist_ok=True)
+SHELL_DIR = os.path.join(_BASE_DIR, "shell_logs")
+os.makedirs(SHELL_DIR, exist_ok=True)
+VOICE_DIR = os.path.join(_BASE_DIR, "voices")
+os.makedirs(VOICE_DIR, exist_ok=True)
 
 _UNSAFE_CHARS = set('{}"$\\')
 
 
-def split_text(text: str, max_len: int = 3500) -> list[str]:
-    if len(text) <= max_len:
-        return [text]
-    chunks = []
-    while text:
-        if len(text) <= max_len:
-            chunks.append(text)
-            break
-        idx = text.rfind("\n", 0, max_len)
-        if idx == -1:
-            idx = max_len
-        chunks.append(text[:idx])
-        text = text[idx:].lstrip("\n")
-    return chunks
-
-
-def _md_table_to_text(text: str) -> str:
-    """Convert markdown tables to plain text for Telegram display."""
-    lines = text.split("\n")
-    result = []
-    table_lines = []
-
-    def _flush_table():
-        if not table_lines:
-            return
-        # Parse rows
-        rows = []
-        for tl in table_lines:
-            cells = [c.strip() for c in tl.strip().strip("|").split("|")]
-            rows.append(cells)
-        # Remove separator row (---|----|---)
-        rows = [r for r in rows if not all(re.match(r'^[-:]+$', c) for c in r)]
-        if not rows:
-            return
-        # Calculate column widths
-        ncols = max(len(r) for r in rows)
-        widths = [0] * ncols
-        for r in rows:
-            for i, c in enumerate(r):
-                if i < ncols:
-                    widths[i] = max(widths[i], len(c))
-        # Format
-        for i, r in enumerate(rows):
-            parts = []
-            for j in range(ncols):
-                cell = r[j] if j < len(r) else ""
-                parts.append(cell.ljust(widths[j]))
-            result.append("  ".join(parts).rstrip())
-            if i == 0:
-                result.append("  ".join("-" * w for w in widths))
-
-    for line in lines:
-        if "|" in line and line.strip().startswith("|"):
-            table_lines.append(line)
-        else:
-            _flush_table()
-            table_lines = []
-            result.append(line)
-    _flush_table()
-    return "\n".join(result)
+# ── 长输出以文件发送 ──────────────────────────────────────────────
+_ZIP_MAX = 8 * 1024 * 1024  # 手机可直接打开 zip；更大的输出用 gzip 压得更省
+_PREVIEW_CHARS = 400
+
+
+def _output_limits(chat_id: int) -> tuple[int, int]:
+    """返回 (转文件阈值字符数, 纯文本附件最大字节数)，支持按 chat 覆盖。"""
+    custom = state.get("output_limits", {}).get(chat_id, {})
+    return (
+        custom.get("doc", config.OUTPUT_DOC_THRESHOLD),
+        custom.get("plain", config.OUTPUT_PLAIN_MAX),
+    )
+
+
+def _fmt_size(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def _pack_output(data: bytes, stem: str, plain_max: int) -> tuple[bytes, str]:
+    """按大小选择附件格式: 纯文本 → zip → gzip。"""
+    if len(data) <= plain_max:
+        return data, f"{stem}.txt"
+    if len(data) <= _ZIP_MAX:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(f"{stem}.txt", data)
+        return buf.getvalue(), f"{stem}.zip"
+    return gzip.compress(data, compresslevel=6), f"{stem}.txt.gz"
+
+
+def _head_tail_preview(text: str, n: int = _PREVIEW_CHARS) -> str:
+    if len(text) <= n * 2:
+        return text
+    head = text[:n]
+    tail = text[-n:]
+    # 尽量在行边界截断
+    cut = head.rfind("\n")
+    if cut > n // 2:
+        head = head[:cut]
+    cut = tail.find("\n")
+    if 0 <= cut < n // 2:
+        tail = tail[cut + 1:]
+    omitted = text.count("\n", len(head), len(text) - len(tail))
+    return f"{head}\n… 省略 {omitted} 行 …\n{tail}"
+
+
+async def send_output_document(
+    chat_id: int, data: bytes, stem: str, context: ContextTypes.DEFAULT_TYPE,
+    caption: str = "", preview: str | None = None,
+) -> None:
+    """一次上传发送长输出：附件 + caption 中的首尾预览。"""
+    _, plain_max = _output_limits(chat_id)
+    payload, filename = await asyncio.to_thread(_pack_output, data, stem, plain_max)
+    info = f"📄 {caption + ' · ' if caption else ''}{_fmt_size(len(data))}"
+    if len(payload) != len(data):
+        info += f" → {_fmt_size(len(payload))}"
+    text = html.escape(info)
+    if preview and preview.strip():
+        text += f"\n<pre>{html.escape(preview)}</pre>"
+    await context.bot.send_document(
+        chat_id=chat_id, document=payload, filename=filename,
+        caption=text, parse_mode="HTML",
+    )
+
+
+async def send_output_file(chat_id: int, path: str, stem: str, context: ContextTypes.DEFAULT_TYPE, caption: str = "") -> None:
+    def _read():
+        with open(path, "rb") as f:
+            return f.read()
+    data = await asyncio.to_thread(_read)
+    text = data.decode("utf-8", errors="replace")
+    await send_output_document(chat_id, data, stem, context, caption, _head_tail_preview(text))
 
 
 async def send_result(chat_id: int, text: str, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not text.strip():
         text = "(空输出)"
-    text = _md_table_to_text(text)
-    chunks = split_text(text)
-    for i, chunk in enumerate(chunks):
-        md_prefix = f"**[{i+1}/{len(chunks)}]**\n" if len(chunks) > 1 else ""
-        html_prefix = f"<b>[{i+1}/{len(chunks)}]</b>\n" if len(chunks) > 1 else ""
+    doc_threshold, _ = _output_limits(chat_id)
+    if len(text) > doc_threshold:
+        lines = text.count("\n") + 1
         try:
-            await context.bot.send_message(
-                chat_id=chat_id, text=f"{md_prefix}{chunk}", parse_mode="Markdown",
+            await send_output_document(
+                chat_id, text.encode("utf-8"), f"output_{int(time.time())}", context,
+                caption=f"{lines} 行", preview=_head_tail_preview(text),
             )
-        except Exception:
-            safe = html.escape(chunk)
+            log_event("send.result", chat_id=chat_id, size=len(text), mode="document")
+            return
+        except Exception as e:
+            logger.warning(f"长输出文件发送失败，改为分段发送: {e}")
+    chunks = render_html_chunks(text)
+    log_event("send.result", chat_id=chat_id, size=len(text), mode="html", chunks=len(chunks))
+    for i, chunk in enumerate(chunks):
+        prefix = f"<b>[{i+1}/{len(chunks)}]</b>\n" if len(chunks) > 1 else ""
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=f"{prefix}{chunk}", parse_mode="HTML")
+        except BadRequest as e:
+            # 渲染结果理应总是合法 HTML，这里只做兜底
+            logger.warning(f"HTML 分段被拒绝，改发纯文本: {e}")
+            plain = html.unescape(re.sub(r"<[^>]+>", "", chunk))
+            plain_prefix = f"[{i+1}/{len(chunks)}]\n" if len(chunks) > 1 else ""
             try:
-                await context.bot.send_message(
-                    chat_id=chat_id, text=f"{html_prefix}<pre>{safe}</pre>", parse_mode="HTML",
-                )
+                await context.bot.send_message(chat_id=chat_id, text=f"{plain_prefix}{plain}"[:4096])
             except Exception:
-                try:
-                    await context.bot.send_message(chat_id=chat_id, text=f"{html_prefix}{chunk}")
-                except Exception:
-                    pass
+                pass
+        except Exception as e:
+            logger.warning(f"发送结果失败: {e}")
 
 
 async def _get_handle() -> int | None:
@@ -248,14 +286,41 @@ def _needs_file(text: str) -> bool:
     return bool(_UNSAFE_CHARS & set(text))
 
 
+_SPOOL_RE = re.compile(re.escape(MSG_DIR) + r"[\\/][0-9a-f]{2}[\\/][0-9a-f]{16}\.md")
+
+
+def _msg_file_path(text: str) -> str:
+    """内容寻址路径 messages/ab/abcdef0123456789.md，相同内容总是同一个文件。"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return os.path.join(MSG_DIR, digest[:2], f"{digest[:16]}.md")
+
+
 def _save_msg_file(text: str) -> str:
-    ts = int(time.time())
-    filepath = os.path.join(MSG_DIR, f"msg_{ts}.md")
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(text)
+    """保存长消息并返回路径；内容已存在时只刷新使用时间。同步 IO，需在线程中调用。"""
+    filepath = _msg_file_path(text)
+    data = text.encode("utf-8")
+    try:
+        if os.path.getsize(filepath) == len(data):
+            os.utime(filepath)  # 刷新 LRU，避免被存储回收
+            return filepath
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    tmp = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, filepath)  # 原子替换，读者不会看到写了一半的文件
     return filepath
 
 
+def _spool_refs(queue) -> set[str]:
+    """队列中引用到的长消息文件路径。"""
+    refs = set()
+    for item in queue:
+        refs.update(_SPOOL_RE.findall(item))
+    return refs
+
+
 def _save_state():
     """Persist selected state fields to disk."""
     data = {
@@ -269,6 +334,11 @@ def _save_state():
         "cwd": state.get("cwd", ""),
         "chat_id": state.get("chat_id"),
         "stream_mode": state.get("stream_mode", False),
+        "shell_persistent": state.get("shell_persistent", False),
+        "timelapse": state.get("timelapse", False),
+        "timelapse_frames": state.get("timelapse_frames", 0),
+        "output_limits": {str(k): v for k, v in state.get("output_limits", {}).items()},
+        "session_bases": state.get("session_bases", {}),
     }
     try:
         with open(STATE_FILE, "w", encoding="utf-8") as f:
@@ -286,10 +356,13 @@ def _load_state():
             data = json.load(f)
         costs = data.get("session_costs", {})
         state["session_costs"] = {int(k): v for k, v in costs.items()}
-        for key in ("auto_monitor", "auto_yes", "auto_pin", "stream_mode"):
+        limits = data.get("output_limits", {})
+        state["output_limits"] = {int(k): v for k, v in limits.items()}
+        state["session_bases"] = data.get("session_bases", {})
+        for key in ("auto_monitor", "auto_yes", "auto_pin", "stream_mode", "shell_persistent", "timelapse"):
             if key in data:
                 state[key] = data[key]
-        for key in ("quiet_start", "quiet_end", "screenshot_interval", "cwd", "chat_id"):
+        for key in ("quiet_start", "quiet_end", "screenshot_interval", "cwd", "chat_id", "timelapse_frames"):
             if key in data and data[key] is not None:
                 state[key] = data[key]
     except Exception as e:
@@ -0,0 +1,426 @@
+"""虚拟终端屏幕: 把 VT/ANSI 字节流解析成内存中的字符网格 + 回滚缓冲。
+
+只实现 Claude Code (Ink) 和常见 CLI 用到的子集: 光标移动、清屏/清行、插入/删除行列、
+滚动区域、SGR 颜色 (16/256/真彩色)、备用屏幕、标题 OSC，以及光标位置/设备属性查询应答。
+每个格子是 (字符, 样式)，宽字符占两格 (第二格为 "")；dirty 记录自上次渲染以来变化的行。
+"""
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# 样式: (前景, 背景, 标志)。颜色为 None(默认) / 0-255 调色板序号 / (r, g, b)
+BOLD, DIM, ITALIC, UNDERLINE, INVERSE = 1, 2, 4, 8, 16
+DEFAULT_STYLE = (None, None, 0)
+BLANK = (" ", DEFAULT_STYLE)
+
+_PRINTABLE_RE = re.compile(r"[^\x00-\x1f\x7f-\x9f]+")
+_CSI_RE = re.compile(r"\x1b\[([0-?]*)([ -/]*)([@-~])")
+_OSC_RE = re.compile(r"\x1b\]([^\x07\x1b]*)(?:\x07|\x1b\\)")
+_STRING_RE = re.compile(r"\x1b[P^_X].*?(?:\x07|\x1b\\)", re.S)  # DCS/PM/APC/SOS，忽略
+_CHARSET_RE = re.compile(r"\x1b[()*+#%].")
+_ESC_RE = re.compile(r"\x1b[ -~]")
+_INCOMPLETE_RE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|[\]P^_X][^\x07]*|[()*+#%])?\Z", re.S)
+_SGR_FLAGS = {1: BOLD, 2: DIM, 3: ITALIC, 4: UNDERLINE, 7: INVERSE}
+_SGR_CLEAR = {22: BOLD | DIM, 23: ITALIC, 24: UNDERLINE, 27: INVERSE}
+
+
+@lru_cache(maxsize=4096)
+def char_width(ch: str) -> int:
+    if ord(ch) < 0x300:
+        return 1
+    if unicodedata.combining(ch) or ch in "\u200b\u200c\u200d\ufe0f":
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+
+class Screen:
+    def __init__(self, cols: int = 120, rows: int = 40, scrollback: int = 5000):
+        self.cols = cols
+        self.rows = rows
+        self.history = deque(maxlen=scrollback)  # 滚出屏幕顶部的行 (已转为字符串)
+        self.title = ""
+        self.bracketed_paste = False
+        self.cursor_visible = True
+        self.responses = []  # 需要写回程序的应答 (DSR/DA/颜色查询)，由调用方取走
+        self.dirty = set(range(rows))
+        self._pending = ""
+        self._reset_state()
+        self.buffer = self._blank_buffer()
+        self._main = None  # 切到备用屏幕时保存的主屏幕
+
+    def _reset_state(self) -> None:
+        self.x = self.y = 0
+        self.style = DEFAULT_STYLE
+        self.top, self.bottom = 0, self.rows - 1
+        self.autowrap = True
+        self._wrap_next = False
+        self._saved = (0, 0, DEFAULT_STYLE)
+
+    def _blank_row(self) -> list:
+        return [BLANK] * self.cols
+
+    def _blank_buffer(self) -> list:
+        return [self._blank_row() for _ in range(self.rows)]
+
+    # ── 输入 ────────────────────────────────────────────────────
+    def feed(self, data: str) -> None:
+        if self._pending:
+            data = self._pending + data
+            self._pending = ""
+        i, n = 0, len(data)
+        while i < n:
+            m = _PRINTABLE_RE.match(data, i)
+            if m:
+                self._print(m.group())
+                i = m.end()
+                continue
+            ch = data[i]
+            if ch != "\x1b":
+                self._control(ch)
+                i += 1
+                continue
+            m = _CSI_RE.match(data, i)
+            if m:
+                self._csi(m.group(1), m.group(2), m.group(3))
+            else:
+                m = _OSC_RE.match(data, i)
+                if m:
+                    self._osc(m.group(1))
+                else:
+                    m = _STRING_RE.match(data, i) or _CHARSET_RE.match(data, i)
+                    if not m:
+                        if _INCOMPLETE_RE.match(data, i) and n - i < 65536:
+                            self._pending = data[i:]  # 序列被分在两次 read 之间
+                            return
+                        m = _ESC_RE.match(data, i)
+                        if m:
+                            self._esc(m.group()[1])
+                        else:
+                            i += 1
+                            continue
+            i = m.end()
+
+    def _control(self, ch: str) -> None:
+        if ch == "\r":
+            self.x = 0
+            self._wrap_next = False
+        elif ch in "\n\x0b\x0c":
+            self._index()
+        elif ch == "\b":
+            self.x = max(0, min(self.x, self.cols - 1) - 1)
+            self._wrap_next = False
+        elif ch == "\t":
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+        # BEL 及其他 C0/C1 控制字符忽略
+
+    def _print(self, text: str) -> None:
+        style = self.style
+        if text.isascii():
+            # 快速路径: 按行切片写入
+            while text:
+                if self._wrap_next:
+                    self._newline_wrap()
+                row = self.buffer[self.y]
+                room = self.cols - self.x
+                chunk, text = text[:room], text[room:]
+                row[self.x:self.x + len(chunk)] = [(c, style) for c in chunk]
+                self.dirty.add(self.y)
+                self.x += len(chunk)
+                if self.x >= self.cols:
+                    self.x = self.cols - 1
+                    self._wrap_next = self.autowrap
+            return
+        for c in text:
+            w = char_width(c)
+            if w == 0:
+                px = self.x - 1 if not self._wrap_next else self.x
+                row = self.buffer[self.y]
+                if 0 <= px < self.cols and row[px][0]:
+                    row[px] = (row[px][0] + c, row[px][1])
+                continue
+            if self._wrap_next or (w == 2 and self.x == self.cols - 1):
+                if self._wrap_next or self.autowrap:
+                    self._newline_wrap()
+            row = self.buffer[self.y]
+            row[self.x] = (c, style)
+            if w == 2 and self.x + 1 < self.cols:
+                row[self.x + 1] = ("", style)
+            self.dirty.add(self.y)
+            self.x += w
+            if self.x >= self.cols:
+                self.x = self.cols - 1
+                self._wrap_next = self.autowrap
+
+    def _newline_wrap(self) -> None:
+        self._wrap_next = False
+        self.x = 0
+        self._index()
+
+    # ── 滚动 ────────────────────────────────────────────────────
+    def _index(self) -> None:
+        if self.y == self.bottom:
+            self.scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _reverse_index(self) -> None:
+        if self.y == self.top:
+            self.scroll_down(1)
+        elif self.y > 0:
+            self.y -= 1
+
+    def scroll_up(self, n: int = 1) -> None:
+        for _ in range(min(n, self.bottom - self.top + 1)):
+            line = self.buffer.pop(self.top)
+            if self.top == 0 and self._main is None:
+                self.history.append(_row_text(line))
+            self.buffer.insert(self.bottom, self._blank_row())
+        self.dirty.update(range(self.top, self.bottom + 1))
+
+    def scroll_down(self, n: int = 1) -> None:
+        for _ in range(min(n, self.bottom - self.top + 1)):
+            self.buffer.pop(self.bottom)
+            self.buffer.insert(self.top, self._blank_row())
+        self.dirty.update(range(self.top, self.bottom + 1))
+
+    # ── 转义序列 ────────────────────────────────────────────────
+    def _esc(self, c: str) -> None:
+        if c == "7":
+            self._saved = (self.x, self.y, self.style)
+        elif c == "8":
+            self.x, self.y, self.style = self._saved
+            self._wrap_next = False
+        elif c == "D":
+            self._index()
+        elif c == "M":
+            self._reverse_index()
+        elif c == "E":
+            self.x = 0
+            self._index()
+        elif c == "c":
+            self._main = None
+            self._reset_state()
+            self.buffer = self._blank_buffer()
+            self.dirty.update(range(self.rows))
+
+    def _osc(self, body: str) -> None:
+        code, _, arg = body.partition(";")
+        if code in ("0", "2"):
+            self.title = arg
+        elif code in ("10", "11") and arg == "?":
+            rgb = "cccc/cccc/cccc" if code == "10" else "0c0c/0c0c/0c0c"
+            self.responses.append(f"\x1b]{code};rgb:{rgb}\x1b\\")
+
+    def _csi(self, params: str, inter: str, final: str) -> None:
+        private = params[:1] in ("?", ">", "<", "=")
+        if private:
+            marker, params = params[0], params[1:]
+        args = [int(p) if p.isdigit() else 0 for p in params.replace(":", ";").split(";")] if params else []
+
+        def arg(i: int = 0, default: int = 1) -> int:
+            v = args[i] if i < len(args) else 0
+            return v or default
+
+        if private:
+            if final in "hl" and marker == "?":
+                self._mode(args, final == "h")
+            elif final == "c" and marker == ">":
+                self.responses.append("\x1b[>0;10;1c")
+            return
+        if inter:
+            return
+        self._wrap_next = False
+        if final == "m":
+            self._sgr(args or [0])
+        elif final in "AFk":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - arg())
+            if final == "F":
+                self.x = 0
+        elif final in "BEe":
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + arg())
+            if final == "E":
+                self.x = 0
+        elif final in "Ca":
+            self.x = min(self.cols - 1, self.x + arg())
+        elif final == "D":
+            self.x = max(0, min(self.x, self.cols - 1) - arg())
+        elif final in "G`":
+            self.x = min(self.cols - 1, arg() - 1)
+        elif final == "d":
+            self.y = min(self.rows - 1, arg() - 1)
+        elif final in "Hf":
+            self.y = min(self.rows - 1, arg(0) - 1)
+            self.x = min(self.cols - 1, arg(1) - 1)
+        elif final == "J":
+            self._erase_display(arg(0, 0))
+        elif final == "K":
+            self._erase_line(arg(0, 0))
+        elif final == "X":
+            row = self.buffer[self.y]
+            end = min(self.cols, self.x + arg())
+            row[self.x:end] = [BLANK] * (end - self.x)
+            self.dirty.add(self.y)
+        elif final == "@":
+            row = self.buffer[self.y]
+            n = min(arg(), self.cols - self.x)
+            row[self.x:self.x] = [BLANK] * n
+            del row[self.cols:]
+            self.dirty.add(self.y)
+        elif final == "P":
+            row = self.buffer[self.y]
+            n = min(arg(), self.cols - self.x)
+            del row[self.x:self.x + n]
+            row.extend([BLANK] * n)
+            self.dirty.add(self.y)
+        elif final in "LM":
+            if self.top <= self.y <= self.bottom:
+                saved_top, self.top = self.top, self.y
+                (self.scroll_down if final == "L" else self.scroll_up)(arg())
+                self.top = saved_top
+                self.x = 0
+        elif final == "S":
+            self.scroll_up(arg())
+        elif final == "T":
+            self.scroll_down(arg())
+        elif final == "r":
+            top, bottom = arg(0) - 1, arg(1, self.rows) - 1
+            if 0 <= top < bottom < self.rows:
+                self.top, self.bottom = top, bottom
+                self.x = self.y = 0
+        elif final == "s":
+            self._saved = (self.x, self.y, self.style)
+        elif final == "u":
+            self.x, self.y, self.style = self._saved
+        elif final == "n":
+            if arg(0, 0) == 6:
+                self.responses.append(f"\x1b[{self.y + 1};{self.x + 1}R")
+            elif arg(0, 0) == 5:
+                self.responses.append("\x1b[0n")
+        elif final == "c":
+            self.responses.append("\x1b[?62;22c")
+
+    def _mode(self, args: list[int], on: bool) -> None:
+        for a in args:
+            if a in (1049, 1047, 47):
+                self._alt_screen(on, save_cursor=a == 1049)
+            elif a == 25:
+                self.cursor_visible = on
+            elif a == 2004:
+                self.bracketed_paste = on
+            elif a == 7:
+                self.autowrap = on
+
+    def _alt_screen(self, on: bool, save_cursor: bool) -> None:
+        if on and self._main is None:
+            if save_cursor:
+                self._saved = (self.x, self.y, self.style)
+            self._main = self.buffer
+            self.buffer = self._blank_buffer()
+        elif not on and self._main is not None:
+            self.buffer, self._main = self._main, None
+            if save_cursor:
+                self.x, self.y, self.style = self._saved
+        self.dirty.update(range(self.rows))
+
+    def _erase_display(self, mode: int) -> None:
+        if mode == 0:
+            self._erase_line(0)
+            rows = range(self.y + 1, self.rows)
+        elif mode == 1:
+            self._erase_line(1)
+            rows = range(0, self.y)
+        else:
+            rows = range(self.rows)
+            if mode == 3:
+                self.history.clear()
+        for r in rows:
+            self.buffer[r] = self._blank_row()
+        self.dirty.update(rows)
+
+    def _erase_line(self, mode: int) -> None:
+        row = self.buffer[self.y]
+        x = min(self.x, self.cols - 1)
+        if mode == 0:
+            row[x:] = [BLANK] * (self.cols - x)
+        elif mode == 1:
+            row[:x + 1] = [BLANK] * (x + 1)
+        else:
+            row[:] = self._blank_row()
+        self.dirty.add(self.y)
+
+    def _sgr(self, args: list[int]) -> None:
+        fg, bg, flags = self.style
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a == 0:
+                fg, bg, flags = DEFAULT_STYLE
+            elif a in _SGR_FLAGS:
+                flags |= _SGR_FLAGS[a]
+            elif a in _SGR_CLEAR:
+                flags &= ~_SGR_CLEAR[a]
+            elif 30 <= a <= 37:
+                fg = a - 30
+            elif 90 <= a <= 97:
+                fg = a - 90 + 8
+            elif 40 <= a <= 47:
+                bg = a - 40
+            elif 100 <= a <= 107:
+                bg = a - 100 + 8
+            elif a == 39:
+                fg = None
+            elif a == 49:
+                bg = None
+            elif a in (38, 48):
+                color = None
+                if args[i + 1:i + 2] == [5] and i + 2 < len(args):
+                    color = args[i + 2]
+                    i += 2
+                elif args[i + 1:i + 2] == [2] and i + 4 < len(args):
+                    color = (args[i + 2], args[i + 3], args[i + 4])
+                    i += 4
+                if a == 38:
+                    fg = color
+                else:
+                    bg = color
+            i += 1
+        self.style = (fg, bg, flags)
+
+    # ── 尺寸 ────────────────────────────────────────────────────
+    def resize(self, cols: int, rows: int) -> None:
+        for buf in filter(None, (self.buffer, self._main)):
+            for row in buf:
+                del row[cols:]
+                row.extend([BLANK] * (cols - len(row)))
+            while len(buf) > rows:
+                line = buf.pop(0)
+                if buf is self.buffer and self._main is None:
+                    self.history.append(_row_text(line))
+            while len(buf) < rows:
+                buf.append([BLANK] * cols)
+        self.cols, self.rows = cols, rows
+        self.top, self.bottom = 0, rows - 1
+        self.x, self.y = min(self.x, cols - 1), min(self.y, rows - 1)
+        self.dirty = set(range(rows))
+
+    # ── 读取 ────────────────────────────────────────────────────
+    def display(self) -> list[str]:
+        """当前屏幕各行文本 (去掉行尾空白)。"""
+        return [_row_text(row) for row in self.buffer]
+
+    def text(self, history: int = 2000) -> str:
+        """回滚缓冲末尾 history 行 + 当前屏幕，去掉末尾空行。"""
+        lines = list(self.history)[-history:] if history else []
+        lines += self.display()
+        while lines and not lines[-1]:
+            lines.pop()
+        return "\n".join(lines)
+
+    def take_dirty(self) -> set[int]:
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+
+def _row_text(row: list) -> str:
+    return "".join(c for c, _ in row).rstrip()
@@ -1,29 +1,209 @@
-"""Watchdog: auto-restart bot.py on crash."""
-import os, subprocess, sys, time
+"""Watchdog: run bot.py, restart it when it crashes or hangs.
+
+Liveness is checked every WATCHDOG_INTERVAL seconds:
+  - the heartbeat file written by health.py must be fresh (same pid, updated within
+    HEARTBEAT_STALE seconds);
+  - once the health endpoint has answered with the bot's pid, it must keep answering;
+    an answer from another pid (an orphaned bot still holding HEALTH_PORT) doesn't count.
+If the bot has not been live for WATCHDOG_DEADLINE seconds (WATCHDOG_STARTUP_TIMEOUT
+before its first healthy check), it is killed and restarted. Restarts back off
+exponentially with jitter; a run that stayed up WATCHDOG_STABLE seconds resets it.
+
+Every exit is appended to watchdog.jsonl in the eventlog format, so it can be
+queried with `python eventlog.py --file watchdog.jsonl --stats` or summarized with
+`python watchdog.py --report [--since 7d]`.
+"""
+import os, sys, json, time, random, argparse, subprocess, urllib.request
+from collections import Counter
 
-MAX_RESTARTS, WINDOW = 10, 3600
 _SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-restarts = []
-
-while True:
-    now = time.time()
-    restarts = [t for t in restarts if now - t < WINDOW]
-    if len(restarts) >= MAX_RESTARTS:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {MAX_RESTARTS} restarts in 1h, giving up.")
-        sys.exit(1)
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting bot.py...")
+HEARTBEAT_FILE = os.path.join(_SCRIPT_DIR, "heartbeat.json")  # 与 config.HEARTBEAT_FILE 一致
+RECORD_FILE = os.path.join(_SCRIPT_DIR, "watchdog.jsonl")
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(_SCRIPT_DIR, ".env"))
+except ImportError:
+    pass
+
+HEALTH_URL = f"http://127.0.0.1:{int(os.environ.get('HEALTH_PORT', '8099'))}/health"
+INTERVAL = float(os.environ.get("WATCHDOG_INTERVAL", "5"))
+DEADLINE = float(os.environ.get("WATCHDOG_DEADLINE", "60"))
+STARTUP_TIMEOUT = float(os.environ.get("WATCHDOG_STARTUP_TIMEOUT", "120"))
+STABLE = float(os.environ.get("WATCHDOG_STABLE", "600"))
+BACKOFF_BASE = float(os.environ.get("WATCHDOG_BACKOFF_BASE", "5"))
+BACKOFF_MAX = float(os.environ.get("WATCHDOG_BACKOFF_MAX", "300"))
+HEARTBEAT_STALE = 15  # health.py 每 2 秒写一次心跳，超过这么久没更新说明事件循环停了
+
+# 不走系统代理: 本机回环地址
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def _log(msg: str) -> None:
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+def _record(event: str, **fields) -> None:
+    rec = {"ts": round(time.time(), 3), "ev": event, "lvl": "info" if event == "watchdog.ready" else "warning"}
+    rec.update({k: v for k, v in fields.items() if v is not None})
+    try:
+        with open(RECORD_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+    except OSError as e:
+        _log(f"Cannot write {RECORD_FILE}: {e}")
+
+
+def backoff(failures: int) -> float:
+    """第 n 次连续失败后的等待秒数: 指数增长封顶，在 [d/2, d] 内随机 (避免与其他重启同步)。"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def probe_health(timeout: float = 3) -> dict | None:
+    try:
+        with _opener.open(HEALTH_URL, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+
+def read_heartbeat(pid: int) -> dict | None:
+    """本进程写的心跳，其他 pid 留下的旧文件视为没有。"""
     try:
-        rc = subprocess.call([sys.executable, "bot.py"], cwd=_SCRIPT_DIR)
-    except KeyboardInterrupt:
-        print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Interrupted, exiting.")
-        sys.exit(0)
-    if rc == 0:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Clean exit (0), not restarting.")
-        break
-    restarts.append(time.time())
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Crashed (exit {rc}), restarting in 5s...")
+        with open(HEARTBEAT_FILE, "r", encoding="utf-8") as f:
+            beat = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return beat if beat.get("pid") == pid else None
+
+
+def supervise(proc: subprocess.Popen) -> tuple[str, str, float | None]:
+    """等到进程退出或判定为卡死，返回 (原因, 详情, 启动到首次健康的秒数)。"""
+    start = time.time()
+    last_live = None
+    health_seen = False
+    ready = None
+    while True:
+        rc = proc.poll()
+        if rc is not None:
+            return "exit", f"exit code {rc}", ready
+        now = time.time()
+        beat = read_heartbeat(proc.pid)
+        beat_age = now - beat["ts"] if beat else None
+        health = probe_health()
+        foreign = health is not None and health.get("pid") != proc.pid
+        if foreign:
+            health = None  # 端口被残留的旧 bot 占着，答的不是这个进程
+        health_seen = health_seen or health is not None
+        live = beat_age is not None and beat_age < HEARTBEAT_STALE and (health is not None or not health_seen)
+        if live:
+            if last_live is None:
+                ready = now - start
+                _record("watchdog.ready", pid=proc.pid, dur=round(ready, 3))
+                _log(f"bot.py healthy after {ready:.1f}s (pid {proc.pid})")
+            last_live = now
+        elif last_live is None and now - start > STARTUP_TIMEOUT:
+            return "startup", f"not healthy {STARTUP_TIMEOUT:.0f}s after start", ready
+        elif last_live is not None and now - last_live > DEADLINE:
+            detail = (f"heartbeat {beat_age:.0f}s old, last lag {beat.get('lag_ms')}ms" if beat
+                      else "no heartbeat")
+            if foreign:
+                detail += ", health endpoint answered by another pid"
+            elif health_seen and health is None:
+                detail += ", health endpoint not answering"
+            return "hang", detail, ready
+        try:
+            proc.wait(timeout=INTERVAL)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    proc.terminate()
     try:
-        time.sleep(5)
-    except KeyboardInterrupt:
-        print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Interrupted, exiting.")
-        sys.exit(0)
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run() -> int:
+    failures = 0
+    while True:
+        _log("Starting bot.py...")
+        started = time.time()
+        proc = subprocess.Popen([sys.executable, "bot.py"], cwd=_SCRIPT_DIR)
+        try:
+            reason, detail, ready = supervise(proc)
+        except KeyboardInterrupt:
+            _stop(proc)
+            _log("Interrupted, exiting.")
+            return 0
+        if reason != "exit":
+            _log(f"bot.py {reason}: {detail}, killing pid {proc.pid}")
+            _stop(proc)
+        uptime = time.time() - started
+        if reason == "exit" and proc.returncode == 0:
+            _log("Clean exit (0), not restarting.")
+            return 0
+        failures = 1 if uptime >= STABLE else failures + 1
+        delay = backoff(failures)
+        _record(f"watchdog.{reason}", pid=proc.pid, rc=proc.returncode, detail=detail, dur=round(uptime, 3),
+                ready=round(ready, 3) if ready is not None else None, failures=failures, backoff=round(delay, 1))
+        _log(f"bot.py {reason} after {uptime:.0f}s ({detail}), restart #{failures} in {delay:.1f}s...")
+        try:
+            time.sleep(delay)
+        except KeyboardInterrupt:
+            _log("Interrupted, exiting.")
+            return 0
+
+
+def report(since: float | None = None) -> int:
+    """按原因汇总重启次数、运行时长和恢复耗时 (退避 + 下一次启动到健康)。"""
+    try:
+        with open(RECORD_FILE, "r", encoding="utf-8") as f:
+            recs = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        print(f"No records: {e}")
+        return 1
+    recs = [r for r in recs if not since or r.get("ts", 0) >= since]
+    downs = [r for r in recs if r.get("ev") != "watchdog.ready"]
+    if not downs:
+        print("No restarts recorded.")
+        return 0
+    # 恢复耗时: 一次退出之后，紧接着的 ready 记录距离它的时间
+    recovery = []
+    for i, r in enumerate(recs):
+        if r.get("ev") != "watchdog.ready" and i + 1 < len(recs) and recs[i + 1].get("ev") == "watchdog.ready":
+            recovery.append(recs[i + 1]["ts"] - r["ts"])
+    by_reason = Counter(r["ev"].split(".", 1)[1] for r in downs)
+    uptimes = sorted(r.get("dur", 0) for r in downs)
+    print(f"restarts: {len(downs)}  ({', '.join(f'{k}={v}' for k, v in by_reason.most_common())})")
+    print(f"uptime before restart: median {uptimes[len(uptimes) // 2]:.0f}s, min {uptimes[0]:.0f}s, max {uptimes[-1]:.0f}s")
+    if recovery:
+        recovery.sort()
+        print(f"recovery (backoff + startup): median {recovery[len(recovery) // 2]:.1f}s, "
+              f"max {recovery[-1]:.1f}s, total {sum(recovery):.0f}s")
+    print("\nlast restarts:")
+    for r in downs[-10:]:
+        ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["ts"]))
+        print(f"  {ts}  {r['ev'].split('.', 1)[1]:<8} up {r.get('dur', 0):>8.0f}s  "
+              f"backoff {r.get('backoff', 0):>5.1f}s  {r.get('detail', '')}")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run bot.py and restart it on crash or hang")
+    ap.add_argument("--report", action="store_true", help="summarize recorded restarts and exit")
+    ap.add_argument("--since", help="with --report: 10m / 2h / 7d or unix timestamp")
+    args = ap.parse_args()
+    if args.report:
+        from eventlog import _parse_since
+        return report(_parse_since(args.since) if args.since else None)
+    return run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,13 +2,10 @@
 import io
 import os
 import time
-import hashlib
 import ctypes
 import ctypes.wintypes
 import logging
 
-from PIL import Image
-
 logger = logging.getLogger("bedcode")
 
 # ── Win32 常量 ────────────────────────────────────────────────────
@@ -75,8 +72,8 @@ class INPUT(ctypes.Structure):
 
 
 # ── 截屏 ─────────────────────────────────────────────────────────
-def capture_window_screenshot(handle: int) -> bytes | None:
-    """使用 PrintWindow API 截屏 — 不需要激活窗口，不打断思考。"""
+def capture_window_screenshot(handle: int, max_w: int | None = 1280) -> bytes | None:
+    """使用 PrintWindow API 截屏 — 不需要激活窗口，不打断思考。max_w 为 None 时保留原始分辨率。"""
     try:
         rect = ctypes.wintypes.RECT()
         user32.GetWindowRect(handle, ctypes.byref(rect))
@@ -115,11 +112,11 @@ def capture_window_screenshot(handle: int) -> bytes | None:
                 gdi32.DeleteObject(bitmap)
                 gdi32.DeleteDC(mem_dc)
 
+            from PIL import Image
             img = Image.frombuffer("RGBA", (width, height), buf, "raw", "BGRA", 0, 1)
             img = img.convert("RGB")
 
-            max_w = 1280
-            if img.width > max_w:
+            if max_w and img.width > max_w:
                 ratio = max_w / img.width
                 img = img.resize((max_w, int(img.height * ratio)))
 
@@ -134,10 +131,6 @@ def capture_window_screenshot(handle: int) -> bytes | None:
         return None
 
 
-def _image_hash(img_bytes: bytes) -> str:
-    return hashlib.md5(img_bytes).hexdigest()
-
-
 # ── 窗口标题 ─────────────────────────────────────────────────────
 def get_window_title(handle: int) -> str:
     """获取窗口标题 — 不需要激活窗口。"""
@@ -322,6 +315,7 @@ def copy_image_to_clipboard(filepath: str) -> bool:
     """将图片文件复制到 Windows 剪贴板（BMP 格式）。"""
     try:
         import win32clipboard
+        from PIL import Image
         img = Image.open(filepath).convert("RGB")
         buf = io.BytesIO()
         img.save(buf, format="BMP")